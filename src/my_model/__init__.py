@@ -7,8 +7,107 @@ retrieve and update items.
 The models in this package use the SQLModel class as baseclass so that the
 complete validation of Pydantic can be used, and the ORM database structure
 of SQLalchemy can be used, without having to use two seperate data schemas.
+
+The names in this package are imported lazily: a submodule is only imported
+when one of its names is used for the first time. This keeps the import of
+the package cheap for tools that only need a part of it, like the enums in
+`my_model.enums`.
 """
 
-from .model import *  # noqa: F401, F403
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .auth_cache import *  # noqa: F401, F403
+    from .enums import *  # noqa: F401, F403
+    from .export import *  # noqa: F401, F403
+    from .importer import *  # noqa: F401, F403
+    from .instrumentation import *  # noqa: F401, F403
+    from .maintenance import *  # noqa: F401, F403
+    from .model import *  # noqa: F401, F403
+    from .passwords import *  # noqa: F401, F403
+    from .scopes import *  # noqa: F401, F403
+    from .second_factor import *  # noqa: F401, F403
+    from .serialization import *  # noqa: F401, F403
+    from .settings import *  # noqa: F401, F403
+    from .snapshots import *  # noqa: F401, F403
+    from .tokens import *  # noqa: F401, F403
+    from .validators import *  # noqa: F401, F403
 
 __version__ = '1.3.3'
+
+_EXPORTS: dict[str, tuple[str, ...]] = {
+    'auth_cache': ('AuthCache', 'AuthSnapshot', 'MemoryAuthCache',
+                   'aauthenticate_token', 'authenticate_token',
+                   'get_auth_cache', 'set_auth_cache'),
+    'enums': ('UserRole',),
+    'export': ('DEFAULT_EXPORT_RELATIONSHIPS', 'ExportFormat', 'export_users',
+               'iter_user_records'),
+    'importer': ('IMPORT_RELATIONSHIPS', 'import_users'),
+    'instrumentation': ('DEFAULT_BUCKETS', 'Instrumentation',
+                        'MetricsInstrumentation',
+                        'OpenTelemetryInstrumentation', 'get_instrumentation',
+                        'instrumented', 'set_instrumentation'),
+    'maintenance': ('backfill_token_digests', 'purge_expired_tokens'),
+    'model': ('APIClient', 'APIScope', 'APIToken', 'APITokenScope',
+              'MAX_SCOPE_BITS', 'MyModel', 'Tag', 'TokenModel', 'User',
+              'UserScopedModel', 'UserSetting'),
+    'passwords': ('get_hash_counters', 'get_hashing_executor',
+                  'get_password_hasher', 'hash_password',
+                  'register_hasher_profile', 'reset_hash_counters',
+                  'set_default_hasher_profile', 'set_hashing_executor',
+                  'set_uniform_timing', 'verify_dummy_password',
+                  'verify_password'),
+    'scopes': ('ScopeRegistry', 'assign_scope_bits', 'rebuild_scope_masks'),
+    'second_factor': ('TOTPVerifier', 'get_totp_verifier',
+                      'set_totp_verifier'),
+    'serialization': ('FORMAT_VERSION', 'SerializationFormat',
+                      'decode_model', 'encode_model'),
+    'settings': ('SettingDefinition', 'UserSettings', 'register_setting'),
+    'snapshots': ('APIScopeSnapshot', 'APITokenSnapshot', 'Snapshot',
+                  'UserSnapshot', 'snapshot_type'),
+    'tokens': ('ALPHANUMERIC', 'generate_tokens', 'set_token_digest_key',
+               'token_digest'),
+    'validators': ('COLOR_PATTERN', 'EMAIL_PATTERN', 'FULLNAME_PATTERN',
+                   'REDIRECT_URL_PATTERN', 'SECOND_FACTOR_PATTERN',
+                   'TOKEN_DIGEST_PATTERN', 'TOKEN_PATTERN',
+                   'USERNAME_PATTERN', 'is_valid_color', 'is_valid_email',
+                   'is_valid_fullname', 'is_valid_redirect_url',
+                   'is_valid_second_factor', 'is_valid_token',
+                   'is_valid_totp_code', 'is_valid_username')
+}
+
+_MODULES = {name: module
+            for module, names in _EXPORTS.items()
+            for name in names}
+
+__all__ = sorted(_MODULES)
+
+
+def __getattr__(name: str) -> Any:
+    """Import a name from its submodule on first use.
+
+    Args:
+        name: the name to import.
+
+    Returns:
+        The object for the name.
+
+    Raises:
+        AttributeError: the package has no such name.
+    """
+    module = _MODULES.get(name)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(import_module(f'.{module}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    """Return the names in the package, including the lazy names.
+
+    Returns:
+        The names in the package.
+    """
+    return sorted(set(globals()) | set(__all__))
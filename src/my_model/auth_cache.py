@@ -0,0 +1,554 @@
+"""Module that contains the cache for authenticated API tokens.
+
+Resolving a API token for a request needs the token, the user and the scopes
+of the token. `authenticate_token` loads these with the `auth` load profile
+of `APIToken`, in two queries, and stores a immutable `AuthSnapshot` in the
+active `AuthCache`, keyed by the digest of the token. Next requests with the
+same token are served from the cache without using the database.
+
+The cache is invalidated when the token, the `enabled` or `expires` fields or
+the scopes of a token, or the role of a user, are changed through the ORM, and
+when a token or user is deleted through the ORM. The changed tokens and users
+are recorded in the session and invalidated when the transaction is
+committed, so a request that runs before the commit can't cache the old row
+again after the invalidation. Changes that are done in
+another way, like bulk updates and deletes or changes by other processes,
+are not detected; use `AuthCache.invalidate_token` and
+`AuthCache.invalidate_user` for these changes, or keep the TTL of the cache
+short.
+
+No cache is active by default. Use `set_auth_cache` to enable one.
+"""
+
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, defaultdict
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime
+from threading import Lock
+from typing import TYPE_CHECKING, Any
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session as OrmSession
+from sqlalchemy.orm import SessionTransaction, object_session
+from sqlalchemy.orm.attributes import instance_state
+from sqlmodel import Session, col
+
+from .model import APIToken, User, UserRole
+from .tokens import token_digest
+from .validators import is_valid_token
+
+if TYPE_CHECKING:
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+__all__ = ['AuthCache', 'AuthSnapshot', 'MemoryAuthCache',
+           'aauthenticate_token', 'authenticate_token', 'get_auth_cache',
+           'set_auth_cache']
+
+
+@dataclass(frozen=True, slots=True)
+class AuthSnapshot:
+    """The authentication information for a API token.
+
+    Attributes:
+        token_id: the ID of the API token.
+        user_id: the ID of the owner of the token.
+        role: the role of the owner of the token.
+        scopes: the full names of the scopes of the token.
+        scope_mask: the scope mask of the token.
+        expires: the datetime when the token expires.
+    """
+
+    token_id: int
+    user_id: int
+    role: UserRole
+    scopes: frozenset[str]
+    scope_mask: int
+    expires: datetime
+
+    @classmethod
+    def from_token(cls, api_token: APIToken) -> 'AuthSnapshot':
+        """Create a snapshot for a API token.
+
+        Args:
+            api_token: the API token, with the user and scopes loaded.
+
+        Returns:
+            The snapshot for the token.
+
+        Raises:
+            ValueError: the API token is not saved yet or has no owner.
+        """
+        if api_token.id is None:
+            raise ValueError('The API token is not saved yet')
+        if api_token.user_id is None:
+            raise ValueError('The API token has no owner')
+        return cls(token_id=api_token.id,
+                   user_id=api_token.user_id,
+                   role=api_token.user.role,
+                   scopes=api_token.scope_names,
+                   scope_mask=api_token.scope_mask,
+                   expires=api_token.expires)
+
+    def has_scope(self, scope: str) -> bool:
+        """Check if the token has a specific scope.
+
+        Args:
+            scope: the full name of the scope, like `module.subject`.
+
+        Returns:
+            True if the token has the scope, otherwise False.
+        """
+        return scope in self.scopes
+
+    def has_scope_mask(self, mask: int) -> bool:
+        """Check if the token has all scopes in a scope mask.
+
+        Args:
+            mask: the mask with the bits for the required scopes set.
+
+        Returns:
+            True if the token has all scopes, otherwise False.
+        """
+        return self.scope_mask & mask == mask
+
+
+class AuthCache(ABC):
+    """Interface for caches for authenticated API tokens.
+
+    Implement this interface to store the snapshots in a external store, like
+    a key/value store that is shared between processes.
+    """
+
+    @abstractmethod
+    def get(self, digest: str) -> AuthSnapshot | None:
+        """Return the cached snapshot for a token.
+
+        Args:
+            digest: the digest of the token.
+
+        Returns:
+            The snapshot, or None if the token is not cached.
+        """
+
+    @abstractmethod
+    def set(self, digest: str, snapshot: AuthSnapshot) -> None:
+        """Cache the snapshot for a token.
+
+        Args:
+            digest: the digest of the token.
+            snapshot: the snapshot to cache.
+        """
+
+    @abstractmethod
+    def invalidate_token(self, token_id: int) -> None:
+        """Remove the snapshot for a API token from the cache.
+
+        Args:
+            token_id: the ID of the API token.
+        """
+
+    @abstractmethod
+    def invalidate_user(self, user_id: int) -> None:
+        """Remove the snapshots for all API tokens of a user from the cache.
+
+        Args:
+            user_id: the ID of the user.
+        """
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove all snapshots from the cache."""
+
+
+class MemoryAuthCache(AuthCache):
+    """In-memory cache for authenticated API tokens.
+
+    The cache keeps at most `maxsize` snapshots and removes the least
+    recently used snapshots when it is full. Snapshots are removed after
+    `ttl` seconds, or when the token expires.
+
+    Attributes:
+        maxsize: the maximum number of snapshots in the cache.
+        ttl: the number of seconds a snapshot is kept.
+    """
+
+    def __init__(self, maxsize: int = 100_000, ttl: float = 60.0) -> None:
+        """Create the cache.
+
+        Args:
+            maxsize: the maximum number of snapshots in the cache.
+            ttl: the number of seconds a snapshot is kept.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, AuthSnapshot]] = \
+            OrderedDict()
+        self._tokens: dict[int, str] = {}
+        self._users: defaultdict[int, set[str]] = defaultdict(set)
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        """Return the number of snapshots in the cache.
+
+        Returns:
+            The number of snapshots.
+        """
+        return len(self._entries)
+
+    def get(self, digest: str) -> AuthSnapshot | None:
+        """Return the cached snapshot for a token.
+
+        Args:
+            digest: the digest of the token.
+
+        Returns:
+            The snapshot, or None if the token is not cached or the snapshot
+            is expired.
+        """
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            deadline, snapshot = entry
+            if deadline <= time.monotonic() or \
+                    snapshot.expires <= datetime.utcnow():
+                self._remove(digest)
+                return None
+            self._entries.move_to_end(digest)
+            return snapshot
+
+    def set(self, digest: str, snapshot: AuthSnapshot) -> None:
+        """Cache the snapshot for a token.
+
+        Args:
+            digest: the digest of the token.
+            snapshot: the snapshot to cache.
+        """
+        with self._lock:
+            self._remove(digest)
+            self._entries[digest] = (time.monotonic() + self.ttl, snapshot)
+            self._tokens[snapshot.token_id] = digest
+            self._users[snapshot.user_id].add(digest)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_token(self, token_id: int) -> None:
+        """Remove the snapshot for a API token from the cache.
+
+        Args:
+            token_id: the ID of the API token.
+        """
+        with self._lock:
+            digest = self._tokens.get(token_id)
+            if digest is not None:
+                self._remove(digest)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Remove the snapshots for all API tokens of a user from the cache.
+
+        Args:
+            user_id: the ID of the user.
+        """
+        with self._lock:
+            for digest in list(self._users.get(user_id, ())):
+                self._remove(digest)
+
+    def clear(self) -> None:
+        """Remove all snapshots from the cache."""
+        with self._lock:
+            self._entries.clear()
+            self._tokens.clear()
+            self._users.clear()
+
+    def _remove(self, digest: str) -> None:
+        """Remove a snapshot and its index entries.
+
+        Should be called with the lock held.
+
+        Args:
+            digest: the digest of the token.
+        """
+        entry = self._entries.pop(digest, None)
+        if entry is None:
+            return
+        snapshot = entry[1]
+        self._tokens.pop(snapshot.token_id, None)
+        digests = self._users.get(snapshot.user_id)
+        if digests is not None:
+            digests.discard(digest)
+            if not digests:
+                del self._users[snapshot.user_id]
+
+
+_cache: AuthCache | None = None
+
+_TOKEN_IDS = 'auth_cache_token_ids'
+_USER_IDS = 'auth_cache_user_ids'
+
+
+def set_auth_cache(cache: AuthCache | None) -> None:
+    """Set the cache that is used by `authenticate_token`.
+
+    Args:
+        cache: the cache to use, or None to disable caching.
+    """
+    global _cache  # pylint: disable=global-statement
+    _cache = cache
+
+
+def get_auth_cache() -> AuthCache | None:
+    """Return the cache that is used by `authenticate_token`.
+
+    Returns:
+        The active cache, or None if caching is disabled.
+    """
+    return _cache
+
+
+def _cached(token: str,
+            now: datetime) -> tuple[str | None, AuthSnapshot | None]:
+    """Look up a token in the active cache.
+
+    Args:
+        token: the token to resolve.
+        now: the datetime to use to check the expiration.
+
+    Returns:
+        The digest of the token, or None if the token doesn't have the format
+        of a token, and the cached snapshot, or None if the token is not
+        cached.
+    """
+    if not is_valid_token(token):
+        return None, None
+
+    digest = token_digest(token)
+    cache = _cache
+    if cache is not None:
+        snapshot = cache.get(digest)
+        if snapshot is not None and snapshot.expires > now:
+            return digest, snapshot
+    return digest, None
+
+
+def _statement(token: str, now: datetime) -> Any:
+    """Create the query for a token with the `auth` load profile.
+
+    The query of `APIToken.get_by_token` is used, so the token is looked up
+    in the same column, depending on `APIToken.store_plaintext_token`.
+    Tokens without a owner are not resolved.
+
+    Args:
+        token: the token to resolve, in the format of a token.
+        now: the datetime to use to check the expiration.
+
+    Returns:
+        The select statement.
+    """
+    # pylint: disable=protected-access
+    return APIToken._token_statement(token, now).where(
+        col(APIToken.user_id).is_not(None)
+    ).options(*APIToken.load_profile('auth', strict=True))
+
+
+def _store(digest: str, api_token: APIToken | None) -> AuthSnapshot | None:
+    """Create the snapshot for a loaded token and cache it.
+
+    Args:
+        digest: the digest of the token.
+        api_token: the loaded token, or None if no valid token was found.
+
+    Returns:
+        The snapshot for the token, or None if no token was given.
+    """
+    if api_token is None:
+        return None
+
+    snapshot = AuthSnapshot.from_token(api_token)
+    cache = _cache
+    if cache is not None:
+        cache.set(digest, snapshot)
+    return snapshot
+
+
+def authenticate_token(session: Session,
+                       token: str,
+                       now: datetime | None = None) -> AuthSnapshot | None:
+    """Resolve a API token to the authentication information.
+
+    The snapshot is returned from the active cache when possible. Otherwise,
+    the token, user and scopes are loaded with the `auth` load profile and
+    the snapshot is stored in the cache. Only enabled and not expired tokens
+    with a owner are resolved.
+
+    Args:
+        session: the SQLalchemy session to use when the token isn't cached.
+        token: the token to resolve.
+        now: the datetime to use to check the expiration. Defaults to the
+            current UTC datetime.
+
+    Returns:
+        The snapshot for the token, or None if the token is not valid.
+    """
+    if now is None:
+        now = datetime.utcnow()
+
+    digest, snapshot = _cached(token, now)
+    if digest is None or snapshot is not None:
+        return snapshot
+    return _store(digest, session.exec(_statement(token, now)).first())
+
+
+async def aauthenticate_token(
+        session: 'AsyncSession',
+        token: str,
+        now: datetime | None = None) -> AuthSnapshot | None:
+    """Resolve a API token to the authentication information asynchronously.
+
+    Works like `authenticate_token`, but uses a async session when the token
+    isn't cached.
+
+    Args:
+        session: the async SQLalchemy session to use when the token isn't
+            cached.
+        token: the token to resolve.
+        now: the datetime to use to check the expiration. Defaults to the
+            current UTC datetime.
+
+    Returns:
+        The snapshot for the token, or None if the token is not valid.
+    """
+    if now is None:
+        now = datetime.utcnow()
+
+    digest, snapshot = _cached(token, now)
+    if digest is None or snapshot is not None:
+        return snapshot
+    result = await session.exec(_statement(token, now))
+    return _store(digest, result.first())
+
+
+def _object_id(target: Any) -> int | None:
+    """Return the ID of a object without loading it from the database.
+
+    Args:
+        target: the object.
+
+    Returns:
+        The ID, or None if the object has no ID yet.
+    """
+    state = instance_state(target)
+    if state.key is not None:
+        return state.key[1][0]
+    return state.dict.get('id')
+
+
+def _record(target: Any, key: str, invalidate: Callable[[int], None]) -> None:
+    """Record a changed object so it is invalidated after the commit.
+
+    Invalidating the cache when the object is changed is not enough: a
+    request that runs before the change is committed would cache the old row
+    again. The ID is stored in the `info` of the session of the object
+    instead, and the cache is invalidated by `_invalidate_committed`. Objects
+    without a session are invalidated directly.
+
+    Args:
+        target: the changed object.
+        key: the key in the `info` of the session for the IDs.
+        invalidate: the method of the cache to invalidate the ID with.
+    """
+    object_id = _object_id(target)
+    if object_id is None:
+        return
+    session = object_session(target)
+    if session is None:
+        invalidate(object_id)
+    else:
+        session.info.setdefault(key, set()).add(object_id)
+
+
+@event.listens_for(APIToken.token, 'set')
+@event.listens_for(APIToken.enabled, 'set')
+@event.listens_for(APIToken.expires, 'set')
+@event.listens_for(APIToken.token_scopes, 'append')
+@event.listens_for(APIToken.token_scopes, 'remove')
+@event.listens_for(APIToken.token_scopes, 'bulk_replace')
+def _invalidate_token(target: APIToken, *_: Any) -> None:
+    """Remove a API token from the auth cache when it is changed.
+
+    Args:
+        target: the API token that was changed.
+    """
+    cache = _cache
+    if cache is not None:
+        _record(target, _TOKEN_IDS, cache.invalidate_token)
+
+
+@event.listens_for(User.role, 'set')
+def _invalidate_user(target: User, *_: Any) -> None:
+    """Remove the API tokens of a user from the auth cache.
+
+    Args:
+        target: the user whose role was changed.
+    """
+    cache = _cache
+    if cache is not None:
+        _record(target, _USER_IDS, cache.invalidate_user)
+
+
+@event.listens_for(APIToken, 'after_delete')
+def _invalidate_deleted_token(_mapper: Any, _connection: Any,
+                              target: APIToken) -> None:
+    """Remove a API token from the auth cache when it is deleted.
+
+    Args:
+        target: the API token that was deleted.
+    """
+    _invalidate_token(target)
+
+
+@event.listens_for(User, 'after_delete')
+def _invalidate_deleted_user(_mapper: Any, _connection: Any,
+                             target: User) -> None:
+    """Remove the API tokens of a user from the auth cache when it is deleted.
+
+    Args:
+        target: the user that was deleted.
+    """
+    _invalidate_user(target)
+
+
+@event.listens_for(OrmSession, 'after_commit')
+def _invalidate_committed(session: OrmSession) -> None:
+    """Invalidate the tokens and users that are changed in a transaction.
+
+    Args:
+        session: the session that was committed.
+    """
+    token_ids = session.info.pop(_TOKEN_IDS, ())
+    user_ids = session.info.pop(_USER_IDS, ())
+    cache = _cache
+    if cache is None:
+        return
+    for token_id in token_ids:
+        cache.invalidate_token(token_id)
+    for user_id in user_ids:
+        cache.invalidate_user(user_id)
+
+
+@event.listens_for(OrmSession, 'after_soft_rollback')
+def _forget_rolled_back(session: OrmSession,
+                        previous_transaction: SessionTransaction) -> None:
+    """Forget the changed tokens and users when a transaction is rolled back.
+
+    The IDs are kept when only a savepoint is rolled back, because the
+    changes before the savepoint can still be committed.
+
+    Args:
+        session: the session that was rolled back.
+        previous_transaction: the transaction that was rolled back.
+    """
+    if previous_transaction.parent is None:
+        session.info.pop(_TOKEN_IDS, None)
+        session.info.pop(_USER_IDS, None)
@@ -0,0 +1,24 @@
+"""Module that contains the enums for the models.
+
+This module has no dependencies outside of the standard library, so it can
+be imported by tools that only need the enums, without loading SQLmodel,
+SQLalchemy or Pydantic.
+"""
+
+from enum import Enum
+
+__all__ = ['UserRole']
+
+
+class UserRole(Enum):
+    """The roles a user can have.
+
+    Attributes:
+        ROOT: for root users; users with god-mode permissions.
+        SERVICE: for service accounts.
+        USER: normal users
+    """
+
+    ROOT = 1
+    SERVICE = 2
+    USER = 3
@@ -0,0 +1,386 @@
+"""Module that contains the streaming export of users.
+
+Exporting all users with their API tokens, tags and settings through the ORM
+loads every object into the session. The routines in this module select the
+columns directly and stream the users with `yield_per`, which uses
+server-side cursors on databases that support them. For every batch of
+users, the related rows are loaded with one query per relationship and
+grouped per user. Only one batch is kept in memory at a time, so the memory
+use does not depend on the number of users.
+
+Every user is exported as one record: a dict with the fields of the user and
+a list of records for every exported relationship. Datetimes are kept as
+naive UTC datetimes and enums are exported as their value. The fields that
+are listed in the `sensitive_fields` of a model, like the password hash, the
+second factor and plaintext tokens, are left out unless they are requested
+explicitly.
+
+The records can be written in the following formats:
+
+* `ndjson`: one JSON document per line. Uses `orjson` when it is installed,
+  or the `json` module of the standard library otherwise.
+* `arrow` and `parquet`: the Arrow IPC file format and Parquet, with a list
+  of structs for every relationship. Needs the optional `pyarrow` package,
+  which can be installed with the `arrow` extra.
+"""
+
+import json
+import types
+from collections.abc import Iterator, Sequence
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum
+from functools import cache
+from typing import IO, Any, Literal, Union, get_args, get_origin
+
+from sqlalchemy import inspect
+from sqlmodel import Session, col, select
+
+from .model import MyModel, User, UserScopedModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore[assignment]
+
+__all__ = ['DEFAULT_EXPORT_RELATIONSHIPS', 'ExportFormat', 'export_users',
+           'iter_user_records']
+
+ExportFormat = Literal['ndjson', 'arrow', 'parquet']
+
+DEFAULT_EXPORT_RELATIONSHIPS = ('api_tokens', 'tags', 'user_settings')
+
+
+@dataclass(frozen=True)
+class _Layout:
+    """The exported fields of a model.
+
+    Attributes:
+        model: the model.
+        names: the names of the exported fields.
+        columns: the columns for the exported fields.
+        enums: the names of the exported fields that contain enums.
+    """
+
+    model: type[MyModel]
+    names: tuple[str, ...]
+    columns: tuple[Any, ...]
+    enums: tuple[str, ...]
+
+
+def _field_types(annotation: Any) -> tuple[Any, ...]:
+    """Return the types of a field, without None.
+
+    Args:
+        annotation: the type annotation of the field.
+
+    Returns:
+        The types the field can have.
+    """
+    if get_origin(annotation) in (Union, types.UnionType):
+        return tuple(kind for kind in get_args(annotation)
+                     if kind is not type(None))
+    return (annotation,)
+
+
+@cache
+def _layout(model: type[MyModel], include_sensitive: bool) -> _Layout:
+    """Return the exported fields of a model.
+
+    Args:
+        model: the model.
+        include_sensitive: if the sensitive fields should be exported.
+
+    Returns:
+        The layout for the model.
+    """
+    names = tuple(name for name in model.model_fields
+                  if include_sensitive or name not in model.sensitive_fields)
+    enums = tuple(
+        name for name in names
+        if any(isinstance(kind, type) and issubclass(kind, Enum)
+               for kind in _field_types(model.model_fields[name].annotation)))
+    return _Layout(model, names,
+                   tuple(getattr(model, name) for name in names), enums)
+
+
+def _related_model(name: str) -> type[UserScopedModel]:
+    """Return the model for a relationship of the user.
+
+    Args:
+        name: the name of the relationship, like `tags`.
+
+    Returns:
+        The model of the related objects.
+
+    Raises:
+        ValueError: the user has no relationship to user scoped objects with
+            this name.
+    """
+    relationship = inspect(User).relationships.get(name)
+    model = None if relationship is None else relationship.mapper.class_
+    if model is None or not issubclass(model, UserScopedModel):
+        raise ValueError(f'User has no relationship "{name}" to export')
+    return model
+
+
+def _records(layout: _Layout,
+             rows: Sequence[Sequence[Any]]) -> list[dict[str, Any]]:
+    """Convert database rows to records.
+
+    Args:
+        layout: the layout of the rows.
+        rows: the rows, with the values in the order of the layout.
+
+    Returns:
+        The records for the rows.
+    """
+    records = [dict(zip(layout.names, row)) for row in rows]
+    for name in layout.enums:
+        for record in records:
+            if record[name] is not None:
+                record[name] = record[name].value
+    return records
+
+
+def _iter_user_batches(
+        session: Session,
+        relationships: Sequence[str],
+        batch_size: int,
+        include_sensitive: bool) -> Iterator[list[dict[str, Any]]]:
+    """Yield the records of the users in batches.
+
+    Args:
+        session: the SQLalchemy session to use.
+        relationships: the names of the relationships to export.
+        batch_size: the number of users per batch.
+        include_sensitive: if the sensitive fields should be exported.
+
+    Yields:
+        The records for a batch of users, ordered by ID.
+
+    Raises:
+        ValueError: the batch size is not positive.
+    """
+    if batch_size < 1:
+        raise ValueError('The batch size should be at least 1')
+
+    related = [(name, _related_model(name)) for name in relationships]
+    layout = _layout(User, include_sensitive)
+    result = session.exec(
+        select(*layout.columns)
+        .order_by(col(User.id))
+        .execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        users = _records(layout, partition)
+        ids = [user['id'] for user in users]
+        for name, model in related:
+            related_layout = _layout(model, include_sensitive)
+            grouped: dict[int, list[dict[str, Any]]] = {
+                user_id: [] for user_id in ids}
+            rows = session.exec(
+                select(*related_layout.columns)
+                .where(col(model.user_id).in_(ids))
+                .order_by(col(model.user_id),
+                          col(model.id))).all()
+            for record in _records(related_layout, rows):
+                grouped[record['user_id']].append(record)
+            for user in users:
+                user[name] = grouped[user['id']]
+        yield users
+
+
+def iter_user_records(
+        session: Session,
+        relationships: Sequence[str] = DEFAULT_EXPORT_RELATIONSHIPS,
+        batch_size: int = 1000,
+        include_sensitive: bool = False) -> Iterator[dict[str, Any]]:
+    """Yield a record for every user, with the related objects.
+
+    The users are streamed in batches of `batch_size` users, ordered by ID.
+    The related objects of a batch are loaded with one query per
+    relationship. No model objects are created.
+
+    Args:
+        session: the SQLalchemy session to use.
+        relationships: the names of the relationships of the user to export,
+            like `api_tokens`, `tags` and `user_settings`.
+        batch_size: the number of users per batch.
+        include_sensitive: if set to True, the sensitive fields of the models
+            are exported too.
+
+    Yields:
+        A dict with the fields of a user, and a list of dicts with the fields
+        of the related objects for every relationship.
+    """
+    for users in _iter_user_batches(session, relationships, batch_size,
+                                    include_sensitive):
+        yield from users
+
+
+def _json_default(value: Any) -> Any:
+    """Convert values that the `json` module can't serialize.
+
+    Args:
+        value: the value to convert.
+
+    Returns:
+        The ISO 8601 representation of a datetime.
+
+    Raises:
+        TypeError: the value can't be serialized.
+    """
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON '
+                    'serializable')
+
+
+def _write_ndjson(batches: Iterator[list[dict[str, Any]]],
+                  target: IO[bytes]) -> int:
+    """Write records as newline delimited JSON.
+
+    Args:
+        batches: the batches of records.
+        target: the binary file to write to.
+
+    Returns:
+        The number of written records.
+    """
+    written = 0
+    for records in batches:
+        if orjson is not None:
+            lines = [orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+                     for record in records]
+        else:  # pragma: no cover
+            lines = [json.dumps(record, separators=(',', ':'),
+                                default=_json_default).encode() + b'\n'
+                     for record in records]
+        target.write(b''.join(lines))
+        written += len(records)
+    return written
+
+
+def _arrow_schema(relationships: Sequence[str],
+                  include_sensitive: bool) -> Any:
+    """Create the Arrow schema for the user records.
+
+    Args:
+        relationships: the names of the exported relationships.
+        include_sensitive: if the sensitive fields are exported.
+
+    Returns:
+        The Arrow schema.
+    """
+    # pylint: disable=import-outside-toplevel
+    import pyarrow  # type: ignore[import]
+
+    def arrow_type(annotation: Any) -> Any:
+        kind = _field_types(annotation)[0]
+        if isinstance(kind, type) and issubclass(kind, Enum):
+            if all(isinstance(member.value, int) for member in kind):
+                return pyarrow.int64()
+            return pyarrow.string()
+        return {bool: pyarrow.bool_(),
+                int: pyarrow.int64(),
+                float: pyarrow.float64(),
+                str: pyarrow.string(),
+                datetime: pyarrow.timestamp('us')}[kind]
+
+    def fields(layout: _Layout) -> list[Any]:
+        return [pyarrow.field(name, arrow_type(
+                    layout.model.model_fields[name].annotation))
+                for name in layout.names]
+
+    schema = fields(_layout(User, include_sensitive))
+    for name in relationships:
+        layout = _layout(_related_model(name), include_sensitive)
+        schema.append(pyarrow.field(
+            name, pyarrow.list_(pyarrow.struct(fields(layout)))))
+    return pyarrow.schema(schema)
+
+
+def _write_arrow(batches: Iterator[list[dict[str, Any]]],
+                 target: IO[bytes],
+                 format: ExportFormat,
+                 relationships: Sequence[str],
+                 include_sensitive: bool) -> int:
+    """Write records as a Arrow IPC file or a Parquet file.
+
+    Every batch of users is written as one record batch, or one row group for
+    Parquet.
+
+    Args:
+        batches: the batches of records.
+        target: the binary file to write to.
+        format: the format to use, `arrow` or `parquet`.
+        relationships: the names of the exported relationships.
+        include_sensitive: if the sensitive fields are exported.
+
+    Returns:
+        The number of written records.
+
+    Raises:
+        ImportError: the `pyarrow` package is not installed.
+    """
+    # pylint: disable=import-outside-toplevel,redefined-builtin
+    try:
+        import pyarrow  # type: ignore[import]
+        import pyarrow.ipc  # type: ignore[import]
+        import pyarrow.parquet  # type: ignore[import]
+    except ImportError as exception:
+        raise ImportError(
+            f'The {format} format needs the pyarrow package; install '
+            'ds-my-model with the arrow extra') from exception
+
+    schema = _arrow_schema(relationships, include_sensitive)
+    if format == 'parquet':
+        writer = pyarrow.parquet.ParquetWriter(target, schema)
+    else:
+        writer = pyarrow.ipc.new_file(target, schema)
+
+    written = 0
+    with writer:
+        for records in batches:
+            writer.write_batch(
+                pyarrow.RecordBatch.from_pylist(records, schema=schema))
+            written += len(records)
+    return written
+
+
+def export_users(session: Session,
+                 target: IO[bytes],
+                 format: ExportFormat = 'ndjson',
+                 relationships: Sequence[str] = DEFAULT_EXPORT_RELATIONSHIPS,
+                 batch_size: int = 1000,
+                 include_sensitive: bool = False) -> int:
+    """Export all users with their related objects to a file.
+
+    The users are streamed with `iter_user_records`, so the memory use does
+    not depend on the number of users.
+
+    Args:
+        session: the SQLalchemy session to use.
+        target: the binary file to write to.
+        format: the format to use: `ndjson`, `arrow` or `parquet`.
+        relationships: the names of the relationships of the user to export.
+        batch_size: the number of users per batch.
+        include_sensitive: if set to True, the sensitive fields of the models
+            are exported too.
+
+    Returns:
+        The number of exported users.
+
+    Raises:
+        ValueError: the format is unknown.
+    """
+    # pylint: disable=redefined-builtin
+    if format not in get_args(ExportFormat):
+        raise ValueError(f'Unknown export format "{format}"')
+
+    batches = _iter_user_batches(session, relationships, batch_size,
+                                 include_sensitive)
+    if format == 'ndjson':
+        return _write_ndjson(batches, target)
+    return _write_arrow(batches, target, format, relationships,
+                        include_sensitive)
@@ -0,0 +1,290 @@
+"""Module that contains the streaming import of users.
+
+Creating users one by one validates every field on assignment and hashes
+every password in the calling thread. `import_users` reads the users from
+a iterable of records instead and handles them in batches:
+
+1. The users and their related objects of a batch are validated with one
+   call per model, using `MyModel.bulk_from_rows`.
+2. The passwords of the batch are handed to a executor to be hashed, with
+   the `batch_import` hasher profile by default. The executor can be a
+   `ProcessPoolExecutor` to use all cores, or the thread pool from
+   `get_hashing_executor`, which also runs in parallel because Argon2
+   releases the GIL.
+3. Tokens are generated in bulk for API tokens that don't have a token yet,
+   the digests are set for imported tokens without a digest, and random
+   second factors are set when requested. The generated tokens are given to
+   the `tokens` callable, which is required when `APIToken` doesn't store
+   plaintext tokens, because the digest is the only thing that is stored.
+4. The batch is inserted and committed in its own transaction.
+
+While a batch is inserted, the passwords of the next batches are hashed. At
+most `max_pending_batches` batches are read ahead; the iterable is not read
+any further until a batch is committed, so the memory use does not depend on
+the number of records.
+
+After every commit, the `checkpoint` callable is called with the number of
+records that are committed. Give this number as `start` to resume a import
+that was interrupted.
+
+The records use the same layout as the records of `my_model.export`: the
+fields of the user, a `password` key with the plaintext password and a list
+of records for the `api_tokens`, `tags` and `user_settings` relationships.
+"""
+
+import os
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from itertools import islice, repeat
+from typing import Any
+
+from sqlalchemy.orm.attributes import set_attribute
+from sqlmodel import Session
+
+from .model import APIToken, Tag, User, UserScopedModel, UserSetting
+from .passwords import get_hashing_executor, hash_password
+from .tokens import generate_tokens, token_digest
+
+__all__ = ['IMPORT_RELATIONSHIPS', 'import_users']
+
+IMPORT_RELATIONSHIPS: dict[str, type[UserScopedModel]] = {
+    'api_tokens': APIToken,
+    'tags': Tag,
+    'user_settings': UserSetting
+}
+"""The relationships that can be imported, with the model of the related
+objects."""
+
+
+@dataclass
+class _Batch:
+    """A batch of users that is prepared for inserting.
+
+    Attributes:
+        offset: the index of the first record of the batch in the records.
+        size: the number of records in the batch.
+        users: the validated users.
+        related: the validated related objects, with the index of their user
+            in `users`.
+        hashed: the indexes of the users that have a password.
+        hashes: the iterator for the password hashes, in the order of
+            `hashed`.
+    """
+
+    offset: int
+    size: int
+    users: list[User]
+    related: list[tuple[int, UserScopedModel]]
+    hashed: list[int]
+    hashes: Iterator[str]
+
+
+def _prepare(records: list[Mapping[str, Any]],
+             offset: int,
+             executor: Executor,
+             profile: str,
+             return_tokens: bool) -> _Batch:
+    """Validate a batch of records and start hashing the passwords.
+
+    Args:
+        records: the records of the batch.
+        offset: the index of the first record of the batch.
+        executor: the executor to hash the passwords with.
+        profile: the hasher profile to use.
+        return_tokens: if the generated tokens are given to the caller.
+
+    Returns:
+        The prepared batch.
+
+    Raises:
+        ValueError: a password is not a string, or a token has to be
+            generated while it can't be stored or given to the caller.
+    """
+    users = User.bulk_from_rows(records)
+
+    related: list[tuple[int, UserScopedModel]] = []
+    for name, model in IMPORT_RELATIONSHIPS.items():
+        owners = [index for index, record in enumerate(records)
+                  for _ in record.get(name, ())]
+        if owners:
+            objects = model.bulk_from_rows(
+                [row for record in records for row in record.get(name, ())])
+            related.extend(zip(owners, objects))
+
+    if not APIToken.store_plaintext_token and not return_tokens and any(
+            isinstance(obj, APIToken) and obj.token is None and
+            obj.token_digest is None for _, obj in related):
+        raise ValueError('API tokens without a token can only be imported '
+                         'with a tokens callable, because the plaintext '
+                         'tokens are not stored')
+
+    hashed = []
+    passwords = []
+    for index, record in enumerate(records):
+        password = record.get('password')
+        if password is None:
+            continue
+        if not isinstance(password, str):
+            raise ValueError(f'The password for record {index} is not a '
+                             'string')
+        hashed.append(index)
+        passwords.append(password)
+
+    chunksize = max(1, len(passwords) // (4 * (os.cpu_count() or 1)))
+    hashes = executor.map(hash_password, passwords, repeat(profile),
+                          chunksize=chunksize)
+    return _Batch(offset, len(records), users, related, hashed, hashes)
+
+
+def _insert(session: Session,
+            batch: _Batch,
+            second_factors: bool,
+            tokens: Callable[[int, str], None] | None) -> None:
+    """Insert a prepared batch.
+
+    The validated values are set with `set_attribute`, so they are not
+    validated again.
+
+    Args:
+        session: the SQLalchemy session to use.
+        batch: the prepared batch.
+        second_factors: if a random second factor should be set for users
+            without a second factor.
+        tokens: the callable for the generated tokens, or None.
+    """
+    users = batch.users
+    for index, password_hash in zip(batch.hashed, batch.hashes):
+        set_attribute(users[index], 'password_hash', password_hash)
+
+    if second_factors:
+        # pylint: disable=import-outside-toplevel
+        from pyotp import random_base32
+        for user in users:
+            if user.second_factor is None:
+                set_attribute(user, 'second_factor', random_base32())
+
+    session.add_all(users)
+    session.flush()
+
+    api_tokens = [obj for _, obj in batch.related
+                  if isinstance(obj, APIToken)]
+    for api_token in api_tokens:
+        if api_token.token is not None and api_token.token_digest is None:
+            set_attribute(api_token, 'token_digest',
+                          token_digest(api_token.token))
+
+    generated = [(batch.offset + index, obj) for index, obj in batch.related
+                 if isinstance(obj, APIToken) and obj.token is None and
+                 obj.token_digest is None]
+    new_tokens = generate_tokens(len(generated), 32)
+    for (_, api_token), token in zip(generated, new_tokens):
+        set_attribute(api_token, 'token_digest', token_digest(token))
+        if api_token.store_plaintext_token:
+            set_attribute(api_token, 'token', token)
+
+    for index, obj in batch.related:
+        set_attribute(obj, 'user_id', users[index].id)
+    session.add_all(obj for _, obj in batch.related)
+    session.commit()
+
+    if tokens is not None:
+        for (record, _), token in zip(generated, new_tokens):
+            tokens(record, token)
+
+
+def import_users(session: Session,
+                 records: Iterable[Mapping[str, Any]],
+                 batch_size: int = 500,
+                 executor: Executor | None = None,
+                 profile: str = 'batch_import',
+                 second_factors: bool = False,
+                 start: int = 0,
+                 checkpoint: Callable[[int], None] | None = None,
+                 max_pending_batches: int = 2,
+                 tokens: Callable[[int, str], None] | None = None) -> int:
+    """Import users with their related objects in batches.
+
+    Every batch is validated at once and committed in its own transaction.
+    When a record is invalid, the batches before it are committed and the
+    error is raised; the last checkpoint is the start of the invalid batch.
+
+    Password hashes that are calculated in other processes are not counted
+    in the hash counters of `my_model.passwords`.
+
+    Args:
+        session: the SQLalchemy session to use.
+        records: the records for the users. Every record contains the fields
+            of the user, a optional `password` key with the plaintext
+            password and optional lists of records for the relationships in
+            `IMPORT_RELATIONSHIPS`.
+        batch_size: the number of records per transaction.
+        executor: the executor to hash the passwords with. Defaults to the
+            executor from `get_hashing_executor`.
+        profile: the hasher profile to use. With a `ProcessPoolExecutor`,
+            the profile should be a builtin profile or registered in the
+            worker processes.
+        second_factors: if set to True, a random second factor is set for
+            users without a second factor.
+        start: the number of records to skip, as given to `checkpoint`, to
+            resume a interrupted import.
+        checkpoint: a callable that is called with the number of committed
+            records after every batch, including the skipped records.
+        max_pending_batches: the maximum number of batches that are read and
+            hashed ahead of the batch that is inserted.
+        tokens: a callable that is called with the index of the record and
+            the plaintext token for every generated API token, after the
+            batch is committed. Required to generate tokens when `APIToken`
+            doesn't store plaintext tokens.
+
+    Returns:
+        The number of imported users.
+
+    Raises:
+        ValueError: the batch size, number of pending batches or start is
+            invalid, or tokens have to be generated that can't be stored or
+            returned.
+    """
+    if batch_size < 1:
+        raise ValueError('The batch size should be at least 1')
+    if max_pending_batches < 1:
+        raise ValueError('At least one batch should be pending')
+    if start < 0:
+        raise ValueError('The start should not be negative')
+
+    if executor is None:
+        executor = get_hashing_executor()
+
+    iterator = islice(records, start, None)
+    pending: deque[_Batch] = deque()
+    position = start
+    imported = 0
+
+    def insert_next() -> None:
+        nonlocal position, imported
+        prepared = pending.popleft()
+        _insert(session, prepared, second_factors, tokens)
+        position += prepared.size
+        imported += len(prepared.users)
+        if checkpoint is not None:
+            checkpoint(position)
+
+    offset = start
+    while batch := list(islice(iterator, batch_size)):
+        try:
+            pending.append(_prepare(batch, offset, executor, profile,
+                                    tokens is not None))
+        except Exception:
+            # Commit the valid batches that are read ahead, so the import
+            # can be resumed from the invalid batch
+            while pending:
+                insert_next()
+            raise
+        offset += len(batch)
+        if len(pending) > max_pending_batches:
+            insert_next()
+
+    while pending:
+        insert_next()
+    return imported
@@ -0,0 +1,283 @@
+"""Module that contains the instrumentation for the expensive methods.
+
+The expensive methods of the models, like `User.set_password` and
+`User.verify_credentials`, report every call to the active
+`Instrumentation`: the name of the method and the time the call took. Calls
+that fail with a `ValueError`, which includes the validation errors of
+Pydantic, are reported as validation failures too.
+
+No instrumentation is active by default. In that case, the only overhead is
+a check for the active instrumentation. Use `set_instrumentation` to enable
+it, with one of the following classes or a subclass of `Instrumentation`:
+
+- `MetricsInstrumentation`: keeps call counts, failure counts and latency
+  histograms in memory.
+- `OpenTelemetryInstrumentation`: records the calls with the counters and
+  histograms of a OpenTelemetry meter.
+"""
+
+import inspect
+import time
+from bisect import bisect_left
+from collections import Counter
+from collections.abc import Callable
+from functools import wraps
+from threading import Lock
+from typing import Any, ParamSpec, TypeVar, cast
+
+__all__ = ['DEFAULT_BUCKETS', 'Instrumentation', 'MetricsInstrumentation',
+           'OpenTelemetryInstrumentation', 'get_instrumentation',
+           'instrumented', 'set_instrumentation']
+
+DEFAULT_BUCKETS = (0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0)
+"""The upper bounds of the latency buckets in seconds. Every histogram has
+one more bucket for the calls that took longer than the last bound."""
+
+Parameters = ParamSpec('Parameters')
+Result = TypeVar('Result')
+
+
+class Instrumentation:
+    """Baseclass for instrumentations.
+
+    All methods do nothing. Subclasses can override the methods they need.
+    """
+
+    def record_call(self, name: str, duration: float) -> None:
+        """Record a call to a instrumented method.
+
+        Args:
+            name: the qualified name of the method, like `User.set_password`.
+            duration: the time the call took, in seconds.
+        """
+
+    def record_validation_failure(self, name: str) -> None:
+        """Record a call to a instrumented method that failed validation.
+
+        Args:
+            name: the qualified name of the method.
+        """
+
+
+class MetricsInstrumentation(Instrumentation):
+    """Instrumentation that keeps the metrics in memory.
+
+    Attributes:
+        buckets: the upper bounds of the latency buckets in seconds.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        """Create the instrumentation.
+
+        Args:
+            buckets: the upper bounds of the latency buckets in seconds, in
+                increasing order.
+        """
+        self.buckets = buckets
+        self._calls: Counter[str] = Counter()
+        self._failures: Counter[str] = Counter()
+        self._durations: dict[str, float] = {}
+        self._histograms: dict[str, list[int]] = {}
+        self._lock = Lock()
+
+    def record_call(self, name: str, duration: float) -> None:
+        """Record a call to a instrumented method.
+
+        Args:
+            name: the qualified name of the method, like `User.set_password`.
+            duration: the time the call took, in seconds.
+        """
+        bucket = bisect_left(self.buckets, duration)
+        with self._lock:
+            self._calls[name] += 1
+            self._durations[name] = self._durations.get(name, 0.0) + duration
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = [0] * (len(self.buckets) + 1)
+                self._histograms[name] = histogram
+            histogram[bucket] += 1
+
+    def record_validation_failure(self, name: str) -> None:
+        """Record a call to a instrumented method that failed validation.
+
+        Args:
+            name: the qualified name of the method.
+        """
+        with self._lock:
+            self._failures[name] += 1
+
+    def calls(self) -> dict[str, int]:
+        """Return the number of calls per method.
+
+        Returns:
+            A dict with the name of the method and the number of calls.
+        """
+        with self._lock:
+            return dict(self._calls)
+
+    def validation_failures(self) -> dict[str, int]:
+        """Return the number of validation failures per method.
+
+        Returns:
+            A dict with the name of the method and the number of failures.
+        """
+        with self._lock:
+            return dict(self._failures)
+
+    def total_durations(self) -> dict[str, float]:
+        """Return the total time spent per method.
+
+        Returns:
+            A dict with the name of the method and the time in seconds.
+        """
+        with self._lock:
+            return dict(self._durations)
+
+    def histograms(self) -> dict[str, list[int]]:
+        """Return the latency histograms per method.
+
+        Returns:
+            A dict with the name of the method and the number of calls per
+            bucket. The last bucket counts the calls that took longer than
+            the last bound.
+        """
+        with self._lock:
+            return {name: list(histogram)
+                    for name, histogram in self._histograms.items()}
+
+    def reset(self) -> None:
+        """Reset all metrics."""
+        with self._lock:
+            self._calls.clear()
+            self._failures.clear()
+            self._durations.clear()
+            self._histograms.clear()
+
+
+class OpenTelemetryInstrumentation(Instrumentation):
+    """Instrumentation that records the metrics with OpenTelemetry.
+
+    The `opentelemetry` packages are not a dependency of this package; the
+    meter is created by the application, for instance with
+    `opentelemetry.metrics.get_meter('my_model')`. The following instruments
+    are created, with the name of the method in the `method` attribute:
+
+    - `my_model.calls`: a counter for the calls.
+    - `my_model.duration`: a histogram for the duration of the calls.
+    - `my_model.validation_failures`: a counter for validation failures.
+    """
+
+    def __init__(self, meter: Any) -> None:
+        """Create the instrumentation.
+
+        Args:
+            meter: the OpenTelemetry meter to create the instruments with.
+        """
+        self._calls = meter.create_counter(
+            'my_model.calls',
+            description='Calls to instrumented methods')
+        self._duration = meter.create_histogram(
+            'my_model.duration',
+            unit='s',
+            description='Duration of calls to instrumented methods')
+        self._failures = meter.create_counter(
+            'my_model.validation_failures',
+            description='Calls to instrumented methods that failed '
+                        'validation')
+
+    def record_call(self, name: str, duration: float) -> None:
+        """Record a call to a instrumented method.
+
+        Args:
+            name: the qualified name of the method, like `User.set_password`.
+            duration: the time the call took, in seconds.
+        """
+        attributes = {'method': name}
+        self._calls.add(1, attributes)
+        self._duration.record(duration, attributes)
+
+    def record_validation_failure(self, name: str) -> None:
+        """Record a call to a instrumented method that failed validation.
+
+        Args:
+            name: the qualified name of the method.
+        """
+        self._failures.add(1, {'method': name})
+
+
+_instrumentation: Instrumentation | None = None
+
+
+def set_instrumentation(instrumentation: Instrumentation | None) -> None:
+    """Set the active instrumentation.
+
+    Args:
+        instrumentation: the instrumentation to use, or None to disable
+            instrumentation.
+    """
+    global _instrumentation  # pylint: disable=global-statement
+    _instrumentation = instrumentation
+
+
+def get_instrumentation() -> Instrumentation | None:
+    """Return the active instrumentation.
+
+    Returns:
+        The active instrumentation, or None if instrumentation is disabled.
+    """
+    return _instrumentation
+
+
+def instrumented(
+        function: Callable[Parameters, Result]
+) -> Callable[Parameters, Result]:
+    """Report the calls to a function to the active instrumentation.
+
+    The qualified name of the function is used as the name for the metrics.
+    Should be placed above `validate_call`, so failed validations of the
+    arguments are reported too. For coroutine functions, the time until the
+    coroutine is finished is recorded.
+
+    Args:
+        function: the function to instrument.
+
+    Returns:
+        The instrumented function.
+    """
+    name = function.__qualname__
+
+    if inspect.iscoroutinefunction(function):
+        @wraps(function)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            instrumentation = _instrumentation
+            if instrumentation is None:
+                return await function(*args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                return await function(*args, **kwargs)
+            except ValueError:
+                instrumentation.record_validation_failure(name)
+                raise
+            finally:
+                instrumentation.record_call(name, time.perf_counter() - start)
+
+        return cast(Callable[Parameters, Result], async_wrapper)
+
+    @wraps(function)
+    def wrapper(*args: Parameters.args,
+                **kwargs: Parameters.kwargs) -> Result:
+        instrumentation = _instrumentation
+        if instrumentation is None:
+            return function(*args, **kwargs)
+
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        except ValueError:
+            instrumentation.record_validation_failure(name)
+            raise
+        finally:
+            instrumentation.record_call(name, time.perf_counter() - start)
+
+    return wrapper
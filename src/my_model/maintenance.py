@@ -0,0 +1,141 @@
+"""Module that contains maintenance routines for the token tables.
+
+Tokens that are expired can never be used again, but they stay in the tables
+and make every token query slower. The routines in this module remove these
+tokens, or fill in the token digests for rows that where stored without a
+digest, in small batches. Every batch is committed on its own, so the locks on
+the tables are only held for a short time and the routines can run while the
+tables are in use.
+"""
+
+from collections.abc import Callable, Sequence
+from datetime import datetime
+from typing import TypeVar
+
+from sqlalchemy import delete, exists, or_
+from sqlalchemy.orm.attributes import set_attribute
+from sqlmodel import Session, col, select
+
+from .model import APIClient, APIToken, APITokenScope, TokenModel
+from .tokens import token_digest
+
+__all__ = ['backfill_token_digests', 'purge_expired_tokens']
+
+PurgedType = TypeVar('PurgedType', bound=TokenModel)
+
+
+def purge_expired_tokens(
+        session: Session,
+        model: type[PurgedType],
+        now: datetime | None = None,
+        batch_size: int = 1000,
+        include_disabled: bool = False,
+        archive: Callable[[Sequence[PurgedType]], None] | None = None) -> int:
+    """Delete expired objects for a token model in batches.
+
+    The objects are deleted in batches of `batch_size` objects and the
+    session is committed after every batch. For API tokens, the links to the
+    scopes are deleted too. API clients that still have API tokens are kept;
+    purge the API tokens first to remove these clients.
+
+    Args:
+        session: the SQLalchemy session to use.
+        model: the token model to purge, like `APIToken` or `APIClient`.
+        now: the datetime to use to check the expiration. Defaults to the
+            current UTC datetime.
+        batch_size: the maximum number of objects to delete per transaction.
+        include_disabled: if set to True, disabled objects are deleted too,
+            even if they are not expired.
+        archive: a callable that is called with the objects of every batch
+            before they are deleted, for instance to copy them to a archive
+            table. The callable runs in the same transaction as the delete.
+
+    Returns:
+        The number of deleted objects.
+
+    Raises:
+        ValueError: the batch size is not positive.
+    """
+    if batch_size < 1:
+        raise ValueError('The batch size should be at least 1')
+
+    if now is None:
+        now = datetime.utcnow()
+
+    clauses = [col(model.expires) <= now]
+    if include_disabled:
+        clauses = [or_(clauses[0], col(model.enabled).is_(False))]
+    if issubclass(model, APIClient):
+        clauses.append(~exists().where(
+            col(APIToken.api_client_id) == col(model.id)))
+
+    deleted = 0
+    while True:
+        ids = session.exec(
+            select(model.id)
+            .where(*clauses)
+            .order_by(col(model.id))
+            .limit(batch_size)).all()
+        if not ids:
+            return deleted
+
+        if archive is not None:
+            archive(session.exec(
+                select(model).where(col(model.id).in_(ids))).all())
+
+        if issubclass(model, APIToken):
+            session.exec(  # type: ignore[call-overload]
+                delete(APITokenScope)
+                .where(col(APITokenScope.api_token_id).in_(ids)))
+        session.exec(  # type: ignore[call-overload]
+            delete(model).where(col(model.id).in_(ids)))
+        session.commit()
+        deleted += len(ids)
+
+
+def backfill_token_digests(session: Session,
+                           model: type[TokenModel],
+                           batch_size: int = 1000) -> int:
+    """Set the token digests for objects that only have a plaintext token.
+
+    Objects that where stored before the digest was derived from the token
+    can't be found by their digest. This routine sets the digests in batches
+    of `batch_size` objects and commits the session after every batch. If the
+    model doesn't store plaintext tokens, the plaintext tokens are cleared
+    too.
+
+    Args:
+        session: the SQLalchemy session to use.
+        model: the token model to fix, like `APIToken` or `APIClient`.
+        batch_size: the maximum number of objects to update per transaction.
+
+    Returns:
+        The number of updated objects.
+
+    Raises:
+        ValueError: the batch size is not positive.
+    """
+    if batch_size < 1:
+        raise ValueError('The batch size should be at least 1')
+
+    clauses = [col(model.token).is_not(None)]
+    if model.store_plaintext_token:
+        clauses.append(col(model.token_digest).is_(None))
+
+    updated = 0
+    while True:
+        objects = session.exec(
+            select(model)
+            .where(*clauses)
+            .order_by(col(model.id))
+            .limit(batch_size)).all()
+        if not objects:
+            return updated
+
+        for obj in objects:
+            if obj.token is not None:
+                set_attribute(obj, 'token_digest', token_digest(obj.token))
+            if not model.store_plaintext_token:
+                set_attribute(obj, 'token', None)
+        session.commit()
+        updated += len(objects)
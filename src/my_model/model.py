@@ -12,21 +12,84 @@ APITokenScope, which is used to link API Tokens to API Scopes. To get this
 working, we have to define the APIScope model in this module too.
 """
 
-import random
+import asyncio
+import hmac
+import secrets
 import string
+from collections.abc import Iterable, Mapping, Sequence
 from datetime import datetime
-from enum import Enum
-
-from argon2 import PasswordHasher
-from argon2.exceptions import VerifyMismatchError
-from pydantic import validate_call
-from pyotp import TOTP, random_base32
-from sqlmodel import Field, Relationship, SQLModel
+from functools import cache
+from typing import TYPE_CHECKING, Any, ClassVar, Literal, TypeVar
+
+from pydantic import BaseModel, TypeAdapter, create_model, validate_call
+from sqlalchemy import BigInteger, Index, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import (InstanceState, configure_mappers, joinedload,
+                            raiseload, selectinload)
+from sqlalchemy.orm.attributes import instance_state, set_attribute
+from sqlalchemy.orm.interfaces import LoaderOption
+from sqlmodel import Field, Relationship, Session, SQLModel, select
 from sqlmodel._compat import SQLModelConfig
 
+from .enums import UserRole
+from .instrumentation import instrumented
+from .passwords import (count_skipped_verification, get_hashing_executor,
+                        get_password_hasher, hash_password, uniform_timing,
+                        verify_password)
+from .second_factor import get_totp_verifier
+from .serialization import SerializationFormat, decode_model, encode_model
+from .tokens import ALPHANUMERIC, generate_tokens, token_digest
+from .validators import (COLOR_PATTERN, EMAIL_PATTERN, FULLNAME_PATTERN,
+                         REDIRECT_URL_PATTERN, SECOND_FACTOR_PATTERN,
+                         TOKEN_DIGEST_PATTERN, TOKEN_PATTERN, USERNAME_PATTERN,
+                         is_valid_token, is_valid_totp_code)
+
+if TYPE_CHECKING:
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+    from .settings import UserSettings
+    from .snapshots import Snapshot
+
 # from .global_models import APIScope, APITokenScope
 # from .my_model import MyModel
 
+__all__ = ['MAX_SCOPE_BITS', 'APIClient', 'APIScope', 'APIToken',
+           'APITokenScope', 'MyModel', 'Tag', 'TokenModel', 'User',
+           'UserRole', 'UserScopedModel', 'UserSetting']
+
+MAX_SCOPE_BITS = 63
+"""The maximum number of scopes that can get a bit in the scope mask. The
+mask is stored as a signed 64-bit integer."""
+
+MyModelType = TypeVar('MyModelType', bound='MyModel')
+
+_UPSERT_INSERTS: dict[str, Any] = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert
+}
+"""The `insert` constructs that support `ON CONFLICT`, per dialect."""
+
+
+@cache
+def _row_adapter(model: type[SQLModel]) -> TypeAdapter[list[BaseModel]]:
+    """Create the adapter that validates a list of rows for a model.
+
+    The rows are validated against a plain Pydantic model with the same
+    fields as the given model. This is a lot faster than creating instances
+    of the model itself. The adapter is created once per model.
+
+    Args:
+        model: the model to create the adapter for.
+
+    Returns:
+        A `TypeAdapter` that validates a list of rows in one call.
+    """
+    row_model = create_model(  # type: ignore[call-overload]
+        f'{model.__name__}Row',
+        **{name: (field.annotation, field)
+           for name, field in model.model_fields.items()})
+    return TypeAdapter(list[row_model])  # type: ignore[valid-type]
+
 
 class MyModel(SQLModel):
     """SQLmodel basemodel for all models.
@@ -38,17 +101,25 @@ class MyModel(SQLModel):
     Attributes:
         id: the unique ID for this object. If this object is used for a SQL
             database, it is the primary key.
+        load_profiles: the named load profiles for this model. See
+            `load_profile`.
+        sensitive_fields: the fields that are left out when a object is
+            serialized, unless they are requested explicitly. See `to_bytes`.
     """
 
     id: int | None = Field(default=None, primary_key=True)
     model_config = SQLModelConfig(validate_assignment=True)
 
+    load_profiles: ClassVar[dict[str, tuple[str, ...]]] = {}
+    sensitive_fields: ClassVar[frozenset[str]] = frozenset()
+
     # The `__pydantic_extra__` attribute is set to None, just to make sure the
     # library can find this attribute. It may be unneeded in future versions of
     # SQLmodel, but right now, in version `0.0.14`, is is needed or it will
     # trigger a error.
     __pydantic_extra__ = None
 
+    @instrumented
     @validate_call
     def get_random_string(self,
                           min_length: int,
@@ -73,34 +144,223 @@ class MyModel(SQLModel):
             A string with the randomly generated characters.
         """
         # Create the characterset
-        characters = string.ascii_letters
-        characters += string.digits
+        characters = ALPHANUMERIC
 
         if include_punctation:
             characters += string.punctuation
 
         # Create the random character string
-        length = random.randint(min_length, max_length)
-        random_token_chars = [random.choice(characters)
-                              for i in range(0, length)]
-        random_string = ''.join(random_token_chars)
+        length = min_length + secrets.randbelow(max_length - min_length + 1)
+        return generate_tokens(1, length, characters)[0]
 
-        # Return the created string
-        return random_string
+    @classmethod
+    def load_profile(cls,
+                     name: str | None,
+                     strict: bool = False) -> list[LoaderOption]:
+        """Return the loader options for a named load profile.
 
+        A load profile is a list of relationship paths, like `api_tokens` or
+        `api_tokens.token_scopes`, that should be loaded together with the
+        objects of this class. Collections are loaded with `selectinload` and
+        single objects with `joinedload`, so the number of queries depends on
+        the number of relationships and not on the number of objects.
 
-class UserRole(Enum):
-    """The roles a user can have.
+        With `strict`, the relationships that are not loaded by the profile
+        raise a error when they are used, instead of being loaded lazily. This
+        should be used with a `AsyncSession`, which can't load relationships
+        lazily; use `aload` to load them explicitly.
 
-    Attributes:
-        ROOT: for root users; users with god-mode permissions.
-        SERVICE: for service accounts.
-        USER: normal users
-    """
+        Example:
+            >>> select(User).options(*User.load_profile('dashboard'))
 
-    ROOT = 1
-    SERVICE = 2
-    USER = 3
+        Args:
+            name: the name of the profile, or None to load no relationships.
+            strict: if set to True, relationships that are not loaded by the
+                profile raise a error when they are used.
+
+        Returns:
+            A list with loader options that can be given to
+            `Select.options`.
+
+        Raises:
+            KeyError: the profile doesn't exist for this class.
+        """
+        configure_mappers()
+        options: list[LoaderOption] = [raiseload('*')] if strict else []
+        paths = () if name is None else cls.load_profiles[name]
+        for path in paths:
+            option: Any = None
+            model: Any = cls
+            for attribute_name in path.split('.'):
+                attribute = getattr(model, attribute_name)
+                loader = (selectinload if attribute.property.uselist
+                          else joinedload)
+                option = (loader(attribute) if option is None
+                          else getattr(option, loader.__name__)(attribute))
+                model = attribute.property.mapper.class_
+                if strict:
+                    options.append(option.raiseload('*'))
+            options.append(option)
+        return options
+
+    async def aload(self, session: 'AsyncSession', *names: str) -> None:
+        """Load relationships of this object with a async session.
+
+        A `AsyncSession` can't load relationships lazily, so relationships
+        that are not loaded by the query should be loaded with this method
+        before they are used. Relationships that are already loaded are not
+        loaded again.
+
+        Example:
+            >>> await user.aload(session, 'tags', 'user_settings')
+
+        Args:
+            session: the async SQLalchemy session of the object.
+            names: the names of the relationships to load.
+        """
+        unloaded = instance_state(self).unloaded
+        names = tuple(name for name in names if name in unloaded)
+        if names:
+            await session.refresh(self, attribute_names=names)
+
+    @classmethod
+    def _construct_trusted(cls: type[MyModelType],
+                           values: dict[str, Any],
+                           fields_set: set[str]) -> MyModelType:
+        """Create a object from values that are already validated.
+
+        No validation is done at all. For table models, the object is created
+        with the SQLalchemy state, so it can be added to a session.
+
+        Args:
+            values: the values for all fields.
+            fields_set: the names of the fields that where explicitly set.
+
+        Returns:
+            The created object.
+        """
+        manager = getattr(cls, '_sa_class_manager', None)
+        if manager is None:
+            return cls.model_construct(fields_set, **values)
+
+        instance = manager.new_instance()
+        instance.__dict__.update(values)
+        object.__setattr__(instance, '__pydantic_fields_set__', fields_set)
+        object.__setattr__(instance, '__pydantic_extra__', None)
+        object.__setattr__(instance, '__pydantic_private__', None)
+        return instance
+
+    @classmethod
+    @instrumented
+    def bulk_from_rows(
+            cls: type[MyModelType],
+            rows: Iterable[Mapping[str, Any]],
+            validate: Literal['once', 'each', 'none'] = 'once'
+    ) -> list[MyModelType]:
+        """Create objects for a batch of rows.
+
+        Creating objects one by one validates every field on assignment. This
+        method can be used to create a lot of objects at once, for instance
+        when importing data. Relationships cannot be set with this method;
+        keys that are not fields of the model are ignored. Objects that are
+        created with this method still validate assignments afterwards.
+
+        Args:
+            rows: the rows with the values for the objects.
+            validate: the validation mode. With `once`, all rows are
+                validated in one call and the objects are created without
+                further validation. With `each`, every row is validated with
+                `model_validate`. With `none`, the rows are trusted and not
+                validated at all; only the defaults are filled in.
+
+        Returns:
+            A list with the created objects, in the same order as the rows.
+
+        Raises:
+            ValueError: a unknown validation mode was given.
+        """
+        if validate not in ('once', 'each', 'none'):
+            raise ValueError(f'Unknown validation mode "{validate}"')
+
+        if validate == 'each':
+            return [cls.model_validate(row) for row in rows]
+
+        if hasattr(cls, '_sa_class_manager'):
+            configure_mappers()
+
+        if validate == 'once':
+            return [cls._construct_trusted(row.__dict__, row.model_fields_set)
+                    for row in _row_adapter(cls).validate_python(list(rows))]
+
+        objects = []
+        for row in rows:
+            values: dict[str, Any] = {}
+            fields_set = set()
+            for name, field in cls.model_fields.items():
+                if name in row:
+                    values[name] = row[name]
+                    fields_set.add(name)
+                else:
+                    values[name] = field.get_default(
+                        call_default_factory=True)
+            objects.append(cls._construct_trusted(values, fields_set))
+        return objects
+
+    def to_snapshot(self) -> 'Snapshot':
+        """Create a read-only snapshot of this object.
+
+        See `my_model.snapshots` for more information.
+
+        Returns:
+            The snapshot for this object.
+
+        Raises:
+            TypeError: there is no snapshot class for this model.
+        """
+        # pylint: disable=import-outside-toplevel
+        from .snapshots import snapshot_type
+        return snapshot_type(type(self)).from_model(self)
+
+    def to_bytes(self,
+                 format: SerializationFormat = 'json',
+                 include_sensitive: bool = False) -> bytes:
+        """Serialize this object to a compact format.
+
+        Relationships are not serialized. See `my_model.serialization` for
+        more information.
+
+        Args:
+            format: the format to use; `json` or `msgpack`.
+            include_sensitive: if set to True, the fields in
+                `sensitive_fields` are serialized too.
+
+        Returns:
+            The serialized object.
+        """
+        # pylint: disable=redefined-builtin
+        return encode_model(self, format, include_sensitive)
+
+    @classmethod
+    def from_bytes(cls: type[MyModelType],
+                   data: bytes,
+                   format: SerializationFormat = 'json',
+                   include_sensitive: bool = False,
+                   validate: bool = False) -> MyModelType:
+        """Deserialize a object that was serialized with `to_bytes`.
+
+        Args:
+            data: the serialized object.
+            format: the format of the serialized object.
+            include_sensitive: should be the same value as used for
+                serializing.
+            validate: if set to True, the values are validated. Should be
+                used for data from untrusted sources.
+
+        Returns:
+            The deserialized object.
+        """
+        # pylint: disable=redefined-builtin
+        return decode_model(cls, data, format, include_sensitive, validate)
 
 
 class User(MyModel, table=True):
@@ -121,25 +381,32 @@ class User(MyModel, table=True):
         api_clients: a list of API clients for this user.
         api_tokens: a list of API tokens for this user.
         tags: a list of tags for this user.
-        user_settings: a list of settings for this user.
+        user_settings: a list of settings for this user. Use `settings` for
+            typed access to the settings.
+        load_profiles: the load profiles for users. The `dashboard` profile
+            loads all relationships of the user and the `auth` profile loads
+            the API tokens with their scopes.
+        sensitive_fields: the password hash and the second factor are not
+            serialized by default.
     """
 
     created: datetime = Field(default_factory=datetime.utcnow)
-    fullname: str = Field(schema_extra={'pattern': r'^[A-Za-z0-9\- ]+$'},
-                          max_length=128)
+    fullname: str = Field(
+        schema_extra={'pattern': FULLNAME_PATTERN.pattern},
+        max_length=128)
     username: str = Field(
-        schema_extra={'pattern': r'^[a-zA-Z][a-zA-Z0-9_\.]+$'},
+        schema_extra={'pattern': USERNAME_PATTERN.pattern},
         max_length=128)
     email: str = Field(
-        schema_extra={
-            'pattern': r'^[a-z0-9_\-\.]+\@[a-z0-9_\-\.]+\.[a-z\.]+$'},
+        schema_extra={'pattern': EMAIL_PATTERN.pattern},
         max_length=128)
     role: UserRole = Field(default=UserRole.USER)
     password_hash: str | None = None
     password_date: datetime = Field(default_factory=datetime.utcnow)
     second_factor: None | str = Field(
         default=None,
-        schema_extra={'pattern': r'^[A-Z0-9]+$'}, max_length=64)
+        schema_extra={'pattern': SECOND_FACTOR_PATTERN.pattern},
+        max_length=64)
 
     # Relationships
     api_clients: list['APIClient'] = Relationship(back_populates='user')
@@ -147,17 +414,73 @@ class User(MyModel, table=True):
     tags: list['Tag'] = Relationship(back_populates='user')
     user_settings: list['UserSetting'] = Relationship(back_populates='user')
 
+    load_profiles: ClassVar[dict[str, tuple[str, ...]]] = {
+        'dashboard': ('api_clients', 'api_tokens', 'tags', 'user_settings'),
+        'auth': ('api_tokens.token_scopes',)
+    }
+    sensitive_fields: ClassVar[frozenset[str]] = frozenset(
+        {'password_hash', 'second_factor'})
+
+    @property
+    def settings(self) -> 'UserSettings':
+        """Property for typed access to the settings of the user.
+
+        See `my_model.settings` for more information.
+
+        Returns:
+            A `UserSettings` object for the user.
+        """
+        # pylint: disable=import-outside-toplevel
+        from .settings import UserSettings
+        return UserSettings(self)
+
+    async def aget_settings(self, session: 'AsyncSession') -> 'UserSettings':
+        """Return the typed settings of the user with a async session.
+
+        The settings are loaded first if they are not loaded yet, so the
+        returned object can be used without doing IO.
+
+        Args:
+            session: the async SQLalchemy session of the user.
+
+        Returns:
+            A `UserSettings` object for the user.
+        """
+        await self.aload(session, 'user_settings')
+        return self.settings
+
+    @instrumented
     @validate_call
-    def set_password(self, password: str) -> None:
+    def set_password(self, password: str, profile: str | None = None) -> None:
         """Set the password for the user.
 
         Args:
             password: the password for the user.
+            profile: the hasher profile to use. If set to None, the default
+                profile is used.
         """
-        hasher = PasswordHasher()
-        self.password_hash = hasher.hash(password)
+        self.password_hash = hash_password(password, profile)
         self.password_date = datetime.utcnow()
 
+    @validate_call
+    def needs_rehash(self, profile: str | None = None) -> bool:
+        """Check if the password hash uses outdated parameters.
+
+        Args:
+            profile: the hasher profile to compare with. If set to None, the
+                default profile is used.
+
+        Returns:
+            True if the password hash should be recalculated with the
+            parameters of the profile. False if the hash is up to date or if
+            no password is set.
+        """
+        if self.password_hash is None:
+            return False
+        return get_password_hasher(profile).check_needs_rehash(
+            self.password_hash)
+
+    @instrumented
     @validate_call
     def set_random_second_factor(self) -> str:
         """Set a random second factor secret for the user.
@@ -165,6 +488,8 @@ class User(MyModel, table=True):
         Returns:
             The generated second factor secret.
         """
+        # pylint: disable=import-outside-toplevel
+        from pyotp import random_base32
         self.second_factor = random_base32()
         return self.second_factor
 
@@ -173,38 +498,119 @@ class User(MyModel, table=True):
         """Disable the second factor for the user."""
         self.second_factor = None
 
+    @instrumented
     @validate_call
     def verify_credentials(self,
                            username: str,
                            password: str,
-                           second_factor: str | None = None) -> bool:
+                           second_factor: str | None = None,
+                           rehash: bool = False) -> bool:
         """Verify the credentials for a user.
 
+        The cheap checks (the username and the format of the second factor)
+        are done first. If one of these fails, the password is not hashed at
+        all, unless uniform timing is enabled in `my_model.passwords`. In that
+        case, the password is always verified, against a dummy hash if the
+        user has no password, so the latency doesn't reveal why a login
+        failed.
+
         Args:
             username: the username to verify
             password: the password to verify
             second_factor: the second factor for the user, or None if this
-                doesn't need to be validated.
+                doesn't need to be validated. The code is verified with the
+                verifier from `my_model.second_factor`, which tolerates clock
+                drift and refuses codes that are used before.
+            rehash: if set to True, the password hash is recalculated with the
+                default profile when the credentials are correct and the hash
+                uses outdated parameters. The `password_date` is not changed.
 
         Returns:
             True if the credentials where corret for this useraccount. False if
             these credentials where not correct.
         """
-        hasher = PasswordHasher()
-        try:
-            if self.password_hash:
-                credentials = (username == self.username and
-                               hasher.verify(self.password_hash, password))
-            else:
-                raise VerifyMismatchError
-        except VerifyMismatchError:
+        cheap_checks = hmac.compare_digest(username.encode(),
+                                           self.username.encode())
+        if self.second_factor:
+            cheap_checks &= (second_factor is not None and
+                             is_valid_totp_code(second_factor))
+
+        if not cheap_checks and not uniform_timing():
+            count_skipped_verification()
             return False
 
-        if self.second_factor:
-            return (credentials and
-                    second_factor == TOTP(self.second_factor).now())
+        if not verify_password(self.password_hash or None, password):
+            return False
+
+        if not cheap_checks:
+            return False
+
+        if self.second_factor and second_factor is not None:
+            user_key = self.id if self.id is not None else self.username
+            if not get_totp_verifier().verify(user_key,
+                                              self.second_factor,
+                                              second_factor):
+                return False
+
+        if rehash and self.needs_rehash():
+            self.password_hash = hash_password(password)
+
+        return True
+
+    @validate_call
+    async def averify_credentials(self,
+                                  username: str,
+                                  password: str,
+                                  second_factor: str | None = None,
+                                  rehash: bool = False) -> bool:
+        """Verify the credentials for a user without blocking the loop.
+
+        The verification is done in the hashing executor, so the event loop
+        can handle other work while the password is hashed.
+
+        Args:
+            username: the username to verify
+            password: the password to verify
+            second_factor: the second factor for the user, or None if this
+                doesn't need to be validated.
+            rehash: see `verify_credentials`.
+
+        Returns:
+            True if the credentials where corret for this useraccount. False if
+            these credentials where not correct.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            get_hashing_executor(),
+            self.verify_credentials,
+            username,
+            password,
+            second_factor,
+            rehash)
+
+    @staticmethod
+    def verify_many(
+            attempts: Sequence[tuple['User', str, str, str | None]]
+    ) -> list[bool]:
+        """Verify a batch of credentials in parallel.
+
+        The verifications are spread over the hashing executor, so the
+        throughput scales with the number of workers.
+
+        Args:
+            attempts: a sequence of tuples with the user, the username, the
+                password and the second factor to verify.
 
-        return credentials
+        Returns:
+            A list with the result for each attempt, in the same order as the
+            attempts.
+        """
+        executor = get_hashing_executor()
+        futures = [
+            executor.submit(user.verify_credentials,
+                            username, password, second_factor)
+            for user, username, password, second_factor in attempts]
+        return [future.result() for future in futures]
 
 
 class APITokenScope(SQLModel, table=True):
@@ -217,7 +623,7 @@ class APITokenScope(SQLModel, table=True):
 
     api_token_id: int = Field(
         default=None, foreign_key='apitoken.id', primary_key=True)
-    api_scope_id: str = Field(
+    api_scope_id: int = Field(
         default=None, foreign_key="apiscope.id", primary_key=True)
 
 
@@ -227,10 +633,15 @@ class APIScope(MyModel, table=True):
     Attributes:
         module: the module for the API scope.
         subject: the subject for the API scope.
+        bit_position: the position of the bit for this scope in the scope
+            mask of API tokens, or None if no position is assigned yet. See
+            `my_model.scopes` for the utilities to assign positions.
     """
 
     module: str = Field(max_length=32)
     subject: str = Field(max_length=32)
+    bit_position: int | None = Field(
+        default=None, ge=0, lt=MAX_SCOPE_BITS, unique=True)
 
     # Relationships
     api_tokens: list['APIToken'] = Relationship(
@@ -256,34 +667,245 @@ class UserScopedModel(MyModel):
     user. By putting this in a seperate base class, we can prevent duplicate
     code.
 
+    Almost every query for a user scoped model filters on the user, so every
+    table model that is derived from this class should declare a index that
+    starts with `user_id` in its `__table_args__`. If the model has a natural
+    key within the user, like the name of a setting, the index should be a
+    composite index on `user_id` and that key.
+
     Attributes:
         user_id: the unique ID for a user.
     """
 
     user_id: int | None = Field(default=None, foreign_key='user.id')
 
+    @classmethod
+    def _bulk_upsert(cls,
+                     session: Session,
+                     rows: Sequence[dict[str, Any]],
+                     key: str,
+                     batch_size: int) -> int:
+        """Insert or update a batch of rows on their natural key.
+
+        All rows are validated in one call. Then one `INSERT ... ON CONFLICT`
+        statement is executed per batch. This is supported for SQLite and
+        PostgreSQL. The table needs a unique index on `user_id` and the key.
+
+        Args:
+            session: the SQLalchemy session to use.
+            rows: the values for the rows. Every row should contain the
+                `user_id` and the key.
+            key: the name of the field that is unique within a user.
+            batch_size: the maximum number of rows per statement.
+
+        Returns:
+            The number of rows that where inserted or updated.
+
+        Raises:
+            NotImplementedError: the database is not SQLite or PostgreSQL.
+        """
+        dialect = session.get_bind().dialect.name
+        insert = _UPSERT_INSERTS.get(dialect)
+        if insert is None:
+            raise NotImplementedError(
+                f'Bulk upserts are not supported for "{dialect}"')
+
+        values = [
+            {name: value for name, value in row.__dict__.items()
+             if name != 'id'}
+            for row in _row_adapter(cls).validate_python(list(rows))]
+        if not values:
+            return 0
+
+        update_columns = [name for name in values[0]
+                          if name not in ('user_id', key)]
+        for start in range(0, len(values), batch_size):
+            statement = insert(cls).values(values[start:start + batch_size])
+            statement = statement.on_conflict_do_update(
+                index_elements=['user_id', key],
+                set_={name: statement.excluded[name]
+                      for name in update_columns})
+            session.exec(statement)  # type: ignore[call-overload]
+        return len(values)
+
+
+TokenModelType = TypeVar('TokenModelType', bound='TokenModel')
+
 
 class TokenModel(UserScopedModel):
     """Basemodel for classes that use tokens.
 
     Defines the `set_random_token` method that can and should be used to
-    generate a random token.
+    generate a random token and the `get_by_token` method to retrieve a object
+    by its token. The token column is indexed and unique, so the lookup is a
+    single index probe instead of a table scan.
+
+    The `expires` field defaults to the moment the object is created, so a
+    new object is expired until `expires` is set. Expired objects can be
+    removed with `my_model.maintenance.purge_expired_tokens`.
+
+    Next to the token, a keyed digest of the token is stored in the indexed
+    `token_digest` column. The digest is derived from the token when the
+    token is assigned and again when the object is flushed, so objects that
+    are created with a token get a digest too. When `store_plaintext_token`
+    is set to False on a class, the plaintext token is cleared when the
+    object is flushed, so only the digest is persisted and lookups are done
+    on the digest. Rows without a digest can be fixed with
+    `my_model.maintenance.backfill_token_digests`.
 
     Attributes:
+        store_plaintext_token: defines if the plaintext token should be stored
+            in the `token` field. If set to False, only the digest is stored.
         token: the token for the object
+        token_digest: the keyed digest for the token.
+        created: the datetime when this object was created.
+        expires: the datetime when this object will expire.
+        enabled: defines if the object is enabled.
+        sensitive_fields: the plaintext token is not serialized by default.
     """
 
     token: str | None = Field(
         default=None,
         min_length=32,
         max_length=32,
-        schema_extra={'pattern': r'^[a-zA-Z0-9]{32}$'}
+        schema_extra={'pattern': TOKEN_PATTERN.pattern},
+        index=True,
+        unique=True
     )
+    token_digest: str | None = Field(
+        default=None,
+        min_length=64,
+        max_length=64,
+        schema_extra={'pattern': TOKEN_DIGEST_PATTERN.pattern},
+        index=True,
+        unique=True
+    )
+    created: datetime = Field(default_factory=datetime.utcnow)
+    expires: datetime = Field(default_factory=datetime.utcnow)
+    enabled: bool = True
+
+    store_plaintext_token: ClassVar[bool] = True
+    sensitive_fields: ClassVar[frozenset[str]] = frozenset({'token'})
+
+    def is_valid(self, now: datetime | None = None) -> bool:
+        """Check if the object is enabled and not expired.
+
+        This does the same checks as `get_by_token`, for objects that are
+        already loaded.
+
+        Args:
+            now: the datetime to use to check the expiration. Defaults to the
+                current UTC datetime.
+
+        Returns:
+            True if the object is enabled and not expired, otherwise False.
+        """
+        if now is None:
+            now = datetime.utcnow()
+        return self.enabled and self.expires > now
+
+    @classmethod
+    @instrumented
+    def get_by_token(cls: type[TokenModelType],
+                     session: Session,
+                     token: str,
+                     now: datetime | None = None) -> TokenModelType | None:
+        """Retrieve a enabled and not expired object by its token.
+
+        The `enabled` and `expires` fields are checked in the same query as
+        the token, so only valid objects are returned. If the class doesn't
+        store plaintext tokens, the given token is hashed once and the
+        digest is used for the lookup. Tokens that don't have the format of a
+        token are refused without querying the database.
+
+        Args:
+            session: the SQLalchemy session to use for the query.
+            token: the token to search for.
+            now: the datetime to use to check the expiration. Defaults to the
+                current UTC datetime.
+
+        Returns:
+            The object with the given token, or None if no valid object is
+            found.
+        """
+        statement = cls._token_statement(token, now)
+        if statement is None:
+            return None
+        return session.exec(statement).first()
+
+    @classmethod
+    @instrumented
+    async def aget_by_token(cls: type[TokenModelType],
+                            session: 'AsyncSession',
+                            token: str,
+                            now: datetime | None = None,
+                            profile: str | None = None
+                            ) -> TokenModelType | None:
+        """Retrieve a enabled and not expired object with a async session.
+
+        Works like `get_by_token`. The relationships in the load profile are
+        loaded with the object; other relationships raise a error when they
+        are used, instead of doing IO. Use `aload` to load them.
 
+        Args:
+            session: the async SQLalchemy session to use for the query.
+            token: the token to search for.
+            now: the datetime to use to check the expiration. Defaults to the
+                current UTC datetime.
+            profile: the name of the load profile to load relationships with,
+                like `auth` for API tokens.
+
+        Returns:
+            The object with the given token, or None if no valid object is
+            found.
+        """
+        statement = cls._token_statement(token, now)
+        if statement is None:
+            return None
+        result = await session.exec(
+            statement.options(*cls.load_profile(profile, strict=True)))
+        return result.first()
+
+    @classmethod
+    def _token_statement(cls: type[TokenModelType],
+                         token: str,
+                         now: datetime | None) -> Any:
+        """Create the query for `get_by_token` and `aget_by_token`.
+
+        Args:
+            token: the token to search for.
+            now: the datetime to use to check the expiration, or None to use
+                the current UTC datetime.
+
+        Returns:
+            The select statement, or None if the token doesn't have the
+            format of a token.
+        """
+        if not is_valid_token(token):
+            return None
+
+        if now is None:
+            now = datetime.utcnow()
+
+        if cls.store_plaintext_token:
+            token_clause = cls.token == token
+        else:
+            token_clause = cls.token_digest == token_digest(token)
+
+        return select(cls).where(
+            token_clause,
+            cls.enabled == True,  # noqa: E712 pylint: disable=C0121
+            cls.expires > now)
+
+    @instrumented
     @validate_call
     def set_random_token(self, force: bool = False) -> str:
         """Set a random generated token.
 
+        The digest for the token is set too. If the class doesn't store
+        plaintext tokens, the `token` field is left empty and the returned
+        token is the only copy of it.
+
         Args:
             force: if set to True, the token will be generated even if None is
                 set. If set to False, a token will only be set if there is no
@@ -296,14 +918,13 @@ class TokenModel(UserScopedModel):
             PermissionError: a token was already set and `force` was not set to
             True.
         """
-        if self.token is None or force:
+        if (self.token is None and self.token_digest is None) or force:
             # Generate random token
-            self.token = self.get_random_string(
-                min_length=32,
-                max_length=32,
-                include_punctation=False)
+            token = generate_tokens(1, 32)[0]
 
-            return self.token
+            self.token_digest = token_digest(token)
+            self.token = token if self.store_plaintext_token else None
+            return token
 
         # Token was already set but force wasn't; raise an error
         raise PermissionError('Token is already set')
@@ -313,9 +934,6 @@ class APIClient(TokenModel, table=True):
     """Model for API clients.
 
     Attributes:
-        created: the datetime when this client was created.
-        expires: the datetime when this client will expire.
-        enabled: defines it the client is enabled.
         app_name: the name for the app.
         app_publisher: the name for the publisher of the app.
         redirect_url: a URL where the user will be redirected after a token has
@@ -323,14 +941,16 @@ class APIClient(TokenModel, table=True):
         user: the user object for the owner.
     """
 
-    created: datetime = Field(default_factory=datetime.utcnow)
-    expires: datetime = Field(default_factory=datetime.utcnow)
-    enabled: bool = True
+    __table_args__ = (
+        Index('ix_apiclient_user_id', 'user_id'),
+        Index('ix_apiclient_enabled_expires', 'enabled', 'expires'),
+    )
+
     app_name: str = Field(max_length=64)
     app_publisher: str = Field(max_length=64)
     redirect_url: str | None = Field(
         default=None,
-        schema_extra={'pattern': r'^https?://'},
+        schema_extra={'pattern': REDIRECT_URL_PATTERN.pattern},
         max_length=1024)
 
     # Relationships
@@ -342,20 +962,26 @@ class APIToken(TokenModel, table=True):
     """Model for API clients.
 
     Attributes:
-        created: the datetime when this token was created.
-        expires: the datetime when this token will expire.
         api_client_id: the API Client for this token. This field is optional
             because
-        enabled: defines it the token is enabled.
         title: the title for the token.
+        load_profiles: the load profiles for API tokens. The `auth` profile
+            loads the user and the scopes for the token.
+        scope_mask: a bitmask with a bit set for every scope of this token.
+            The link table is the source of truth; the mask is kept up to date
+            when `token_scopes` is changed and can be rebuilt with
+            `my_model.scopes.rebuild_scope_masks`.
         user: the user object for the owner.
     """
 
-    created: datetime = Field(default_factory=datetime.utcnow)
-    expires: datetime = Field(default_factory=datetime.utcnow)
+    __table_args__ = (
+        Index('ix_apitoken_user_id', 'user_id'),
+        Index('ix_apitoken_enabled_expires', 'enabled', 'expires'),
+    )
+
     api_client_id: int | None = Field(default=None, foreign_key='apiclient.id')
-    enabled: bool = True
     title: str = Field(max_length=64)
+    scope_mask: int = Field(default=0, ge=0, sa_type=BigInteger)
 
     # Relationships
     user: User = Relationship(back_populates='api_tokens')
@@ -364,6 +990,198 @@ class APIToken(TokenModel, table=True):
         back_populates='api_tokens',
         link_model=APITokenScope)
 
+    load_profiles: ClassVar[dict[str, tuple[str, ...]]] = {
+        'auth': ('user', 'token_scopes')
+    }
+
+    @property
+    def scope_names(self) -> frozenset[str]:
+        """Property for the full names of the scopes of this token.
+
+        The names are calculated once and cached on the token. The cache is
+        invalidated automatically when `token_scopes` is changed through the
+        relationship or when the token is expired or refreshed by the session.
+        When the link table is changed in another way, `invalidate_scopes`
+        should be called.
+
+        Returns:
+            A frozenset with the full scope names.
+        """
+        info = instance_state(self).info
+        scope_names = info.get('scope_names')
+        if scope_names is None:
+            scope_names = frozenset(
+                scope.full_scope_name for scope in self.token_scopes)
+            info['scope_names'] = scope_names
+        return scope_names
+
+    async def aget_scope_names(self,
+                               session: 'AsyncSession') -> frozenset[str]:
+        """Return the full names of the scopes with a async session.
+
+        The scopes are loaded first if they are not loaded yet.
+
+        Args:
+            session: the async SQLalchemy session of the token.
+
+        Returns:
+            A frozenset with the full scope names.
+        """
+        await self.aload(session, 'token_scopes')
+        return self.scope_names
+
+    def invalidate_scopes(self) -> None:
+        """Invalidate the cached scope names for this token."""
+        instance_state(self).info.pop('scope_names', None)
+
+    def has_scope(self, scope: str) -> bool:
+        """Check if the token has a specific scope.
+
+        Args:
+            scope: the full name of the scope, like `module.subject`.
+
+        Returns:
+            True if the token has the scope, otherwise False.
+        """
+        return scope in self.scope_names
+
+    def has_scopes(self, scopes: Iterable[str]) -> bool:
+        """Check if the token has all given scopes.
+
+        Args:
+            scopes: the full names of the scopes, like `module.subject`.
+
+        Returns:
+            True if the token has all scopes, otherwise False.
+        """
+        return self.scope_names.issuperset(scopes)
+
+    def has_scope_mask(self, mask: int) -> bool:
+        """Check if the token has all scopes in a scope mask.
+
+        Args:
+            mask: the scope mask to check, for instance created with
+                `my_model.scopes.ScopeRegistry.mask`.
+
+        Returns:
+            True if the token has all scopes in the mask, otherwise False.
+        """
+        return self.scope_mask & mask == mask
+
+
+@event.listens_for(APIToken.token_scopes, 'append')
+@event.listens_for(APIToken.token_scopes, 'remove')
+@event.listens_for(APIToken.token_scopes, 'bulk_replace')
+def _invalidate_scopes_on_change(target: APIToken, *_: Any) -> None:
+    """Invalidate the scope cache when the scopes of a token change.
+
+    Args:
+        target: the token that was changed.
+    """
+    target.invalidate_scopes()
+
+
+# The scope mask is set with `set_attribute` in the event listeners below. An
+# assignment through Pydantic replaces the `__dict__` of the object, which
+# breaks the change of the relationship that is in progress.
+
+
+@event.listens_for(APIToken.token_scopes, 'append')
+def _add_scope_to_mask(target: APIToken, value: APIScope, *_: Any) -> None:
+    """Set the bit for a scope that is added to a token.
+
+    Args:
+        target: the token that was changed.
+        value: the scope that was added.
+    """
+    if value.bit_position is not None:
+        set_attribute(target, 'scope_mask',
+                      target.scope_mask | 1 << value.bit_position)
+
+
+@event.listens_for(APIToken.token_scopes, 'remove')
+def _remove_scope_from_mask(target: APIToken,
+                            value: APIScope,
+                            *_: Any) -> None:
+    """Clear the bit for a scope that is removed from a token.
+
+    Args:
+        target: the token that was changed.
+        value: the scope that was removed.
+    """
+    if value.bit_position is not None:
+        set_attribute(target, 'scope_mask',
+                      target.scope_mask & ~(1 << value.bit_position))
+
+
+@event.listens_for(APIToken.token_scopes, 'bulk_replace')
+def _replace_scope_mask(target: APIToken,
+                        values: list[APIScope],
+                        *_: Any) -> None:
+    """Recalculate the scope mask when all scopes of a token are replaced.
+
+    Args:
+        target: the token that was changed.
+        values: the new scopes for the token.
+    """
+    mask = 0
+    for scope in values:
+        if scope.bit_position is not None:
+            mask |= 1 << scope.bit_position
+    set_attribute(target, 'scope_mask', mask)
+
+
+@event.listens_for(APIToken, 'expire', raw=True)
+@event.listens_for(APIToken, 'refresh', raw=True)
+def _invalidate_scopes_on_reload(state: InstanceState[APIToken],
+                                 *_: Any) -> None:
+    """Invalidate the scope cache when a token is expired or refreshed.
+
+    The raw instance state is used, because the token itself can already be
+    garbage collected when it is expired.
+
+    Args:
+        state: the instance state of the token that was expired or
+            refreshed.
+    """
+    state.info.pop('scope_names', None)
+
+
+@event.listens_for(APIClient.token, 'set')
+@event.listens_for(APIToken.token, 'set')
+def _derive_token_digest(target: TokenModel, value: str | None,
+                         *_: Any) -> None:
+    """Set the digest for a token that is assigned.
+
+    Args:
+        target: the object that the token is assigned to.
+        value: the assigned token.
+    """
+    if value is not None:
+        set_attribute(target, 'token_digest', token_digest(value))
+
+
+@event.listens_for(TokenModel, 'before_insert', propagate=True)
+@event.listens_for(TokenModel, 'before_update', propagate=True)
+def _store_token_digest(_mapper: Any, _connection: Any,
+                        target: TokenModel) -> None:
+    """Make sure the digest matches the token before a object is stored.
+
+    This covers objects where the digest is not derived on assignment, like
+    objects that are created with a token or with `bulk_from_rows`. The
+    plaintext token is cleared for classes that don't store it.
+
+    Args:
+        target: the object that is stored.
+    """
+    if target.token is None:
+        return
+    digest = token_digest(target.token)
+    if target.token_digest != digest:
+        set_attribute(target, 'token_digest', digest)
+    if not target.store_plaintext_token:
+        set_attribute(target, 'token', None)
+
 
 class Tag(UserScopedModel, table=True):
     """Model for Tags.
@@ -380,14 +1198,45 @@ class Tag(UserScopedModel, table=True):
         user: the user object for the owner.
     """
 
+    __table_args__ = (Index('ix_tag_user_id_title',
+                            'user_id', 'title', unique=True),)
+
     title: str = Field(max_length=128)
     color: str | None = Field(
-        default=None, schema_extra={'pattern': r'^[a-fA-F0-9]{6}$'},
+        default=None, schema_extra={'pattern': COLOR_PATTERN.pattern},
         min_length=6, max_length=6)
 
     # Relationships
     user: User = Relationship(back_populates='tags')
 
+    @classmethod
+    def bulk_upsert(cls,
+                    session: Session,
+                    user_id: int,
+                    mapping: Mapping[str, str | None],
+                    batch_size: int = 500) -> int:
+        """Create or update the tags for a user in bulk.
+
+        Tags that already exist for the user get the new color. Objects for
+        these tags that are already loaded in the session are not updated;
+        expire them to load the new values. The changes are not committed.
+
+        Args:
+            session: the SQLalchemy session to use.
+            user_id: the ID of the user for the tags.
+            mapping: a mapping with the title and the color for every tag.
+            batch_size: the maximum number of tags per statement.
+
+        Returns:
+            The number of tags that where created or updated.
+        """
+        return cls._bulk_upsert(
+            session,
+            [{'user_id': user_id, 'title': title, 'color': color}
+             for title, color in mapping.items()],
+            key='title',
+            batch_size=batch_size)
+
 
 class UserSetting(UserScopedModel, table=True):
     """Model for User Settings.
@@ -402,8 +1251,40 @@ class UserSetting(UserScopedModel, table=True):
         user: the user object for the owner.
     """
 
+    __table_args__ = (Index('ix_usersetting_user_id_setting',
+                            'user_id', 'setting', unique=True),)
+
     setting: str = Field(max_length=32)
     value: str = Field(max_length=32)
 
     # Relationships
     user: User = Relationship(back_populates='user_settings')
+
+    @classmethod
+    def bulk_upsert(cls,
+                    session: Session,
+                    user_id: int,
+                    mapping: Mapping[str, str],
+                    batch_size: int = 500) -> int:
+        """Create or update the settings for a user in bulk.
+
+        The values are stored as given; use `User.settings` to store typed
+        values. Objects for these settings that are already loaded in the
+        session, and the cached settings of the user, are not updated; expire
+        them to load the new values. The changes are not committed.
+
+        Args:
+            session: the SQLalchemy session to use.
+            user_id: the ID of the user for the settings.
+            mapping: a mapping with the name and the value for every setting.
+            batch_size: the maximum number of settings per statement.
+
+        Returns:
+            The number of settings that where created or updated.
+        """
+        return cls._bulk_upsert(
+            session,
+            [{'user_id': user_id, 'setting': setting, 'value': value}
+             for setting, value in mapping.items()],
+            key='setting',
+            batch_size=batch_size)
@@ -0,0 +1,304 @@
+"""Module that contains the registry for password hashers.
+
+Creating a `PasswordHasher` for every password operation is wasteful and
+always uses the library defaults. This module keeps a registry of named cost
+profiles and caches one `PasswordHasher` per profile. The default profile is
+used by `User.set_password` and `User.verify_credentials` unless a specific
+profile is requested.
+
+The following profiles are registered by default:
+
+- `interactive`: the RFC 9106 low memory profile. Should be used for logins.
+- `batch_import`: the same cost as `interactive`, but single threaded so many
+  hashes can be calculated in parallel when importing users.
+- `test`: the cheapest possible profile. Should only be used in tests.
+
+All hashes and verifications that go through this module are counted, so
+the amount of CPU spent on password hashing can be monitored with
+`get_hash_counters`. When uniform timing is enabled with
+`set_uniform_timing`, verifications for accounts without a password hash are
+done against a precomputed dummy hash, so the latency doesn't reveal if an
+account exists.
+
+Argon2 releases the GIL while hashing, so hashes can be calculated in
+parallel threads. The module keeps a bounded executor for this that is used
+by `User.averify_credentials` and `User.verify_many`.
+
+The `argon2` package is only imported when the first password is hashed or
+verified, so processes that never handle passwords don't pay for loading it.
+"""
+
+import os
+import secrets
+from collections import Counter
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import replace
+from threading import Lock
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from argon2 import Parameters, PasswordHasher
+
+__all__ = ['get_hash_counters',
+           'get_hashing_executor',
+           'get_password_hasher',
+           'hash_password',
+           'register_hasher_profile',
+           'reset_hash_counters',
+           'set_default_hasher_profile',
+           'set_hashing_executor',
+           'set_uniform_timing',
+           'verify_dummy_password',
+           'verify_password']
+
+_BUILTIN_PROFILES = ('interactive', 'batch_import', 'test')
+
+_profiles: dict[str, 'Parameters | None'] = dict.fromkeys(_BUILTIN_PROFILES)
+_hashers: dict[str, 'PasswordHasher'] = {}
+_dummy_hashes: dict[str, str] = {}
+_default_profile = 'interactive'
+_executor: Executor | None = None
+_uniform_timing = False
+_counters: Counter[str] = Counter()
+_counters_lock = Lock()
+
+
+def _builtin_parameters(name: str) -> 'Parameters':
+    """Return the Argon2 parameters for a builtin profile.
+
+    Args:
+        name: the name of the builtin profile.
+
+    Returns:
+        The parameters for the profile.
+    """
+    # pylint: disable=import-outside-toplevel
+    from argon2.profiles import CHEAPEST, RFC_9106_LOW_MEMORY
+    return {
+        'interactive': RFC_9106_LOW_MEMORY,
+        'batch_import': replace(RFC_9106_LOW_MEMORY, parallelism=1),
+        'test': CHEAPEST
+    }[name]
+
+
+def register_hasher_profile(name: str, parameters: 'Parameters') -> None:
+    """Register a cost profile for password hashing.
+
+    Registering a profile with a existing name replaces that profile.
+
+    Args:
+        name: the name for the profile.
+        parameters: the Argon2 parameters for the profile.
+    """
+    _profiles[name] = parameters
+    _hashers.pop(name, None)
+    _dummy_hashes.pop(name, None)
+
+
+def set_default_hasher_profile(name: str) -> None:
+    """Set the profile that is used when no profile is given.
+
+    Args:
+        name: the name of the profile.
+
+    Raises:
+        KeyError: the profile is not registered.
+    """
+    global _default_profile  # pylint: disable=global-statement
+    if name not in _profiles:
+        raise KeyError(f'Hasher profile "{name}" is not registered')
+    _default_profile = name
+
+
+def get_password_hasher(profile: str | None = None) -> 'PasswordHasher':
+    """Return the cached password hasher for a profile.
+
+    Args:
+        profile: the name of the profile. If set to None, the default profile
+            is used.
+
+    Returns:
+        The `PasswordHasher` for the profile.
+    """
+    if profile is None:
+        profile = _default_profile
+
+    hasher = _hashers.get(profile)
+    if hasher is None:
+        # pylint: disable=import-outside-toplevel
+        from argon2 import PasswordHasher
+
+        parameters = _profiles[profile]
+        if parameters is None:
+            parameters = _builtin_parameters(profile)
+        hasher = PasswordHasher.from_parameters(parameters)
+        _hashers[profile] = hasher
+    return hasher
+
+
+def _count(counter: str) -> None:
+    """Increase a hash counter by one.
+
+    Args:
+        counter: the name of the counter.
+    """
+    with _counters_lock:
+        _counters[counter] += 1
+
+
+def get_hash_counters() -> dict[str, int]:
+    """Return the hash counters.
+
+    The following counters are kept:
+
+    - `hash`: the number of password hashes that where calculated.
+    - `verify`: the number of verifications against a real password hash.
+    - `dummy`: the number of verifications against the dummy hash.
+    - `skipped`: the number of verifications that where skipped because a
+      cheap check already failed.
+
+    Returns:
+        A dict with the name and value for each counter.
+    """
+    with _counters_lock:
+        return {name: _counters[name]
+                for name in ('hash', 'verify', 'dummy', 'skipped')}
+
+
+def reset_hash_counters() -> None:
+    """Reset all hash counters to zero."""
+    with _counters_lock:
+        _counters.clear()
+
+
+def count_skipped_verification() -> None:
+    """Count a verification that was skipped before hashing."""
+    _count('skipped')
+
+
+def set_uniform_timing(enabled: bool) -> None:
+    """Enable or disable uniform timing for password verification.
+
+    With uniform timing, a password is always verified against a hash, even
+    when a cheap check already failed or when no password hash is set. This
+    costs CPU, but makes the latency independent of the reason of a failure.
+
+    Args:
+        enabled: defines if uniform timing should be used.
+    """
+    global _uniform_timing  # pylint: disable=global-statement
+    _uniform_timing = enabled
+
+
+def uniform_timing() -> bool:
+    """Return if uniform timing is enabled.
+
+    Returns:
+        True if uniform timing is enabled, otherwise False.
+    """
+    return _uniform_timing
+
+
+def hash_password(password: str, profile: str | None = None) -> str:
+    """Hash a password.
+
+    Args:
+        password: the password to hash.
+        profile: the hasher profile to use. If set to None, the default
+            profile is used.
+
+    Returns:
+        The encoded Argon2 hash for the password.
+    """
+    _count('hash')
+    return get_password_hasher(profile).hash(password)
+
+
+def verify_dummy_password(password: str) -> bool:
+    """Verify a password against the dummy hash.
+
+    Should be used when a login is done for a account that doesn't exist, so
+    the latency is the same as for a existing account. The dummy hash is
+    calculated once per profile.
+
+    Args:
+        password: the password to verify.
+
+    Returns:
+        Always False.
+    """
+    profile = _default_profile
+    dummy_hash = _dummy_hashes.get(profile)
+    if dummy_hash is None:
+        dummy_hash = get_password_hasher(profile).hash(
+            secrets.token_urlsafe(32))
+        _dummy_hashes[profile] = dummy_hash
+
+    # pylint: disable=import-outside-toplevel
+    from argon2.exceptions import VerifyMismatchError
+
+    _count('dummy')
+    try:
+        get_password_hasher(profile).verify(dummy_hash, password)
+    except VerifyMismatchError:
+        pass
+    return False
+
+
+def verify_password(password_hash: str | None, password: str) -> bool:
+    """Verify a password against a hash.
+
+    If no hash is given, the password is verified against the dummy hash when
+    uniform timing is enabled. Otherwise, no hashing is done at all.
+
+    Args:
+        password_hash: the encoded Argon2 hash, or None if no password is set.
+        password: the password to verify.
+
+    Returns:
+        True if the password matches the hash, otherwise False.
+    """
+    if password_hash is None:
+        if _uniform_timing:
+            return verify_dummy_password(password)
+        _count('skipped')
+        return False
+
+    # pylint: disable=import-outside-toplevel
+    from argon2.exceptions import VerifyMismatchError
+
+    _count('verify')
+    try:
+        return get_password_hasher().verify(password_hash, password)
+    except VerifyMismatchError:
+        return False
+
+
+def set_hashing_executor(executor: Executor | None) -> None:
+    """Set the executor that is used to offload password hashing.
+
+    The previous executor is not shut down; that is the responsibility of
+    the caller.
+
+    Args:
+        executor: the executor to use. If set to None, a default thread pool
+            is created on first use.
+    """
+    global _executor  # pylint: disable=global-statement
+    _executor = executor
+
+
+def get_hashing_executor() -> Executor:
+    """Return the executor that is used to offload password hashing.
+
+    If no executor is set, a thread pool with one worker per CPU is created.
+
+    Returns:
+        The executor for password hashing.
+    """
+    global _executor  # pylint: disable=global-statement
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=os.cpu_count(),
+            thread_name_prefix='my_model_hashing')
+    return _executor
@@ -0,0 +1,200 @@
+"""Module that contains the utilities for scope masks.
+
+Every `APIScope` can get a stable bit position. An `APIToken` keeps a
+bitmask with the bits of its scopes set, so checking if a token has a set of
+scopes is a single integer operation. The link table `APITokenScope` stays
+the source of truth: the masks are updated when `APIToken.token_scopes` is
+changed, and can be rebuilt from the link table with `rebuild_scope_masks`
+when scopes or links are changed in another way.
+"""
+
+from collections import defaultdict
+from collections.abc import Iterable, Mapping
+from typing import TYPE_CHECKING, Any
+
+from sqlalchemy import update
+from sqlmodel import Session, col, select
+
+from .model import MAX_SCOPE_BITS, APIScope, APIToken, APITokenScope
+
+if TYPE_CHECKING:
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+__all__ = ['ScopeRegistry', 'assign_scope_bits', 'rebuild_scope_masks']
+
+
+class ScopeRegistry:
+    """Registry that maps full scope names to bit positions.
+
+    The registry should be loaded once, for instance when a service starts,
+    and can then be used to create the masks for the scopes that a endpoint
+    requires.
+    """
+
+    def __init__(self, bit_positions: Mapping[str, int]) -> None:
+        """Create the registry.
+
+        Args:
+            bit_positions: a mapping with the full scope name and the bit
+                position for each scope.
+        """
+        self._bit_positions = dict(bit_positions)
+
+    @classmethod
+    def load(cls, session: Session) -> 'ScopeRegistry':
+        """Load the registry from the database.
+
+        Scopes without a bit position are skipped.
+
+        Args:
+            session: the SQLalchemy session to use for the query.
+
+        Returns:
+            The loaded registry.
+        """
+        return cls._from_scopes(session.exec(cls._statement()))
+
+    @classmethod
+    async def aload(cls, session: 'AsyncSession') -> 'ScopeRegistry':
+        """Load the registry from the database with a async session.
+
+        Scopes without a bit position are skipped.
+
+        Args:
+            session: the async SQLalchemy session to use for the query.
+
+        Returns:
+            The loaded registry.
+        """
+        return cls._from_scopes(await session.exec(cls._statement()))
+
+    @staticmethod
+    def _statement() -> Any:
+        """Create the query for the scopes with a bit position.
+
+        Returns:
+            The select statement.
+        """
+        return select(APIScope).where(
+            col(APIScope.bit_position).is_not(None))
+
+    @classmethod
+    def _from_scopes(cls, scopes: Iterable[APIScope]) -> 'ScopeRegistry':
+        """Create the registry from the loaded scopes.
+
+        Args:
+            scopes: the scopes with a bit position.
+
+        Returns:
+            The created registry.
+        """
+        return cls({scope.full_scope_name: scope.bit_position
+                    for scope in scopes
+                    if scope.bit_position is not None})
+
+    def bit_position(self, scope: str) -> int:
+        """Return the bit position for a scope.
+
+        Args:
+            scope: the full name of the scope.
+
+        Returns:
+            The bit position for the scope.
+
+        Raises:
+            KeyError: the scope has no bit position.
+        """
+        return self._bit_positions[scope]
+
+    def mask(self, scopes: Iterable[str]) -> int:
+        """Create the mask for a set of scopes.
+
+        Args:
+            scopes: the full names of the scopes.
+
+        Returns:
+            A integer with the bits for all scopes set.
+
+        Raises:
+            KeyError: one of the scopes has no bit position.
+        """
+        mask = 0
+        for scope in scopes:
+            mask |= 1 << self._bit_positions[scope]
+        return mask
+
+
+def assign_scope_bits(session: Session) -> int:
+    """Assign a bit position to all scopes that don't have one.
+
+    Scopes get the lowest free bit position, in the order of their ID. The
+    positions of scopes that already have one are never changed. The changes
+    are flushed, but not committed.
+
+    Args:
+        session: the SQLalchemy session to use.
+
+    Returns:
+        The number of scopes that got a bit position.
+
+    Raises:
+        ValueError: there are more scopes than bit positions.
+    """
+    used = set(session.exec(
+        select(APIScope.bit_position).where(
+            col(APIScope.bit_position).is_not(None))))
+    free = (position for position in range(MAX_SCOPE_BITS)
+            if position not in used)
+
+    scopes = session.exec(
+        select(APIScope)
+        .where(col(APIScope.bit_position).is_(None))
+        .order_by(col(APIScope.id))).all()
+    for scope in scopes:
+        position = next(free, None)
+        if position is None:
+            raise ValueError(
+                f'No free bit positions; at most {MAX_SCOPE_BITS} scopes '
+                'can be used in scope masks')
+        scope.bit_position = position
+
+    session.flush()
+    return len(scopes)
+
+
+def rebuild_scope_masks(session: Session, batch_size: int = 1000) -> int:
+    """Recalculate the scope masks for all API tokens from the link table.
+
+    The links are read with one query and the masks are only written for
+    tokens where the mask changed, in batches. The changes are flushed, but
+    not committed.
+
+    Args:
+        session: the SQLalchemy session to use.
+        batch_size: the number of tokens to update per statement.
+
+    Returns:
+        The number of tokens for which the mask was changed.
+    """
+    masks: defaultdict[int, int] = defaultdict(int)
+    links = session.exec(
+        select(APITokenScope.api_token_id, APIScope.bit_position)
+        .join(APIScope, col(APIScope.id) == APITokenScope.api_scope_id)
+        .where(col(APIScope.bit_position).is_not(None)))
+    for token_id, position in links:
+        if position is not None:
+            masks[token_id] |= 1 << position
+
+    changes = []
+    tokens = session.exec(select(APIToken.id, APIToken.scope_mask))
+    for api_token_id, scope_mask in tokens:
+        if api_token_id is not None and masks[api_token_id] != scope_mask:
+            changes.append(
+                {'id': api_token_id, 'scope_mask': masks[api_token_id]})
+
+    for start in range(0, len(changes), batch_size):
+        session.exec(update(APIToken),  # type: ignore[call-overload]
+                     params=changes[start:start + batch_size])
+
+    session.flush()
+    return len(changes)
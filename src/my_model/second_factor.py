@@ -0,0 +1,188 @@
+"""Module that contains the verification of second factor codes.
+
+The second factor of a user is a TOTP secret. The `TOTPVerifier` in this
+module verifies codes for these secrets. It decodes every secret once and
+caches the result, accepts codes from a configurable number of time steps
+before and after the current one to tolerate clock drift, and remembers the
+last accepted time step per user so a code cannot be used twice. The memory
+for this is bounded: only the most recent users are remembered, and entries
+that are older than the window are useless and dropped first.
+"""
+
+import base64
+import hashlib
+import hmac
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from functools import lru_cache
+from threading import Lock
+
+__all__ = ['TOTPVerifier', 'get_totp_verifier', 'set_totp_verifier']
+
+
+@lru_cache(maxsize=4096)
+def _decode_secret(secret: str) -> bytes:
+    """Decode a base32 TOTP secret.
+
+    Args:
+        secret: the base32 encoded secret.
+
+    Returns:
+        The decoded secret.
+    """
+    padding = '=' * (-len(secret) % 8)
+    return base64.b32decode(secret + padding, casefold=True)
+
+
+def _hotp(key: bytes, counter: int, digits: int) -> str:
+    """Calculate a HOTP code as described in RFC 4226.
+
+    Args:
+        key: the decoded secret.
+        counter: the counter, which is the time step for TOTP.
+        digits: the number of digits for the code.
+
+    Returns:
+        The code for the counter.
+    """
+    digest = hmac.new(key, counter.to_bytes(8, 'big'), hashlib.sha1).digest()
+    offset = digest[-1] & 0x0F
+    code = int.from_bytes(digest[offset:offset + 4], 'big') & 0x7FFFFFFF
+    return str(code % 10 ** digits).zfill(digits)
+
+
+class TOTPVerifier:
+    """Verifier for TOTP codes with drift tolerance and replay protection.
+
+    Attributes:
+        window: the number of time steps before and after the current time
+            step for which codes are accepted.
+        interval: the length of a time step in seconds.
+        digits: the number of digits in a code.
+        replay_cache_size: the maximum number of users for which the last
+            accepted time step is remembered.
+    """
+
+    def __init__(self,
+                 window: int = 1,
+                 interval: int = 30,
+                 digits: int = 6,
+                 replay_cache_size: int = 100_000) -> None:
+        """Create the verifier.
+
+        Args:
+            window: the number of time steps before and after the current
+                time step for which codes are accepted.
+            interval: the length of a time step in seconds.
+            digits: the number of digits in a code.
+            replay_cache_size: the maximum number of users for which the
+                last accepted time step is remembered.
+        """
+        self.window = window
+        self.interval = interval
+        self.digits = digits
+        self.replay_cache_size = replay_cache_size
+        self._used_steps: OrderedDict[Hashable, int] = OrderedDict()
+        self._lock = Lock()
+
+    def codes(self, secret: str, now: float | None = None) -> dict[int, str]:
+        """Return the accepted codes for a secret.
+
+        Args:
+            secret: the base32 encoded secret.
+            now: the UNIX timestamp to calculate the codes for. Defaults to
+                the current time.
+
+        Returns:
+            A dict with the time step and the code for every accepted time
+            step.
+        """
+        if now is None:
+            now = time.time()
+        key = _decode_secret(secret)
+        current = int(now // self.interval)
+        return {step: _hotp(key, step, self.digits)
+                for step in range(current - self.window,
+                                  current + self.window + 1)}
+
+    def verify(self,
+               user: Hashable,
+               secret: str,
+               code: str,
+               now: float | None = None) -> bool:
+        """Verify a code for a user.
+
+        The code is compared with the codes for all time steps in the window.
+        A code is refused if a code for the same or a later time step was
+        already accepted for the user.
+
+        Args:
+            user: a unique key for the user, like the ID.
+            secret: the base32 encoded secret of the user.
+            code: the code to verify.
+            now: the UNIX timestamp to verify the code for. Defaults to the
+                current time.
+
+        Returns:
+            True if the code is correct and not used before, otherwise False.
+        """
+        matched_step = None
+        for step, expected in self.codes(secret, now).items():
+            if hmac.compare_digest(expected, code):
+                matched_step = step
+
+        if matched_step is None:
+            return False
+
+        with self._lock:
+            last_step = self._used_steps.get(user)
+            if last_step is not None and matched_step <= last_step:
+                return False
+            self._used_steps[user] = matched_step
+            self._used_steps.move_to_end(user)
+            self._evict(matched_step)
+        return True
+
+    def _evict(self, current_step: int) -> None:
+        """Remove entries from the front of the replay cache.
+
+        The entries are kept in the order in which the codes where accepted,
+        so the entries at the front have the oldest time steps. Entries that
+        are outside the window can never match again and are removed from
+        the front. If the cache is still too large, the least recently used
+        entries are removed. Every entry is removed at most once, so this
+        takes constant time on average instead of scanning the cache.
+
+        Args:
+            current_step: the time step that was accepted last.
+        """
+        oldest_useful = current_step - 2 * self.window
+        used_steps = self._used_steps
+        while used_steps:
+            if len(used_steps) <= self.replay_cache_size and \
+                    next(iter(used_steps.values())) >= oldest_useful:
+                return
+            used_steps.popitem(last=False)
+
+
+_verifier = TOTPVerifier()
+
+
+def set_totp_verifier(verifier: TOTPVerifier) -> None:
+    """Set the verifier that is used by `User.verify_credentials`.
+
+    Args:
+        verifier: the verifier to use.
+    """
+    global _verifier  # pylint: disable=global-statement
+    _verifier = verifier
+
+
+def get_totp_verifier() -> TOTPVerifier:
+    """Return the verifier that is used by `User.verify_credentials`.
+
+    Returns:
+        The TOTP verifier.
+    """
+    return _verifier
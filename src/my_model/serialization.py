@@ -0,0 +1,310 @@
+"""Module that contains the binary serialization for models.
+
+Objects are encoded as a compact array with a header and the values of the
+fields, in the order of the fields of the model. The field names are not
+part of the encoded data; instead, the header contains a fingerprint of the
+fields of the model. Data that was encoded with a different version of the
+model is refused when it is decoded.
+
+The encoders and decoders are prepared once per model class. Datetimes are
+encoded as the number of microseconds since the UNIX epoch and enums as
+their value. Relationships are never encoded, and the fields that are listed
+in the `sensitive_fields` of a model are left out unless they are requested
+explicitly.
+
+Two formats are supported:
+
+* `json`: the default format. Uses `orjson` when it is installed, or the
+  `json` module of the standard library otherwise.
+* `msgpack`: the most compact format. Needs the optional `msgpack` package,
+  which can be installed with the `msgpack` extra.
+"""
+
+import json
+import types
+import zlib
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from enum import Enum
+from functools import cache
+from operator import attrgetter
+from typing import (TYPE_CHECKING, Any, Literal, TypeVar, Union, get_args,
+                    get_origin)
+
+try:
+    import msgpack  # type: ignore[import]
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore[assignment]
+
+if TYPE_CHECKING:
+    from .model import MyModel
+
+__all__ = ['FORMAT_VERSION', 'SerializationFormat', 'decode_model',
+           'encode_model']
+
+FORMAT_VERSION = 1
+
+SerializationFormat = Literal['msgpack', 'json']
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+Converter = Callable[[Any], Any]
+
+ModelType = TypeVar('ModelType', bound='MyModel')
+
+
+def _encode_datetime(value: datetime | None) -> int | None:
+    """Encode a datetime as microseconds since the UNIX epoch.
+
+    Args:
+        value: the naive UTC datetime to encode.
+
+    Returns:
+        The number of microseconds, or None if no datetime was given.
+    """
+    return None if value is None else (value - _EPOCH) // _MICROSECOND
+
+
+def _decode_datetime(value: int | None) -> datetime | None:
+    """Decode a datetime that was encoded with `_encode_datetime`.
+
+    Args:
+        value: the number of microseconds since the UNIX epoch.
+
+    Returns:
+        The naive UTC datetime, or None if no value was given.
+    """
+    return None if value is None else _EPOCH + timedelta(microseconds=value)
+
+
+def _converters(annotation: Any) -> tuple[str, Converter | None,
+                                          Converter | None]:
+    """Return the converters for the type of a field.
+
+    Args:
+        annotation: the type annotation of the field.
+
+    Returns:
+        The kind of the field, used for the fingerprint, and the encoder and
+        decoder for the field. The encoder and decoder are None for values
+        that can be encoded as they are.
+    """
+    kinds = (annotation,)
+    if get_origin(annotation) in (Union, types.UnionType):
+        kinds = tuple(kind for kind in get_args(annotation)
+                      if kind is not type(None))
+
+    if datetime in kinds:
+        return 'datetime', _encode_datetime, _decode_datetime
+
+    if len(kinds) == 1 and isinstance(kinds[0], type) and \
+            issubclass(kinds[0], Enum):
+        enum = kinds[0]
+        return (f'enum:{enum.__name__}',
+                lambda value: None if value is None else value.value,
+                lambda value: None if value is None else enum(value))
+
+    return 'value', None, None
+
+
+@dataclass(frozen=True)
+class _Codec:
+    """The prepared encoder and decoder for a model.
+
+    Attributes:
+        fingerprint: the fingerprint of the encoded fields.
+        names: the names of the encoded fields.
+        dict_getter: returns the values of the encoded fields from the
+            `__dict__` of a object.
+        attribute_getter: returns the values of the encoded fields from the
+            attributes of a object.
+        encoders: the index and encoder for every field that needs to be
+            converted before it is encoded.
+        decoders: the index and decoder for every field that needs to be
+            converted after it is decoded.
+        defaults: the name, default factory and default value for every
+            field that is not encoded.
+    """
+
+    fingerprint: int
+    names: tuple[str, ...]
+    dict_getter: Callable[[dict[str, Any]], Any]
+    attribute_getter: Callable[[Any], Any]
+    encoders: tuple[tuple[int, Converter], ...]
+    decoders: tuple[tuple[int, Converter], ...]
+    defaults: tuple[tuple[str, Callable[..., Any] | None, Any], ...]
+
+
+@cache
+def _codec(model: type['MyModel'], include_sensitive: bool) -> _Codec:
+    """Prepare the encoder and decoder for a model.
+
+    Args:
+        model: the model to prepare the codec for.
+        include_sensitive: if the sensitive fields should be encoded.
+
+    Returns:
+        The prepared codec.
+    """
+    names: list[str] = []
+    encoders = []
+    decoders = []
+    defaults = []
+    kinds = []
+    for name, field in model.model_fields.items():
+        if name in model.sensitive_fields and not include_sensitive:
+            defaults.append((name, field.default_factory, field.default))
+            continue
+        kind, encoder, decoder = _converters(field.annotation)
+        if encoder is not None and decoder is not None:
+            encoders.append((len(names), encoder))
+            decoders.append((len(names), decoder))
+        names.append(name)
+        kinds.append(f'{name}:{kind}')
+
+    fingerprint = zlib.crc32(
+        f'{model.__name__}({",".join(kinds)})'.encode())
+    return _Codec(fingerprint, tuple(names),
+                  lambda values: [values[name] for name in names],
+                  attrgetter(*names), tuple(encoders), tuple(decoders),
+                  tuple(defaults))
+
+
+def _dumps(payload: list[Any], format: SerializationFormat) -> bytes:
+    """Serialize a payload.
+
+    Args:
+        payload: the payload to serialize.
+        format: the format to use.
+
+    Returns:
+        The serialized payload.
+
+    Raises:
+        ImportError: the `msgpack` format was requested, but the `msgpack`
+            package is not installed.
+        ValueError: the format is unknown.
+    """
+    # pylint: disable=redefined-builtin
+    if format == 'msgpack':
+        if msgpack is None:
+            raise ImportError(
+                'The msgpack format needs the msgpack package; install '
+                'ds-my-model with the msgpack extra')
+        data: bytes = msgpack.packb(payload)
+        return data
+    if format == 'json':
+        if orjson is not None:
+            return orjson.dumps(payload)
+        return json.dumps(payload, separators=(',', ':')).encode()
+    raise ValueError(f'Unknown serialization format "{format}"')
+
+
+def _loads(data: bytes, format: SerializationFormat) -> Any:
+    """Deserialize a payload.
+
+    Args:
+        data: the serialized payload.
+        format: the format of the payload.
+
+    Returns:
+        The deserialized payload.
+
+    Raises:
+        ImportError: the `msgpack` format was requested, but the `msgpack`
+            package is not installed.
+        ValueError: the format is unknown.
+    """
+    # pylint: disable=redefined-builtin
+    if format == 'msgpack':
+        if msgpack is None:
+            raise ImportError(
+                'The msgpack format needs the msgpack package; install '
+                'ds-my-model with the msgpack extra')
+        return msgpack.unpackb(data)
+    if format == 'json':
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data)
+    raise ValueError(f'Unknown serialization format "{format}"')
+
+
+def encode_model(obj: 'MyModel',
+                 format: SerializationFormat = 'json',
+                 include_sensitive: bool = False) -> bytes:
+    """Encode a object.
+
+    Args:
+        obj: the object to encode.
+        format: the format to use.
+        include_sensitive: if set to True, the sensitive fields of the model
+            are encoded too.
+
+    Returns:
+        The encoded object.
+    """
+    # pylint: disable=redefined-builtin
+    codec = _codec(type(obj), include_sensitive)
+    try:
+        encoded = codec.dict_getter(obj.__dict__)
+    except KeyError:
+        encoded = list(codec.attribute_getter(obj))
+    for index, encoder in codec.encoders:
+        encoded[index] = encoder(encoded[index])
+    return _dumps([FORMAT_VERSION, codec.fingerprint, encoded], format)
+
+
+def decode_model(model: type[ModelType],
+                 data: bytes,
+                 format: SerializationFormat = 'json',
+                 include_sensitive: bool = False,
+                 validate: bool = False) -> ModelType:
+    """Decode a object that was encoded with `encode_model`.
+
+    Args:
+        model: the model of the encoded object.
+        data: the encoded object.
+        format: the format of the encoded object.
+        include_sensitive: should be the same value as used for encoding.
+        validate: if set to True, the decoded values are validated. Should be
+            used for data from untrusted sources.
+
+    Returns:
+        The decoded object. Fields that were not encoded get their default
+        value.
+
+    Raises:
+        ValueError: the data is not a encoded object for this model, or it
+            was encoded with a different version of the model or format.
+    """
+    # pylint: disable=redefined-builtin
+    codec = _codec(model, include_sensitive)
+    payload = _loads(data, format)
+    if not isinstance(payload, list) or len(payload) != 3 or \
+            payload[0] != FORMAT_VERSION or payload[1] != codec.fingerprint:
+        raise ValueError(
+            f'The data is not a encoded {model.__name__} object for this '
+            'version of the model')
+
+    encoded = payload[2]
+    if len(encoded) != len(codec.names):
+        raise ValueError(f'Invalid number of fields for {model.__name__}')
+
+    for index, decoder in codec.decoders:
+        encoded[index] = decoder(encoded[index])
+    values = dict(zip(codec.names, encoded))
+    if validate:
+        return model.model_validate(values)
+
+    fields_set = set(codec.names)
+    for name, factory, default in codec.defaults:
+        values[name] = default if factory is None else factory()
+    return model._construct_trusted(  # pylint: disable=protected-access
+        values, fields_set)
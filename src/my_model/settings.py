@@ -0,0 +1,303 @@
+"""Module that contains the typed store for user settings.
+
+`UserSetting` objects are plain key/value pairs with string values. The
+`UserSettings` class in this module gives typed access to all settings of a
+user. The settings are read from the `User.user_settings` relationship, so
+they are loaded with one query (or none, when the relationship is eagerly
+loaded). Every value is parsed when it is read for the first time, so a
+stored value that can't be parsed only breaks the reads of that setting. The
+parsed values are cached on the user and the cache is invalidated when the
+settings of the user change.
+
+The type of a setting is defined by registering it with `register_setting`.
+Settings that are not registered are returned as strings. When a setting is
+registered again with another type, cached values are parsed again with the
+new type when they are read.
+"""
+
+import json
+from collections.abc import Callable, Iterator, MutableMapping
+from dataclasses import dataclass
+from typing import Any, Literal
+
+from sqlalchemy import event
+from sqlalchemy.orm import InstanceState, object_session
+from sqlalchemy.orm.attributes import instance_state
+from sqlalchemy.orm.util import identity_key
+
+from .model import User, UserSetting
+
+__all__ = ['SettingDefinition', 'UserSettings', 'register_setting']
+
+SettingKind = Literal['str', 'bool', 'int', 'json']
+
+_NO_DEFAULT = object()
+
+
+def _parse_bool(value: str) -> bool:
+    """Parse a boolean setting.
+
+    Args:
+        value: the stored value.
+
+    Returns:
+        The parsed value.
+
+    Raises:
+        ValueError: the value is not a valid boolean.
+    """
+    if value in ('true', '1'):
+        return True
+    if value in ('false', '0'):
+        return False
+    raise ValueError(f'Invalid boolean value "{value}"')
+
+
+_PARSERS: dict[SettingKind, Callable[[str], Any]] = {
+    'str': str,
+    'bool': _parse_bool,
+    'int': int,
+    'json': json.loads
+}
+
+_SERIALIZERS: dict[SettingKind, Callable[[Any], str]] = {
+    'str': str,
+    'bool': lambda value: 'true' if value else 'false',
+    'int': lambda value: str(int(value)),
+    'json': lambda value: json.dumps(value, separators=(',', ':'))
+}
+
+
+@dataclass(frozen=True)
+class SettingDefinition:
+    """Definition for a registered setting.
+
+    Attributes:
+        name: the name of the setting.
+        kind: the type of the setting.
+        default: the value that is returned when the setting is not set.
+    """
+
+    name: str
+    kind: SettingKind
+    default: Any = _NO_DEFAULT
+
+    def parse(self, value: str) -> Any:
+        """Parse a stored value.
+
+        Args:
+            value: the stored value.
+
+        Returns:
+            The parsed value.
+        """
+        return _PARSERS[self.kind](value)
+
+    def serialize(self, value: Any) -> str:
+        """Serialize a value to store it.
+
+        Args:
+            value: the value to serialize.
+
+        Returns:
+            The serialized value.
+        """
+        return _SERIALIZERS[self.kind](value)
+
+
+_definitions: dict[str, SettingDefinition] = {}
+_STRING_SETTING = SettingDefinition(name='', kind='str')
+
+
+@dataclass(slots=True)
+class _Entry:
+    """A cached setting of a user.
+
+    Attributes:
+        row: the object for the setting.
+        definition: the definition that `value` was parsed with, or None if
+            the value is not parsed yet.
+        value: the parsed value.
+    """
+
+    row: UserSetting
+    definition: SettingDefinition | None = None
+    value: Any = None
+
+
+def register_setting(name: str,
+                     kind: SettingKind,
+                     default: Any = _NO_DEFAULT) -> None:
+    """Register the type of a setting.
+
+    Settings should be registered before they are used. Values that are
+    already cached with another type are parsed again when they are read.
+
+    Args:
+        name: the name of the setting.
+        kind: the type of the setting; `str`, `bool`, `int` or `json`.
+        default: the value that is returned when the setting is not set. If
+            not given, a `KeyError` is raised for settings that are not set.
+
+    Raises:
+        ValueError: a unknown type was given.
+    """
+    if kind not in _PARSERS:
+        raise ValueError(f'Unknown setting type "{kind}"')
+    _definitions[name] = SettingDefinition(name=name, kind=kind,
+                                           default=default)
+
+
+class UserSettings(MutableMapping[str, Any]):
+    """Typed access to the settings of a user.
+
+    Should be retrieved with `User.settings`. Reading a setting returns the
+    parsed value. Writing a setting updates or creates the `UserSetting`
+    object for it; the changes are committed with the session of the user.
+    """
+
+    def __init__(self, user: User) -> None:
+        """Create the accessor.
+
+        Args:
+            user: the user to access the settings for.
+        """
+        self._user = user
+
+    def _entries(self) -> dict[str, _Entry]:
+        """Return the cached settings for the user.
+
+        The values are not parsed yet; see `__getitem__`.
+
+        Returns:
+            A dict with the name and the cached entry for every setting of
+            the user.
+        """
+        info = instance_state(self._user).info
+        entries: dict[str, _Entry] | None = info.get('settings')
+        if entries is None:
+            entries = {row.setting: _Entry(row)
+                       for row in self._user.user_settings}
+            info['settings'] = entries
+        return entries
+
+    def __getitem__(self, name: str) -> Any:
+        """Return the value for a setting.
+
+        Args:
+            name: the name of the setting.
+
+        Returns:
+            The parsed value, or the default if the setting is not set.
+
+        Raises:
+            KeyError: the setting is not set and has no default.
+            ValueError: the stored value is not valid for the type of the
+                setting.
+        """
+        entry = self._entries().get(name)
+        if entry is not None:
+            current = _definitions.get(name, _STRING_SETTING)
+            if entry.definition is not current:
+                entry.value = current.parse(entry.row.value)
+                entry.definition = current
+            return entry.value
+
+        definition = _definitions.get(name)
+        if definition is None or definition.default is _NO_DEFAULT:
+            raise KeyError(name)
+        return definition.default
+
+    def __setitem__(self, name: str, value: Any) -> None:
+        """Set the value for a setting.
+
+        Args:
+            name: the name of the setting.
+            value: the value to set.
+        """
+        text = _definitions.get(name, _STRING_SETTING).serialize(value)
+        entry = self._entries().get(name)
+        if entry is not None:
+            entry.row.value = text
+        else:
+            self._user.user_settings.append(
+                UserSetting(setting=name, value=text))
+
+    def __delitem__(self, name: str) -> None:
+        """Remove a setting.
+
+        Args:
+            name: the name of the setting.
+
+        Raises:
+            KeyError: the setting is not set.
+        """
+        row = self._entries()[name].row
+        self._user.user_settings.remove(row)
+        session = object_session(row)
+        if session is not None:
+            session.delete(row)
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the names of the settings that are set.
+
+        Returns:
+            A iterator with the names of the settings.
+        """
+        return iter(self._entries())
+
+    def __len__(self) -> int:
+        """Return the number of settings that are set.
+
+        Returns:
+            The number of settings.
+        """
+        return len(self._entries())
+
+    def invalidate(self) -> None:
+        """Invalidate the cached settings for the user."""
+        instance_state(self._user).info.pop('settings', None)
+
+
+@event.listens_for(User.user_settings, 'append')
+@event.listens_for(User.user_settings, 'remove')
+@event.listens_for(User.user_settings, 'bulk_replace')
+def _invalidate_settings_on_change(target: User, *_: Any) -> None:
+    """Invalidate the settings cache when the settings of a user change.
+
+    Args:
+        target: the user that was changed.
+    """
+    instance_state(target).info.pop('settings', None)
+
+
+@event.listens_for(UserSetting.value, 'set')
+def _invalidate_settings_on_value(target: UserSetting, *_: Any) -> None:
+    """Invalidate the settings cache of the user when a value changes.
+
+    The user is looked up in the relationship of the setting or in the
+    identity map of the session; if the user isn't loaded, it can't have a
+    cache.
+
+    Args:
+        target: the setting that was changed.
+    """
+    values = instance_state(target).dict
+    user = values.get('user')
+    session = object_session(target)
+    if user is None and session is not None and values.get('user_id'):
+        user = session.identity_map.get(identity_key(User, values['user_id']))
+    if user is not None:
+        instance_state(user).info.pop('settings', None)
+
+
+@event.listens_for(User, 'expire', raw=True)
+@event.listens_for(User, 'refresh', raw=True)
+def _invalidate_settings_on_reload(state: InstanceState[User],
+                                   *_: Any) -> None:
+    """Invalidate the settings cache when a user is expired or refreshed.
+
+    Args:
+        state: the instance state of the user that was expired or refreshed.
+    """
+    state.info.pop('settings', None)
@@ -0,0 +1,238 @@
+"""Module that contains read-only snapshots of models.
+
+Model objects carry the instance state of SQLalchemy and the validation of
+Pydantic, which makes them large and slow to copy. Snapshots are frozen
+dataclasses with slots that only contain the column values of a object. They
+are small, immutable and can be shared between threads or kept in caches in
+large numbers.
+
+A snapshot is created from a loaded object with `MyModel.to_snapshot`, or
+directly from a database row with `from_row`:
+
+    rows = session.exec(select(*UserSnapshot.columns()))
+    users = [UserSnapshot.from_row(row) for row in rows]
+
+Sensitive columns, like the password hash, the second factor and plaintext
+tokens, are never part of a snapshot.
+"""
+
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass, fields
+from datetime import datetime
+from operator import attrgetter, itemgetter
+from typing import Any, ClassVar, TypeVar
+
+from .model import APIScope, APIToken, MyModel, User, UserRole
+
+__all__ = ['APIScopeSnapshot', 'APITokenSnapshot', 'Snapshot',
+           'UserSnapshot', 'snapshot_type']
+
+SnapshotType = TypeVar('SnapshotType', bound='Snapshot')
+
+_snapshot_types: dict[type[MyModel], type['Snapshot']] = {}
+
+
+@dataclass(frozen=True, slots=True)
+class Snapshot:
+    """Baseclass for snapshots.
+
+    Attributes:
+        model: the model the snapshot is created from.
+        field_names: the names of the fields, in the order of the fields.
+    """
+
+    model: ClassVar[type[MyModel]]
+    field_names: ClassVar[tuple[str, ...]]
+    _dict_getter: ClassVar[Callable[[dict[str, Any]], Any]]
+    _attribute_getter: ClassVar[Callable[[Any], Any]]
+
+    @classmethod
+    def columns(cls) -> list[Any]:
+        """Return the columns of the model for the fields of the snapshot.
+
+        Select these columns to get rows that can be given to `from_row`.
+
+        Returns:
+            The columns, in the order of the fields.
+        """
+        return [getattr(cls.model, name) for name in cls.field_names]
+
+    @classmethod
+    def from_row(cls: type[SnapshotType], row: Sequence[Any]) -> SnapshotType:
+        """Create a snapshot from a database row.
+
+        Args:
+            row: the values for the fields, in the order of the fields. Use
+                `columns` to select the values in this order.
+
+        Returns:
+            The created snapshot.
+        """
+        return cls(*row)
+
+    @classmethod
+    def from_model(cls: type[SnapshotType], obj: MyModel) -> SnapshotType:
+        """Create a snapshot from a model object.
+
+        The values are read from the object directly. Only when a value isn't
+        loaded, for instance because the object is expired, the attributes
+        are used, which can load the values from the database.
+
+        Args:
+            obj: the object to create the snapshot from.
+
+        Returns:
+            The created snapshot.
+        """
+        try:
+            values = cls._dict_getter(obj.__dict__)
+        except KeyError:
+            values = cls._attribute_getter(obj)
+        return cls(*values)
+
+
+def _snapshot_of(model: type[MyModel]) -> Callable[
+        [type[SnapshotType]], type[SnapshotType]]:
+    """Register a snapshot class for a model.
+
+    Should be used on top of the `dataclass` decorator, so the fields of the
+    class are known.
+
+    Args:
+        model: the model for the snapshot.
+
+    Returns:
+        A decorator that registers the class.
+    """
+    def register(cls: type[SnapshotType]) -> type[SnapshotType]:
+        names = tuple(field.name for field in fields(cls))
+        cls.model = model
+        cls.field_names = names
+        cls._dict_getter = itemgetter(*names)
+        cls._attribute_getter = attrgetter(*names)
+        _snapshot_types[model] = cls
+        return cls
+    return register
+
+
+def snapshot_type(model: type[MyModel]) -> type[Snapshot]:
+    """Return the snapshot class for a model.
+
+    Args:
+        model: the model.
+
+    Returns:
+        The snapshot class.
+
+    Raises:
+        TypeError: there is no snapshot class for the model.
+    """
+    try:
+        return _snapshot_types[model]
+    except KeyError as exception:
+        raise TypeError(
+            f'No snapshot type for {model.__name__}') from exception
+
+
+@_snapshot_of(User)
+@dataclass(frozen=True, slots=True)
+class UserSnapshot(Snapshot):
+    """Snapshot of a user.
+
+    Attributes:
+        id: the ID of the user.
+        created: the datetime when the user was created.
+        fullname: the full name of the user.
+        username: the username of the user.
+        email: the email address of the user.
+        role: the role of the user.
+        password_date: the datetime when the password was last changed.
+    """
+
+    id: int
+    created: datetime
+    fullname: str
+    username: str
+    email: str
+    role: UserRole
+    password_date: datetime
+
+
+@_snapshot_of(APIScope)
+@dataclass(frozen=True, slots=True)
+class APIScopeSnapshot(Snapshot):
+    """Snapshot of a API scope.
+
+    Attributes:
+        id: the ID of the scope.
+        module: the module for the scope.
+        subject: the subject for the scope.
+        bit_position: the position of the bit for the scope in scope masks.
+    """
+
+    id: int
+    module: str
+    subject: str
+    bit_position: int | None
+
+    @property
+    def full_scope_name(self) -> str:
+        """Property for the full name of the scope.
+
+        Returns:
+            The full name of the scope, like `module.subject`.
+        """
+        return f'{self.module}.{self.subject}'
+
+
+@_snapshot_of(APIToken)
+@dataclass(frozen=True, slots=True)
+class APITokenSnapshot(Snapshot):
+    """Snapshot of a API token.
+
+    Attributes:
+        id: the ID of the token.
+        user_id: the ID of the owner of the token.
+        api_client_id: the ID of the API client for the token.
+        title: the title of the token.
+        token_digest: the keyed digest of the token.
+        created: the datetime when the token was created.
+        expires: the datetime when the token expires.
+        enabled: defines if the token is enabled.
+        scope_mask: the scope mask of the token.
+    """
+
+    id: int
+    user_id: int
+    api_client_id: int | None
+    title: str
+    token_digest: str | None
+    created: datetime
+    expires: datetime
+    enabled: bool
+    scope_mask: int
+
+    def is_valid(self, now: datetime | None = None) -> bool:
+        """Check if the token is enabled and not expired.
+
+        Args:
+            now: the datetime to use to check the expiration. Defaults to the
+                current UTC datetime.
+
+        Returns:
+            True if the token is enabled and not expired, otherwise False.
+        """
+        if now is None:
+            now = datetime.utcnow()
+        return self.enabled and self.expires > now
+
+    def has_scope_mask(self, mask: int) -> bool:
+        """Check if the token has all scopes in a scope mask.
+
+        Args:
+            mask: the mask with the bits for the required scopes set.
+
+        Returns:
+            True if the token has all scopes, otherwise False.
+        """
+        return self.scope_mask & mask == mask
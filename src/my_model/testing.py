@@ -0,0 +1,98 @@
+"""Module that contains helpers for tests that use the models.
+
+The helpers in this module can be used by services that use these models to
+make sure their queries don't regress, for instance to make sure a page with
+a list of users doesn't do a query per user.
+"""
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from sqlalchemy import Engine, event
+
+__all__ = ['QueryCounter', 'assert_max_queries', 'count_queries']
+
+
+class QueryCounter:
+    """Counter for the queries that are executed on a engine.
+
+    Attributes:
+        statements: the SQL statements that where executed.
+    """
+
+    def __init__(self) -> None:
+        """Create the counter."""
+        self.statements: list[str] = []
+
+    @property
+    def count(self) -> int:
+        """Property for the number of executed queries.
+
+        Returns:
+            The number of executed queries.
+        """
+        return len(self.statements)
+
+    def _before_cursor_execute(self, _connection: Any, _cursor: Any,
+                               statement: str, *_: Any) -> None:
+        """Register a executed statement.
+
+        Args:
+            _connection: the connection for the statement.
+            _cursor: the cursor for the statement.
+            statement: the SQL statement.
+        """
+        self.statements.append(statement)
+
+
+@contextmanager
+def count_queries(engine: Engine) -> Iterator[QueryCounter]:
+    """Count the queries that are executed on a engine.
+
+    Example:
+        >>> with count_queries(engine) as counter:
+        ...     session.exec(select(User)).all()
+        >>> counter.count
+        1
+
+    Args:
+        engine: the engine to count the queries for.
+
+    Yields:
+        A `QueryCounter` that is updated for every executed query.
+    """
+    counter = QueryCounter()
+    # pylint: disable=protected-access
+    event.listen(engine, 'before_cursor_execute',
+                 counter._before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute',
+                     counter._before_cursor_execute)
+
+
+@contextmanager
+def assert_max_queries(engine: Engine,
+                       maximum: int) -> Iterator[QueryCounter]:
+    """Assert that a block executes at most a number of queries.
+
+    Args:
+        engine: the engine to count the queries for.
+        maximum: the maximum number of queries.
+
+    Yields:
+        A `QueryCounter` that is updated for every executed query.
+
+    Raises:
+        AssertionError: more queries where executed than allowed.
+    """
+    with count_queries(engine) as counter:
+        yield counter
+
+    if counter.count > maximum:
+        statements = '\n'.join(counter.statements)
+        raise AssertionError(
+            f'Expected at most {maximum} queries, but {counter.count} where '
+            f'executed:\n{statements}')
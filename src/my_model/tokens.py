@@ -0,0 +1,132 @@
+"""Module that contains the helpers for tokens.
+
+Random tokens are generated in bulk with `generate_tokens`. It reads the
+entropy for all tokens at once from `secrets.token_bytes` and maps it to the
+alphabet with a single `bytes.translate` call. Bytes that would introduce a
+bias towards the start of the alphabet are dropped in the same call.
+
+Tokens can be stored in plaintext or as a keyed digest. The digest is a
+BLAKE2b hash of the token, keyed with a secret that can be configured with
+`set_token_digest_key`. BLAKE2b is fast enough to run on every request, so a
+token lookup only has to hash the presented token once and do a single probe
+on the indexed digest column.
+"""
+
+import hashlib
+import secrets
+import string
+
+__all__ = ['ALPHANUMERIC', 'generate_tokens', 'set_token_digest_key',
+           'token_digest']
+
+ALPHANUMERIC = string.ascii_letters + string.digits
+"""The alphabet that is used for tokens."""
+
+TOKEN_DIGEST_SIZE = 32
+"""The size of the token digest in bytes. The hex representation is twice as
+long."""
+
+_token_digest_key: bytes = b''
+
+
+def set_token_digest_key(key: bytes) -> None:
+    """Set the key that is used to create token digests.
+
+    The key should be kept secret and should be the same for all processes
+    that use the same database. Changing the key makes all stored digests
+    invalid.
+
+    Args:
+        key: the key to use. Can be at most 64 bytes.
+
+    Raises:
+        ValueError: the key is longer than 64 bytes.
+    """
+    global _token_digest_key  # pylint: disable=global-statement
+    if len(key) > hashlib.blake2b.MAX_KEY_SIZE:
+        raise ValueError(
+            f'Key can be at most {hashlib.blake2b.MAX_KEY_SIZE} bytes')
+    _token_digest_key = key
+
+
+def token_digest(token: str) -> str:
+    """Create the digest for a token.
+
+    Args:
+        token: the token to create the digest for.
+
+    Returns:
+        The hex representation of the keyed BLAKE2b digest of the token.
+    """
+    return hashlib.blake2b(
+        token.encode(),
+        key=_token_digest_key,
+        digest_size=TOKEN_DIGEST_SIZE).hexdigest()
+
+
+def _translation(alphabet: str) -> tuple[bytes, bytes]:
+    """Create the translation table to map random bytes to a alphabet.
+
+    Args:
+        alphabet: the alphabet to map to.
+
+    Returns:
+        A tuple with the translation table and the bytes that should be
+        deleted because they would bias the result.
+    """
+    size = len(alphabet)
+    limit = 256 - (256 % size)
+    table = bytes(ord(alphabet[byte % size]) if byte < limit else 0
+                  for byte in range(256))
+    return table, bytes(range(limit, 256))
+
+
+_translations: dict[str, tuple[bytes, bytes]] = {}
+
+
+def generate_tokens(number: int,
+                    length: int,
+                    alphabet: str = ALPHANUMERIC) -> list[str]:
+    """Generate random tokens in bulk.
+
+    The tokens are generated with a cryptographically secure random source.
+    All entropy is read at once, so generating many tokens is much cheaper
+    than generating them one by one.
+
+    Args:
+        number: the number of tokens to generate.
+        length: the length of each token.
+        alphabet: the characters to use for the tokens. Should contain only
+            ASCII characters and can contain at most 256 characters.
+
+    Returns:
+        A list with the generated tokens.
+
+    Raises:
+        ValueError: the alphabet is empty, too large or not ASCII.
+    """
+    if not alphabet or len(alphabet) > 256 or not alphabet.isascii():
+        raise ValueError('Alphabet should contain 1 to 256 ASCII characters')
+
+    if length == 0:
+        return [''] * number
+
+    translation = _translations.get(alphabet)
+    if translation is None:
+        translation = _translation(alphabet)
+        _translations[alphabet] = translation
+    table, rejected = translation
+
+    # Read a bit more than needed to compensate for the rejected bytes, and
+    # top up in the rare case that this was not enough
+    needed = number * length
+    ratio = 256 / (256 - len(rejected))
+    characters = b''
+    while len(characters) < needed:
+        missing = needed - len(characters)
+        random_bytes = secrets.token_bytes(int(missing * ratio) + 16)
+        characters += random_bytes.translate(table, rejected)
+
+    text = characters[:needed].decode('ascii')
+    return [text[index:index + length]
+            for index in range(0, needed, length)]
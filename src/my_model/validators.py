@@ -0,0 +1,145 @@
+"""Module that contains the validators for the constrained fields.
+
+The patterns for the constrained fields are defined here once, precompiled,
+and used by the models in `my_model.model`. Pydantic compiles the patterns of
+the fields once per model, so assignments are already cheap. The predicates
+in this module can be used to check values before they reach a model or the
+database, for instance for values that are received in a API request. Where a
+check without a regular expression is cheaper, like for tokens, colors and
+second factors, the predicates use plain string methods instead.
+"""
+
+import re
+import string
+
+__all__ = ['COLOR_PATTERN',
+           'EMAIL_PATTERN',
+           'FULLNAME_PATTERN',
+           'REDIRECT_URL_PATTERN',
+           'SECOND_FACTOR_PATTERN',
+           'TOKEN_DIGEST_PATTERN',
+           'TOKEN_PATTERN',
+           'USERNAME_PATTERN',
+           'is_valid_color',
+           'is_valid_email',
+           'is_valid_fullname',
+           'is_valid_redirect_url',
+           'is_valid_second_factor',
+           'is_valid_token',
+           'is_valid_totp_code',
+           'is_valid_username']
+
+FULLNAME_PATTERN = re.compile(r'^[A-Za-z0-9\- ]+$')
+USERNAME_PATTERN = re.compile(r'^[a-zA-Z][a-zA-Z0-9_\.]+$')
+EMAIL_PATTERN = re.compile(r'^[a-z0-9_\-\.]+\@[a-z0-9_\-\.]+\.[a-z\.]+$')
+SECOND_FACTOR_PATTERN = re.compile(r'^[A-Z0-9]+$')
+TOKEN_PATTERN = re.compile(r'^[a-zA-Z0-9]{32}$')
+TOKEN_DIGEST_PATTERN = re.compile(r'^[a-f0-9]{64}$')
+REDIRECT_URL_PATTERN = re.compile(r'^https?://')
+COLOR_PATTERN = re.compile(r'^[a-fA-F0-9]{6}$')
+
+_BASE32_CHARACTERS = string.ascii_uppercase + string.digits
+
+
+def is_valid_fullname(value: str) -> bool:
+    """Check if a value is a valid fullname for a user.
+
+    Args:
+        value: the value to check.
+
+    Returns:
+        True if the value is valid, otherwise False.
+    """
+    return (len(value) <= 128 and
+            FULLNAME_PATTERN.fullmatch(value) is not None)
+
+
+def is_valid_username(value: str) -> bool:
+    """Check if a value is a valid username for a user.
+
+    Args:
+        value: the value to check.
+
+    Returns:
+        True if the value is valid, otherwise False.
+    """
+    return (len(value) <= 128 and
+            USERNAME_PATTERN.fullmatch(value) is not None)
+
+
+def is_valid_email(value: str) -> bool:
+    """Check if a value is a valid emailaddress for a user.
+
+    Args:
+        value: the value to check.
+
+    Returns:
+        True if the value is valid, otherwise False.
+    """
+    return (len(value) <= 128 and
+            EMAIL_PATTERN.fullmatch(value) is not None)
+
+
+def is_valid_second_factor(value: str) -> bool:
+    """Check if a value is a valid second factor secret.
+
+    Args:
+        value: the value to check.
+
+    Returns:
+        True if the value is valid, otherwise False.
+    """
+    return (0 < len(value) <= 64 and
+            value.isascii() and
+            not value.strip(_BASE32_CHARACTERS))
+
+
+def is_valid_totp_code(value: str) -> bool:
+    """Check if a value has the format of a TOTP code.
+
+    Args:
+        value: the value to check.
+
+    Returns:
+        True if the value consists of six digits, otherwise False.
+    """
+    return len(value) == 6 and value.isascii() and value.isdigit()
+
+
+def is_valid_token(value: str) -> bool:
+    """Check if a value is a valid token.
+
+    Args:
+        value: the value to check.
+
+    Returns:
+        True if the value is valid, otherwise False.
+    """
+    return len(value) == 32 and value.isascii() and value.isalnum()
+
+
+def is_valid_redirect_url(value: str) -> bool:
+    """Check if a value is a valid redirect URL for a API client.
+
+    Args:
+        value: the value to check.
+
+    Returns:
+        True if the value is valid, otherwise False.
+    """
+    return (len(value) <= 1024 and
+            value.startswith(('http://', 'https://')))
+
+
+def is_valid_color(value: str) -> bool:
+    """Check if a value is a valid color for a tag.
+
+    Args:
+        value: the value to check.
+
+    Returns:
+        True if the value is valid, otherwise False.
+    """
+    return (len(value) == 6 and
+            value.isascii() and
+            not value.strip(string.hexdigits))
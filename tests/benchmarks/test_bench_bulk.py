@@ -0,0 +1,46 @@
+"""Benchmarks for the bulk construction of models."""
+from typing import Any
+
+from pytest import fixture
+from pytest_benchmark.fixture import BenchmarkFixture
+import pytest
+
+from my_model import Tag
+
+
+@fixture
+def tag_rows() -> list[dict[str, Any]]:
+    """Fixture that creates rows for tags.
+
+    Returns:
+        A list with rows for tags.
+    """
+    return [{'title': f'tag {index}', 'color': '00ff00', 'user_id': 1}
+            for index in range(5000)]
+
+
+def test_bench_tag_one_by_one(
+        benchmark: BenchmarkFixture,
+        tag_rows: list[dict[str, Any]]) -> None:
+    """Benchmark creating tags one by one.
+
+    Args:
+        benchmark: the pytest-benchmark fixture.
+        tag_rows: rows for tags.
+    """
+    benchmark(lambda: [Tag(**row) for row in tag_rows])
+
+
+@pytest.mark.parametrize('validate', ['once', 'each', 'none'])
+def test_bench_tag_bulk_from_rows(
+        benchmark: BenchmarkFixture,
+        tag_rows: list[dict[str, Any]],
+        validate: str) -> None:
+    """Benchmark creating tags in bulk.
+
+    Args:
+        benchmark: the pytest-benchmark fixture.
+        tag_rows: rows for tags.
+        validate: the validation mode.
+    """
+    benchmark(Tag.bulk_from_rows, tag_rows, validate=validate)
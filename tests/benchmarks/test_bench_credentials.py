@@ -0,0 +1,128 @@
+"""Benchmarks for passwords and second factors."""
+from collections.abc import Iterator
+from itertools import count
+
+from pyotp import TOTP
+from pytest import fixture
+from pytest_benchmark.fixture import BenchmarkFixture
+import pytest
+
+from my_model import TOTPVerifier, User, set_default_hasher_profile
+
+
+@fixture(params=['test', 'interactive'])
+def hasher_profile(request: pytest.FixtureRequest) -> Iterator[str]:
+    """Fixture that sets the default hasher profile.
+
+    Args:
+        request: the pytest request, with the profile as parameter.
+
+    Yields:
+        The name of the profile.
+    """
+    set_default_hasher_profile(request.param)
+    yield request.param
+    set_default_hasher_profile('test')
+
+
+@fixture
+def user() -> User:
+    """Fixture that creates a user with a password.
+
+    Returns:
+        The created user.
+    """
+    user = User(fullname='Daryl Stark', username='daryl.stark',
+                email='daryl.stark@dstark.nl')
+    user.set_password('benchmark password')
+    return user
+
+
+def test_bench_set_password(benchmark: BenchmarkFixture,
+                            hasher_profile: str,
+                            user: User) -> None:
+    """Benchmark hashing and setting a password.
+
+    Args:
+        benchmark: the pytest-benchmark fixture.
+        hasher_profile: the hasher profile to use.
+        user: a user.
+    """
+    benchmark(user.set_password, 'benchmark password', hasher_profile)
+
+
+@pytest.mark.parametrize('password', ['benchmark password', 'wrong'])
+def test_bench_verify_credentials(benchmark: BenchmarkFixture,
+                                  hasher_profile: str,
+                                  password: str) -> None:
+    """Benchmark verifying a username and password.
+
+    Args:
+        benchmark: the pytest-benchmark fixture.
+        hasher_profile: the hasher profile that is used.
+        password: the password to verify.
+    """
+    user = User(fullname='Daryl Stark', username='daryl.stark',
+                email='daryl.stark@dstark.nl')
+    user.set_password('benchmark password', hasher_profile)
+    benchmark(user.verify_credentials, 'daryl.stark', password)
+
+
+def test_bench_verify_credentials_wrong_username(
+        benchmark: BenchmarkFixture,
+        user: User) -> None:
+    """Benchmark refusing a wrong username before hashing.
+
+    Args:
+        benchmark: the pytest-benchmark fixture.
+        user: a user.
+    """
+    benchmark(user.verify_credentials, 'emilia.clarke', 'benchmark password')
+
+
+def test_bench_totp_pyotp(benchmark: BenchmarkFixture, user: User) -> None:
+    """Benchmark calculating the current code with pyotp.
+
+    Args:
+        benchmark: the pytest-benchmark fixture.
+        user: a user.
+    """
+    secret = user.set_random_second_factor()
+    benchmark(lambda: TOTP(secret).now())
+
+
+def test_bench_totp_verifier(benchmark: BenchmarkFixture, user: User) -> None:
+    """Benchmark verifying a code with the TOTP verifier.
+
+    Every call uses a different user, so the replay cache doesn't refuse the
+    code.
+
+    Args:
+        benchmark: the pytest-benchmark fixture.
+        user: a user.
+    """
+    secret = user.set_random_second_factor()
+    code = TOTP(secret).now()
+    verifier = TOTPVerifier()
+    users = count()
+    benchmark(lambda: verifier.verify(next(users), secret, code))
+
+
+def test_bench_totp_verifier_full_cache(benchmark: BenchmarkFixture,
+                                        user: User) -> None:
+    """Benchmark verifying a code when the replay cache is full.
+
+    All entries in the cache are within the window, so entries have to be
+    evicted for every new user.
+
+    Args:
+        benchmark: the pytest-benchmark fixture.
+        user: a user.
+    """
+    secret = user.set_random_second_factor()
+    code = TOTP(secret).now()
+    verifier = TOTPVerifier(replay_cache_size=20_000)
+    users = count()
+    for _ in range(verifier.replay_cache_size):
+        verifier.verify(next(users), secret, code)
+    benchmark(lambda: verifier.verify(next(users), secret, code))
@@ -0,0 +1,174 @@
+"""Benchmarks for SQLite round-trips of users with relationships."""
+from collections.abc import Iterator
+from datetime import datetime, timedelta
+from itertools import count
+
+from pytest import fixture
+from pytest_benchmark.fixture import BenchmarkFixture
+from sqlalchemy import Engine
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from my_model import (APIScope, APIToken, MemoryAuthCache, Tag, User,
+                      UserSetting, authenticate_token, set_auth_cache)
+
+
+def _create_user(index: int) -> tuple[User, str]:
+    """Create a user with all relationships set.
+
+    Args:
+        index: a number to make the user unique.
+
+    Returns:
+        The user and the plaintext token of its API token.
+    """
+    user = User(fullname='Daryl Stark', username=f'daryl.stark{index}',
+                email='daryl.stark@dstark.nl')
+    user.tags = [Tag(title=f'tag {number}') for number in range(5)]
+    user.user_settings = [UserSetting(setting='theme', value='dark')]
+    api_token = APIToken(title='benchmark',
+                         expires=datetime.utcnow() + timedelta(days=1))
+    api_token.token_scopes = [APIScope(module='users', subject='read')]
+    token = api_token.set_random_token()
+    user.api_tokens = [api_token]
+    return user, token
+
+
+@fixture
+def engine() -> Engine:
+    """Fixture that creates a in-memory SQLite database.
+
+    Returns:
+        The engine for the database.
+    """
+    engine = create_engine('sqlite://')
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+@fixture
+def stored_user(engine: Engine) -> tuple[int, str]:
+    """Fixture that stores a user with relationships.
+
+    Args:
+        engine: the engine for the database.
+
+    Returns:
+        The ID of the user and the plaintext token of its API token.
+    """
+    user, token = _create_user(0)
+    with Session(engine) as session:
+        session.add(user)
+        session.commit()
+        assert user.id is not None
+        return user.id, token
+
+
+@fixture
+def auth_cache() -> Iterator[MemoryAuthCache]:
+    """Fixture that activates a in-memory auth cache.
+
+    Yields:
+        The active cache.
+    """
+    cache = MemoryAuthCache()
+    set_auth_cache(cache)
+    yield cache
+    set_auth_cache(None)
+
+
+def test_bench_insert_user(benchmark: BenchmarkFixture,
+                           engine: Engine) -> None:
+    """Benchmark storing a user with relationships.
+
+    Args:
+        benchmark: the pytest-benchmark fixture.
+        engine: the engine for the database.
+    """
+    numbers = count(1)
+
+    def insert() -> None:
+        with Session(engine) as session:
+            session.add(_create_user(next(numbers))[0])
+            session.commit()
+
+    benchmark(insert)
+
+
+def test_bench_load_user_dashboard(benchmark: BenchmarkFixture,
+                                   engine: Engine,
+                                   stored_user: tuple[int, str]) -> None:
+    """Benchmark loading a user with the dashboard load profile.
+
+    Args:
+        benchmark: the pytest-benchmark fixture.
+        engine: the engine for the database.
+        stored_user: the ID and token of a stored user.
+    """
+    user_id, _ = stored_user
+
+    def load() -> None:
+        with Session(engine) as session:
+            user = session.exec(
+                select(User).where(User.id == user_id)
+                .options(*User.load_profile('dashboard'))).one()
+            assert len(user.tags) == 5
+
+    benchmark(load)
+
+
+def test_bench_get_by_token(benchmark: BenchmarkFixture,
+                            engine: Engine,
+                            stored_user: tuple[int, str]) -> None:
+    """Benchmark looking up a API token by its token.
+
+    Args:
+        benchmark: the pytest-benchmark fixture.
+        engine: the engine for the database.
+        stored_user: the ID and token of a stored user.
+    """
+    _, token = stored_user
+
+    def lookup() -> None:
+        with Session(engine) as session:
+            assert APIToken.get_by_token(session, token) is not None
+
+    benchmark(lookup)
+
+
+def test_bench_authenticate_token(benchmark: BenchmarkFixture,
+                                  engine: Engine,
+                                  stored_user: tuple[int, str]) -> None:
+    """Benchmark resolving a token without a auth cache.
+
+    Args:
+        benchmark: the pytest-benchmark fixture.
+        engine: the engine for the database.
+        stored_user: the ID and token of a stored user.
+    """
+    _, token = stored_user
+
+    def authenticate() -> None:
+        with Session(engine) as session:
+            assert authenticate_token(session, token) is not None
+
+    benchmark(authenticate)
+
+
+def test_bench_authenticate_token_cached(
+        benchmark: BenchmarkFixture,
+        engine: Engine,
+        stored_user: tuple[int, str],
+        auth_cache: MemoryAuthCache) -> None:
+    """Benchmark resolving a token with a auth cache.
+
+    Args:
+        benchmark: the pytest-benchmark fixture.
+        engine: the engine for the database.
+        stored_user: the ID and token of a stored user.
+        auth_cache: the active auth cache.
+    """
+    _, token = stored_user
+    with Session(engine) as session:
+        authenticate_token(session, token)
+        benchmark(authenticate_token, session, token)
+    assert len(auth_cache) == 1
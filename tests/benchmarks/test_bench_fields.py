@@ -0,0 +1,57 @@
+"""Benchmarks for validated assignments of the constrained fields."""
+from typing import Any
+
+from pytest_benchmark.fixture import BenchmarkFixture
+import pytest
+
+from my_model import APIClient, APIToken, MyModel, Tag, User
+
+FIELDS = [
+    (User, 'fullname', 'Daryl Stark'),
+    (User, 'username', 'daryl.stark'),
+    (User, 'email', 'daryl.stark@dstark.nl'),
+    (User, 'second_factor', 'JBSWY3DPEHPK3PXP'),
+    (Tag, 'title', 'unconstrained'),
+    (Tag, 'color', '1590fc'),
+    (APIToken, 'token', 'qwertyuiopASDFGHJKLzxcvbnm009909'),
+    (APIClient, 'redirect_url', 'https://example.com/api?redirect=1'),
+]
+
+
+def _create(model: type[MyModel]) -> MyModel:
+    """Create a object for a model with the required fields set.
+
+    Args:
+        model: the model to create the object for.
+
+    Returns:
+        The created object.
+    """
+    required: dict[type[MyModel], dict[str, Any]] = {
+        User: {'fullname': 'Benchmark', 'username': 'benchmark',
+               'email': 'benchmark@dstark.nl'},
+        Tag: {'title': 'benchmark'},
+        APIToken: {'title': 'benchmark'},
+        APIClient: {'app_name': 'benchmark', 'app_publisher': 'benchmark'}
+    }
+    return model(**required[model])
+
+
+@pytest.mark.parametrize(
+    'model, field, value', FIELDS,
+    ids=[f'{model.__name__}.{field}' for model, field, _ in FIELDS])
+def test_bench_field_assignment(
+        benchmark: BenchmarkFixture,
+        model: type[MyModel],
+        field: str,
+        value: str) -> None:
+    """Benchmark a validated assignment to a field.
+
+    Args:
+        benchmark: the pytest-benchmark fixture.
+        model: the model with the field.
+        field: the name of the field.
+        value: a valid value for the field.
+    """
+    instance = _create(model)
+    benchmark(setattr, instance, field, value)
@@ -0,0 +1,25 @@
+"""Benchmarks for importing the package."""
+import subprocess
+import sys
+
+from pytest_benchmark.fixture import BenchmarkFixture
+import pytest
+
+
+@pytest.mark.parametrize(
+    'code',
+    ['import my_model.enums',
+     'import my_model.model',
+     'from my_model import *'],
+    ids=['enums', 'model', 'everything'])
+def test_bench_import(benchmark: BenchmarkFixture, code: str) -> None:
+    """Benchmark importing a part of the package in a new interpreter.
+
+    Args:
+        benchmark: the pytest-benchmark fixture.
+        code: the import to benchmark.
+    """
+    benchmark.pedantic(subprocess.run,
+                       args=([sys.executable, '-c', code],),
+                       kwargs={'check': True},
+                       rounds=5)
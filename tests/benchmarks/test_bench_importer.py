@@ -0,0 +1,77 @@
+"""Benchmarks for the streaming import of users.
+
+The cheapest hasher profile is used, so the benchmarks measure the
+validation and inserts instead of the password hashing.
+"""
+from typing import Any
+
+from pytest import fixture
+from pytest_benchmark.fixture import BenchmarkFixture
+from sqlmodel import Session, SQLModel, create_engine
+
+from my_model import Tag, User, import_users
+
+
+@fixture
+def records() -> list[dict[str, Any]]:
+    """Fixture that creates records for users.
+
+    Returns:
+        A list with records for users with tags.
+    """
+    return [{'fullname': f'User {index}',
+             'username': f'user{index}',
+             'email': f'user{index}@dstark.nl',
+             'password': f'password{index}',
+             'tags': [{'title': f'tag {tag}'} for tag in range(3)]}
+            for index in range(200)]
+
+
+def new_session() -> Session:
+    """Create a session for a new in-memory database.
+
+    Returns:
+        The created session.
+    """
+    engine = create_engine('sqlite://')
+    SQLModel.metadata.create_all(engine)
+    return Session(engine)
+
+
+def test_bench_import_one_by_one(
+        benchmark: BenchmarkFixture,
+        records: list[dict[str, Any]]) -> None:
+    """Benchmark creating users and tags one by one.
+
+    Args:
+        benchmark: the pytest-benchmark fixture.
+        records: records for users.
+    """
+    def run() -> None:
+        with new_session() as session:
+            for record in records:
+                user = User(fullname=record['fullname'],
+                            username=record['username'],
+                            email=record['email'])
+                user.set_password(record['password'], 'test')
+                user.tags = [Tag(**tag) for tag in record['tags']]
+                session.add(user)
+                session.commit()
+
+    benchmark.pedantic(run, rounds=3)
+
+
+def test_bench_import_users(
+        benchmark: BenchmarkFixture,
+        records: list[dict[str, Any]]) -> None:
+    """Benchmark importing users with `import_users`.
+
+    Args:
+        benchmark: the pytest-benchmark fixture.
+        records: records for users.
+    """
+    def run() -> None:
+        with new_session() as session:
+            import_users(session, records, batch_size=50, profile='test')
+
+    benchmark.pedantic(run, rounds=3)
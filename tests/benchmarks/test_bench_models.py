@@ -0,0 +1,49 @@
+"""Benchmarks for the construction of models."""
+from datetime import datetime
+from typing import Any
+
+from pytest_benchmark.fixture import BenchmarkFixture
+import pytest
+
+from my_model import (APIClient, APIScope, APIToken, APITokenScope, MyModel,
+                      Tag, User, UserSetting)
+
+CONSTRUCTORS: list[tuple[type[Any], dict[str, Any]]] = [
+    (User, {'fullname': 'Daryl Stark', 'username': 'daryl.stark',
+            'email': 'daryl.stark@dstark.nl'}),
+    (APIScope, {'module': 'users', 'subject': 'read'}),
+    (APITokenScope, {'api_token_id': 1, 'api_scope_id': 1}),
+    (APIClient, {'app_name': 'benchmark', 'app_publisher': 'benchmark',
+                 'redirect_url': 'https://example.com/callback',
+                 'user_id': 1, 'expires': datetime(2030, 1, 1)}),
+    (APIToken, {'title': 'benchmark', 'user_id': 1,
+                'expires': datetime(2030, 1, 1)}),
+    (Tag, {'title': 'work', 'color': '1590fc', 'user_id': 1}),
+    (UserSetting, {'setting': 'theme', 'value': 'dark', 'user_id': 1}),
+]
+
+
+@pytest.mark.parametrize(
+    'model, values', CONSTRUCTORS,
+    ids=[model.__name__ for model, _ in CONSTRUCTORS])
+def test_bench_construct(benchmark: BenchmarkFixture,
+                         model: type[MyModel],
+                         values: dict[str, Any]) -> None:
+    """Benchmark creating a object with the constructor.
+
+    Args:
+        benchmark: the pytest-benchmark fixture.
+        model: the model to create a object for.
+        values: the values for the object.
+    """
+    benchmark(lambda: model(**values))
+
+
+def test_bench_get_random_string(benchmark: BenchmarkFixture) -> None:
+    """Benchmark generating a random string of random length.
+
+    Args:
+        benchmark: the pytest-benchmark fixture.
+    """
+    tag = Tag(title='benchmark')
+    benchmark(tag.get_random_string, 16, 64)
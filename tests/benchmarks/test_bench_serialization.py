@@ -0,0 +1,74 @@
+"""Benchmarks for serializing models."""
+from datetime import datetime
+from typing import Any
+
+from pytest_benchmark.fixture import BenchmarkFixture
+import pytest
+
+from my_model import APIToken, MyModel, Tag, User, UserRole
+
+OBJECTS: list[MyModel] = [
+    User(id=1, fullname='Daryl Stark', username='daryl.stark',
+         email='daryl.stark@dstark.nl', role=UserRole.ROOT),
+    Tag(id=1, title='work', color='1590fc', user_id=1),
+    APIToken(id=1, title='benchmark', user_id=1, expires=datetime(2030, 1, 1),
+             token_digest='a' * 64, scope_mask=7)
+]
+
+METHODS = ['model_dump_json', 'msgpack', 'json']
+
+
+def _round_trip(obj: MyModel, method: str) -> Any:
+    """Serialize and deserialize a object.
+
+    Args:
+        obj: the object.
+        method: the serialization method; `model_dump_json` for the generic
+            Pydantic serialization, or a format for `to_bytes`.
+
+    Returns:
+        The deserialized object.
+    """
+    model = type(obj)
+    if method == 'model_dump_json':
+        return model.model_validate_json(obj.model_dump_json())
+    return model.from_bytes(obj.to_bytes(method), method)  # type: ignore
+
+
+@pytest.mark.parametrize('method', METHODS)
+@pytest.mark.parametrize('obj', OBJECTS,
+                         ids=[type(obj).__name__ for obj in OBJECTS])
+def test_bench_serialize(benchmark: BenchmarkFixture,
+                         obj: MyModel,
+                         method: str) -> None:
+    """Benchmark serializing a object.
+
+    Args:
+        benchmark: the pytest-benchmark fixture.
+        obj: the object to serialize.
+        method: the serialization method.
+    """
+    if method == 'msgpack':
+        pytest.importorskip('msgpack')
+    if method == 'model_dump_json':
+        benchmark(obj.model_dump_json)
+    else:
+        benchmark(obj.to_bytes, method)
+
+
+@pytest.mark.parametrize('method', METHODS)
+@pytest.mark.parametrize('obj', OBJECTS,
+                         ids=[type(obj).__name__ for obj in OBJECTS])
+def test_bench_round_trip(benchmark: BenchmarkFixture,
+                          obj: MyModel,
+                          method: str) -> None:
+    """Benchmark serializing and deserializing a object.
+
+    Args:
+        benchmark: the pytest-benchmark fixture.
+        obj: the object to serialize.
+        method: the serialization method.
+    """
+    if method == 'msgpack':
+        pytest.importorskip('msgpack')
+    benchmark(_round_trip, obj, method)
@@ -0,0 +1,50 @@
+"""Benchmarks for token generation."""
+import random
+import string
+
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from my_model import APIToken, generate_tokens
+
+
+def _random_choice_tokens(number: int, length: int) -> list[str]:
+    """Generate tokens the way `get_random_string` used to do it.
+
+    Args:
+        number: the number of tokens to generate.
+        length: the length of the tokens.
+
+    Returns:
+        A list with the generated tokens.
+    """
+    characters = string.ascii_letters + string.digits
+    return [''.join([random.choice(characters) for _ in range(length)])
+            for _ in range(number)]
+
+
+def test_bench_random_choice_tokens(benchmark: BenchmarkFixture) -> None:
+    """Benchmark the per-character `random.choice` path.
+
+    Args:
+        benchmark: the pytest-benchmark fixture.
+    """
+    benchmark(_random_choice_tokens, 10000, 32)
+
+
+def test_bench_generate_tokens(benchmark: BenchmarkFixture) -> None:
+    """Benchmark the bulk token generation.
+
+    Args:
+        benchmark: the pytest-benchmark fixture.
+    """
+    benchmark(generate_tokens, 10000, 32)
+
+
+def test_bench_set_random_token(benchmark: BenchmarkFixture) -> None:
+    """Benchmark setting a random token on a API token.
+
+    Args:
+        benchmark: the pytest-benchmark fixture.
+    """
+    api_token = APIToken(title='benchmark')
+    benchmark(api_token.set_random_token, force=True)
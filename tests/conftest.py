@@ -0,0 +1,34 @@
+"""Shared fixtures for the tests."""
+from typing import Iterator
+
+from pytest import fixture
+from sqlmodel import Session, SQLModel, create_engine
+
+from my_model import (TOTPVerifier, set_default_hasher_profile,
+                      set_totp_verifier)
+
+# Use the cheapest password hashing parameters for all tests
+set_default_hasher_profile('test')
+
+
+@fixture
+def session() -> Iterator[Session]:
+    """Fixture that creates a session for a in-memory SQLite database.
+
+    Yields:
+        A session for a empty database with all tables created.
+    """
+    engine = create_engine('sqlite://')
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as db_session:
+        yield db_session
+
+
+@fixture(autouse=True)
+def totp_verifier() -> None:
+    """Fixture that gives every test a new TOTP verifier.
+
+    This makes sure codes that are used in one test are not refused as
+    replays in another test.
+    """
+    set_totp_verifier(TOTPVerifier())
@@ -1,9 +1,13 @@
 """Tests for API Tokens."""
 # pylint: disable=redefined-outer-name
+from datetime import datetime, timedelta
+
 from pytest import fixture, raises
+from sqlmodel import Session
 import pytest
 
-from my_model import APIToken
+from my_model import (APIScope, APIToken, APITokenScope, set_token_digest_key,
+                      token_digest)
 
 
 @fixture
@@ -94,3 +98,220 @@ def test_api_token_not_overwrite(example_api_token: APIToken) -> None:
     _ = example_api_token.set_random_token()
     with raises(PermissionError):
         _ = example_api_token.set_random_token()
+
+
+def test_api_token_token_column_indexed() -> None:
+    """Test if the token column is indexed and unique."""
+    column = APIToken.__table__.c.token  # type: ignore
+    assert column.index
+    assert column.unique
+
+
+def test_api_token_get_by_token(session: Session) -> None:
+    """Test if we can retrieve a API token by its token.
+
+    Args:
+        session: a database session.
+    """
+    api_token = APIToken(
+        title='testtoken',
+        expires=datetime.utcnow() + timedelta(days=1))
+    token = api_token.set_random_token()
+    session.add(api_token)
+    session.commit()
+
+    found = APIToken.get_by_token(session, token)
+    assert found is not None
+    assert found.id == api_token.id
+    assert APIToken.get_by_token(session, 'a' * 32) is None
+
+
+@pytest.mark.parametrize(
+    'enabled, expires_in, valid',
+    [(True, timedelta(days=1), True),
+     (False, timedelta(days=1), False),
+     (True, timedelta(0), False),
+     (True, timedelta(days=-1), False)])
+def test_api_token_is_valid(
+        enabled: bool,
+        expires_in: timedelta,
+        valid: bool) -> None:
+    """Test if the validity of a API token is checked correctly.
+
+    Args:
+        enabled: if the token is enabled.
+        expires_in: the time until the token expires.
+        valid: if the token should be valid.
+    """
+    now = datetime.utcnow()
+    api_token = APIToken(
+        title='testtoken', enabled=enabled, expires=now + expires_in)
+    assert api_token.is_valid(now) is valid
+
+
+def test_api_token_expired_by_default() -> None:
+    """Test if a new API token is expired until the expiration is set."""
+    assert not APIToken(title='testtoken').is_valid()
+
+
+def test_api_token_get_by_token_invalid(session: Session) -> None:
+    """Test if disabled and expired API tokens are not returned.
+
+    Args:
+        session: a database session.
+    """
+    expired = APIToken(
+        title='expired',
+        expires=datetime.utcnow() - timedelta(days=1))
+    disabled = APIToken(
+        title='disabled',
+        enabled=False,
+        expires=datetime.utcnow() + timedelta(days=1))
+    expired_token = expired.set_random_token()
+    disabled_token = disabled.set_random_token()
+    session.add_all([expired, disabled])
+    session.commit()
+
+    assert APIToken.get_by_token(session, expired_token) is None
+    assert APIToken.get_by_token(session, disabled_token) is None
+    assert APIToken.get_by_token(
+        session,
+        expired_token,
+        now=datetime.utcnow() - timedelta(days=2)) is not None
+
+
+def test_api_token_hashed_storage(
+        session: Session,
+        monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test if only the digest is stored when plaintext storage is disabled.
+
+    Args:
+        session: a database session.
+        monkeypatch: the pytest monkeypatch fixture.
+    """
+    monkeypatch.setattr(APIToken, 'store_plaintext_token', False)
+    api_token = APIToken(
+        title='testtoken',
+        expires=datetime.utcnow() + timedelta(days=1))
+    token = api_token.set_random_token()
+    session.add(api_token)
+    session.commit()
+
+    assert api_token.token is None
+    assert api_token.token_digest == token_digest(token)
+    found = APIToken.get_by_token(session, token)
+    assert found is not None
+    assert found.id == api_token.id
+
+    with raises(PermissionError):
+        api_token.set_random_token()
+
+
+def test_api_token_digest_derived(session: Session) -> None:
+    """Test if the digest is derived from a token that is set directly.
+
+    Args:
+        session: a database session.
+    """
+    api_token = APIToken(title='testtoken', token='a' * 32,
+                         expires=datetime.utcnow() + timedelta(days=1))
+    session.add(api_token)
+    session.commit()
+    assert api_token.token_digest == token_digest('a' * 32)
+
+    api_token.token = 'b' * 32
+    assert api_token.token_digest == token_digest('b' * 32)
+
+    rows = [{'title': 'bulk', 'token': 'c' * 32}]
+    for validate in ('once', 'each', 'none'):
+        bulk_token = APIToken.bulk_from_rows(rows, validate=validate)[0]
+        session.add(bulk_token)
+        session.flush()
+        assert bulk_token.token_digest == token_digest('c' * 32)
+        session.rollback()
+
+
+def test_api_token_hashed_storage_direct(
+        session: Session,
+        monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test if a token that is set directly is not stored in plaintext.
+
+    Args:
+        session: a database session.
+        monkeypatch: the pytest monkeypatch fixture.
+    """
+    monkeypatch.setattr(APIToken, 'store_plaintext_token', False)
+    api_token = APIToken(title='testtoken', token='a' * 32,
+                         expires=datetime.utcnow() + timedelta(days=1))
+    session.add(api_token)
+    session.commit()
+
+    assert api_token.token is None
+    assert api_token.token_digest == token_digest('a' * 32)
+    found = APIToken.get_by_token(session, 'a' * 32)
+    assert found is not None
+    assert found.id == api_token.id
+
+
+def test_token_digest_key() -> None:
+    """Test if the digest key changes the digest."""
+    default_digest = token_digest('a' * 32)
+    try:
+        set_token_digest_key(b'secret')
+        assert token_digest('a' * 32) != default_digest
+    finally:
+        set_token_digest_key(b'')
+
+    with raises(ValueError):
+        set_token_digest_key(b'x' * 65)
+
+
+def test_api_token_has_scopes(session: Session) -> None:
+    """Test if the scopes of a API token can be checked.
+
+    Args:
+        session: a database session.
+    """
+    api_token = APIToken(title='testtoken')
+    read = APIScope(module='notes', subject='read')
+    write = APIScope(module='notes', subject='write')
+    api_token.token_scopes.append(read)
+    session.add(api_token)
+    session.commit()
+
+    assert api_token.has_scope('notes.read')
+    assert not api_token.has_scope('notes.write')
+    assert api_token.has_scopes(['notes.read'])
+    assert not api_token.has_scopes(['notes.read', 'notes.write'])
+
+    # Changing the relationship invalidates the cache
+    api_token.token_scopes.append(write)
+    assert api_token.has_scopes(['notes.read', 'notes.write'])
+    api_token.token_scopes.remove(read)
+    assert not api_token.has_scope('notes.read')
+
+
+def test_api_token_scopes_cached(session: Session) -> None:
+    """Test if the scope names are only resolved once.
+
+    Args:
+        session: a database session.
+    """
+    api_token = APIToken(title='testtoken')
+    api_token.token_scopes.append(APIScope(module='notes', subject='read'))
+    session.add(api_token)
+    session.commit()
+
+    scope_names = api_token.scope_names
+    assert api_token.scope_names is scope_names
+
+    # A direct change to the link table needs a explicit invalidation
+    scope = APIScope(module='notes', subject='write')
+    session.add(scope)
+    session.flush()
+    session.add(APITokenScope(api_token_id=api_token.id,
+                              api_scope_id=scope.id))
+    session.flush()
+    assert not api_token.has_scope('notes.write')
+    session.expire(api_token)
+    assert api_token.has_scope('notes.write')
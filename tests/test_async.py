@@ -0,0 +1,153 @@
+"""Tests for the helpers for async sessions."""
+import asyncio
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta
+from typing import TypeVar
+
+from pytest import raises
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from my_model import (APIScope, APIToken, MemoryAuthCache, ScopeRegistry,
+                      Tag, User, UserSetting, aauthenticate_token,
+                      set_auth_cache)
+
+Result = TypeVar('Result')
+
+
+def run(test: Callable[[AsyncSession], Awaitable[Result]]) -> Result:
+    """Run a test with a async session for a in-memory SQLite database.
+
+    The database contains a user with a tag, a setting and a API token with
+    two scopes.
+
+    Args:
+        test: the coroutine function to run with the session.
+
+    Returns:
+        The result of the test.
+    """
+    async def main() -> Result:
+        engine = create_async_engine('sqlite+aiosqlite://')
+        async with engine.begin() as connection:
+            await connection.run_sync(SQLModel.metadata.create_all)
+
+        async with AsyncSession(engine) as session:
+            user = User(fullname='Async user', username='async.user',
+                        email='async@dstark.nl')
+            user.tags = [Tag(title='work')]
+            user.user_settings = [UserSetting(setting='theme', value='dark')]
+            api_token = APIToken(title='token',
+                                 expires=datetime.utcnow() + timedelta(1))
+            api_token.set_random_token()
+            api_token.token_scopes = [
+                APIScope(module='notes', subject='read', bit_position=0),
+                APIScope(module='notes', subject='write', bit_position=1)]
+            user.api_tokens = [api_token]
+            session.add(user)
+            await session.commit()
+
+        try:
+            async with AsyncSession(engine) as session:
+                return await test(session)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+async def get_token(session: AsyncSession) -> str:
+    """Return the plaintext token of the API token in the database.
+
+    Args:
+        session: a async database session.
+
+    Returns:
+        The token.
+    """
+    token = (await session.exec(select(APIToken.token))).one()
+    assert token is not None
+    return token
+
+
+def test_aget_by_token() -> None:
+    """Test if API tokens can be retrieved with a async session."""
+    async def test(session: AsyncSession) -> None:
+        token = await get_token(session)
+        api_token = await APIToken.aget_by_token(session, token,
+                                                 profile='auth')
+        assert api_token is not None
+        assert api_token.user.username == 'async.user'
+        assert api_token.scope_names == {'notes.read', 'notes.write'}
+        with raises(InvalidRequestError):
+            assert api_token.api_client is None
+
+        assert await APIToken.aget_by_token(session, 'x' * 32) is None
+        assert await APIToken.aget_by_token(
+            session, token, now=datetime.utcnow() + timedelta(2)) is None
+
+    run(test)
+
+
+def test_aget_scope_names() -> None:
+    """Test if the scopes of a API token can be loaded explicitly."""
+    async def test(session: AsyncSession) -> None:
+        api_token = await APIToken.aget_by_token(session,
+                                                 await get_token(session))
+        assert api_token is not None
+        with raises(InvalidRequestError):
+            assert api_token.token_scopes
+        assert await api_token.aget_scope_names(session) == {
+            'notes.read', 'notes.write'}
+
+    run(test)
+
+
+def test_aload() -> None:
+    """Test if relationships of users can be loaded explicitly."""
+    async def test(session: AsyncSession) -> None:
+        user = (await session.exec(
+            select(User).options(*User.load_profile(None, strict=True)))
+        ).one()
+        with raises(InvalidRequestError):
+            assert user.tags
+
+        await user.aload(session, 'tags', 'api_tokens')
+        assert [tag.title for tag in user.tags] == ['work']
+        assert len(user.api_tokens) == 1
+
+        settings = await user.aget_settings(session)
+        assert settings['theme'] == 'dark'
+
+    run(test)
+
+
+def test_scope_registry_aload() -> None:
+    """Test if the scope registry can be loaded with a async session."""
+    async def test(session: AsyncSession) -> None:
+        registry = await ScopeRegistry.aload(session)
+        assert registry.mask(['notes.read', 'notes.write']) == 0b11
+
+    run(test)
+
+
+def test_aauthenticate_token() -> None:
+    """Test if tokens can be authenticated with a async session."""
+    cache = MemoryAuthCache()
+    set_auth_cache(cache)
+
+    async def test(session: AsyncSession) -> None:
+        token = await get_token(session)
+        snapshot = await aauthenticate_token(session, token)
+        assert snapshot is not None
+        assert snapshot.has_scope('notes.write')
+        assert len(cache) == 1
+        assert await aauthenticate_token(session, token) == snapshot
+        assert await aauthenticate_token(session, 'x' * 32) is None
+
+    try:
+        run(test)
+    finally:
+        set_auth_cache(None)
@@ -0,0 +1,343 @@
+"""Tests for the cache for authenticated API tokens."""
+# pylint: disable=redefined-outer-name
+from collections.abc import Iterator
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from pytest import fixture, raises
+from sqlalchemy import Engine
+from sqlmodel import Session, SQLModel, create_engine, update
+
+from my_model import (APIScope, APIToken, AuthSnapshot, MemoryAuthCache,
+                      User, UserRole, authenticate_token, set_auth_cache)
+from my_model.testing import count_queries
+
+
+@fixture
+def auth_cache() -> Iterator[MemoryAuthCache]:
+    """Fixture that activates a in-memory auth cache.
+
+    Yields:
+        The active cache.
+    """
+    cache = MemoryAuthCache()
+    set_auth_cache(cache)
+    yield cache
+    set_auth_cache(None)
+
+
+@fixture
+def token_with_user(session: Session) -> tuple[str, APIToken]:
+    """Fixture that creates a user with a API token.
+
+    Args:
+        session: a database session.
+
+    Returns:
+        The plaintext token and the API token.
+    """
+    user = User(fullname='Fake fullname', username='fake.user',
+                email='fake@dstark.nl')
+    api_token = APIToken(title='token',
+                         expires=datetime.utcnow() + timedelta(days=1))
+    api_token.token_scopes = [APIScope(module='users', subject='read')]
+    token = api_token.set_random_token()
+    user.api_tokens = [api_token]
+    session.add(user)
+    session.commit()
+    return token, api_token
+
+
+def make_snapshot(token_id: int, user_id: int,
+                  expires_in: timedelta = timedelta(days=1)) -> AuthSnapshot:
+    """Create a snapshot for the cache tests.
+
+    Args:
+        token_id: the ID of the token.
+        user_id: the ID of the user.
+        expires_in: the time until the token expires.
+
+    Returns:
+        The snapshot.
+    """
+    return AuthSnapshot(token_id=token_id, user_id=user_id,
+                        role=UserRole.USER, scopes=frozenset(),
+                        scope_mask=0, expires=datetime.utcnow() + expires_in)
+
+
+def test_authenticate_token_cached(
+        session: Session,
+        auth_cache: MemoryAuthCache,
+        token_with_user: tuple[str, APIToken]) -> None:
+    """Test if a cached token is resolved without queries.
+
+    Args:
+        session: a database session.
+        auth_cache: the active auth cache.
+        token_with_user: the plaintext token and the API token.
+    """
+    token, api_token = token_with_user
+    engine = session.get_bind()
+    assert isinstance(engine, Engine)
+    with count_queries(engine) as counter:
+        snapshot = authenticate_token(session, token)
+    assert counter.count == 2
+    assert snapshot is not None
+    assert snapshot.token_id == api_token.id
+    assert snapshot.role == UserRole.USER
+    assert snapshot.has_scope('users.read')
+    assert len(auth_cache) == 1
+
+    with count_queries(engine) as counter:
+        assert authenticate_token(session, token) == snapshot
+    assert counter.count == 0
+
+
+def test_authenticate_token_invalid(
+        session: Session,
+        auth_cache: MemoryAuthCache,
+        token_with_user: tuple[str, APIToken]) -> None:
+    """Test if invalid tokens are not resolved.
+
+    Args:
+        session: a database session.
+        auth_cache: the active auth cache.
+        token_with_user: the plaintext token and the API token.
+    """
+    token, api_token = token_with_user
+    assert authenticate_token(session, 'a' * 32) is None
+    assert authenticate_token(session, 'invalid') is None
+    assert authenticate_token(
+        session, token, now=api_token.expires + timedelta(seconds=1)) is None
+    assert len(auth_cache) == 0
+
+
+def test_authenticate_token_without_owner(
+        session: Session,
+        auth_cache: MemoryAuthCache) -> None:
+    """Test if tokens without a owner are not resolved.
+
+    Args:
+        session: a database session.
+        auth_cache: the active auth cache.
+    """
+    api_token = APIToken(title='token',
+                         expires=datetime.utcnow() + timedelta(days=1))
+    token = api_token.set_random_token()
+    session.add(api_token)
+    session.commit()
+
+    assert authenticate_token(session, token) is None
+    assert len(auth_cache) == 0
+    with raises(ValueError, match='no owner'):
+        AuthSnapshot.from_token(api_token)
+
+
+def test_authenticate_token_without_cache(
+        session: Session,
+        token_with_user: tuple[str, APIToken]) -> None:
+    """Test if tokens are resolved when no cache is active.
+
+    Args:
+        session: a database session.
+        token_with_user: the plaintext token and the API token.
+    """
+    token, _ = token_with_user
+    assert authenticate_token(session, token) is not None
+    engine = session.get_bind()
+    assert isinstance(engine, Engine)
+    with count_queries(engine) as counter:
+        assert authenticate_token(session, token) is not None
+    assert counter.count == 2
+
+
+def test_authenticate_token_plaintext(
+        session: Session,
+        auth_cache: MemoryAuthCache) -> None:
+    """Test if a token that is set directly is resolved.
+
+    The digest is removed from the row, like for rows that where stored
+    before the digest was derived from the token.
+
+    Args:
+        session: a database session.
+        auth_cache: the active auth cache.
+    """
+    user = User(fullname='Fake fullname', username='fake.user',
+                email='fake@dstark.nl')
+    user.api_tokens = [APIToken(title='token', token='a' * 32,
+                                expires=datetime.utcnow() + timedelta(1))]
+    session.add(user)
+    session.commit()
+    session.exec(update(APIToken).values(  # type: ignore[call-overload]
+        token_digest=None))
+    session.commit()
+
+    snapshot = authenticate_token(session, 'a' * 32)
+    assert snapshot is not None
+    assert snapshot.user_id == user.id
+    assert len(auth_cache) == 1
+
+
+def test_auth_cache_invalidated(
+        session: Session,
+        auth_cache: MemoryAuthCache,
+        token_with_user: tuple[str, APIToken]) -> None:
+    """Test if changes to tokens and users invalidate the cache.
+
+    Args:
+        session: a database session.
+        auth_cache: the active auth cache.
+        token_with_user: the plaintext token and the API token.
+    """
+    token, api_token = token_with_user
+
+    authenticate_token(session, token)
+    api_token.token_scopes = []
+    session.commit()
+    assert len(auth_cache) == 0
+    snapshot = authenticate_token(session, token)
+    assert snapshot is not None and not snapshot.scopes
+
+    api_token.user.role = UserRole.ROOT
+    session.commit()
+    assert len(auth_cache) == 0
+    snapshot = authenticate_token(session, token)
+    assert snapshot is not None and snapshot.role == UserRole.ROOT
+
+    session.expire_all()
+    api_token.enabled = False
+    session.commit()
+    assert len(auth_cache) == 0
+    assert authenticate_token(session, token) is None
+
+
+def test_auth_cache_invalidated_on_commit(
+        tmp_path: Path,
+        auth_cache: MemoryAuthCache) -> None:
+    """Test if a token that is cached before a change is committed is not used.
+
+    Args:
+        tmp_path: a temporary directory for the database file.
+        auth_cache: the active auth cache.
+    """
+    engine = create_engine(f'sqlite:///{tmp_path / "auth.db"}')
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        user = User(fullname='Fake fullname', username='fake.user',
+                    email='fake@dstark.nl')
+        api_token = APIToken(title='token',
+                             expires=datetime.utcnow() + timedelta(days=1))
+        token = api_token.set_random_token()
+        user.api_tokens = [api_token]
+        session.add(user)
+        session.commit()
+
+        api_token.enabled = False
+        with Session(engine) as other_session:
+            assert authenticate_token(other_session, token) is not None
+        assert len(auth_cache) == 1
+        session.commit()
+
+    assert len(auth_cache) == 0
+    with Session(engine) as session:
+        assert authenticate_token(session, token) is None
+    engine.dispose()
+
+
+def test_auth_cache_rollback(
+        session: Session,
+        auth_cache: MemoryAuthCache,
+        token_with_user: tuple[str, APIToken]) -> None:
+    """Test if changes that are rolled back don't invalidate the cache.
+
+    Args:
+        session: a database session.
+        auth_cache: the active auth cache.
+        token_with_user: the plaintext token and the API token.
+    """
+    token, api_token = token_with_user
+    assert authenticate_token(session, token) is not None
+    api_token.enabled = False
+    session.rollback()
+    session.commit()
+    assert len(auth_cache) == 1
+
+
+def test_auth_cache_invalidated_on_delete(
+        session: Session,
+        auth_cache: MemoryAuthCache,
+        token_with_user: tuple[str, APIToken]) -> None:
+    """Test if deleting a token or a user invalidates the cache.
+
+    Args:
+        session: a database session.
+        auth_cache: the active auth cache.
+        token_with_user: the plaintext token and the API token.
+    """
+    token, api_token = token_with_user
+    user = api_token.user
+    assert authenticate_token(session, token) is not None
+    session.delete(api_token)
+    session.commit()
+    assert len(auth_cache) == 0
+    assert authenticate_token(session, token) is None
+
+    other = APIToken(title='other', user_id=user.id,
+                     expires=datetime.utcnow() + timedelta(days=1))
+    other_token = other.set_random_token()
+    session.add(other)
+    session.commit()
+    assert authenticate_token(session, other_token) is not None
+    session.delete(user)
+    session.commit()
+    assert len(auth_cache) == 0
+
+
+def test_auth_cache_invalidated_on_new_token(
+        session: Session,
+        auth_cache: MemoryAuthCache,
+        token_with_user: tuple[str, APIToken]) -> None:
+    """Test if the old token is not resolved after a new token is set.
+
+    Args:
+        session: a database session.
+        auth_cache: the active auth cache.
+        token_with_user: the plaintext token and the API token.
+    """
+    token, api_token = token_with_user
+    assert authenticate_token(session, token) is not None
+    new_token = api_token.set_random_token(force=True)
+    session.commit()
+    assert len(auth_cache) == 0
+    assert authenticate_token(session, token) is None
+    assert authenticate_token(session, new_token) is not None
+
+
+def test_memory_auth_cache_bounded() -> None:
+    """Test if the in-memory cache removes the least recently used items."""
+    cache = MemoryAuthCache(maxsize=2)
+    cache.set('a', make_snapshot(1, 1))
+    cache.set('b', make_snapshot(2, 1))
+    assert cache.get('a') is not None
+    cache.set('c', make_snapshot(3, 2))
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert len(cache) == 2
+
+    cache.invalidate_user(1)
+    assert cache.get('a') is None
+    cache.invalidate_token(3)
+    assert len(cache) == 0
+
+
+def test_memory_auth_cache_expiry() -> None:
+    """Test if expired snapshots are not returned."""
+    cache = MemoryAuthCache(ttl=0)
+    cache.set('a', make_snapshot(1, 1))
+    assert cache.get('a') is None
+
+    cache = MemoryAuthCache()
+    cache.set('a', make_snapshot(1, 1, expires_in=timedelta(0)))
+    assert cache.get('a') is None
+    assert len(cache) == 0
@@ -0,0 +1,70 @@
+"""Tests for the bulk construction of models."""
+from pydantic import ValidationError
+from pytest import raises
+from sqlmodel import Session, select
+import pytest
+
+from my_model import Tag, User, UserRole
+
+
+@pytest.mark.parametrize('validate', ['once', 'each', 'none'])
+def test_bulk_from_rows(session: Session, validate: str) -> None:
+    """Test if objects created in bulk can be stored.
+
+    Args:
+        session: a database session.
+        validate: the validation mode to test.
+    """
+    user = User(fullname='Bulk user', username='bulk.user',
+                email='bulk@dstark.nl')
+    session.add(user)
+    session.commit()
+
+    tags = Tag.bulk_from_rows(
+        [{'title': f'tag {index}', 'color': 'ff0000', 'user_id': user.id}
+         for index in range(10)],
+        validate=validate)  # type: ignore[arg-type]
+    session.add_all(tags)
+    session.commit()
+
+    stored = session.exec(select(Tag).where(Tag.user_id == user.id)).all()
+    assert [tag.title for tag in stored] == [f'tag {i}' for i in range(10)]
+    assert all(tag.id is not None for tag in tags)
+
+
+def test_bulk_from_rows_defaults() -> None:
+    """Test if defaults are filled in for missing fields."""
+    users = User.bulk_from_rows([{
+        'fullname': 'Bulk user',
+        'username': 'bulk.user',
+        'email': 'bulk@dstark.nl'}])
+    assert users[0].role == UserRole.USER
+    assert users[0].created is not None
+    assert users[0].model_fields_set == {'fullname', 'username', 'email'}
+
+
+@pytest.mark.parametrize('validate', ['once', 'each'])
+def test_bulk_from_rows_invalid(validate: str) -> None:
+    """Test if invalid rows are refused.
+
+    Args:
+        validate: the validation mode to test.
+    """
+    with raises(ValidationError):
+        Tag.bulk_from_rows(
+            [{'title': 'valid', 'color': 'ff0000'},
+             {'title': 'invalid', 'color': 'red'}],
+            validate=validate)  # type: ignore[arg-type]
+
+
+def test_bulk_from_rows_validates_assignment() -> None:
+    """Test if objects created in bulk still validate assignments."""
+    tag = Tag.bulk_from_rows([{'title': 'tag'}], validate='none')[0]
+    with raises(ValueError):
+        tag.color = 'red'
+
+
+def test_bulk_from_rows_unknown_mode() -> None:
+    """Test if a unknown validation mode is refused."""
+    with raises(ValueError):
+        Tag.bulk_from_rows([], validate='sometimes')  # type: ignore
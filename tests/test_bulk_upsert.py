@@ -0,0 +1,102 @@
+"""Tests for the bulk upserts of user scoped models."""
+# pylint: disable=redefined-outer-name
+from pydantic import ValidationError
+from pytest import fixture, raises
+from sqlalchemy import Engine
+from sqlmodel import Session, select
+
+from my_model import Tag, User, UserSetting
+from my_model.testing import count_queries
+
+
+@fixture
+def example_user(session: Session) -> User:
+    """Fixture that creates a stored user.
+
+    Args:
+        session: a database session.
+
+    Returns:
+        The created User object.
+    """
+    user = User(fullname='Upsert user', username='upsert.user',
+                email='upsert@dstark.nl')
+    session.add(user)
+    session.commit()
+    return user
+
+
+def test_user_setting_bulk_upsert(
+        session: Session,
+        example_user: User) -> None:
+    """Test if settings are inserted and updated in bulk.
+
+    Args:
+        session: a database session.
+        example_user: a stored user.
+    """
+    assert example_user.id is not None
+    engine = session.get_bind()
+    assert isinstance(engine, Engine)
+
+    UserSetting.bulk_upsert(session, example_user.id,
+                            {'theme': 'dark', 'language': 'nl'})
+    with count_queries(engine) as counter:
+        assert UserSetting.bulk_upsert(
+            session, example_user.id,
+            {'theme': 'light', 'page_size': '50', 'timezone': 'UTC'},
+            batch_size=2) == 3
+    session.commit()
+
+    assert counter.count == 2
+    stored = dict(session.exec(
+        select(UserSetting.setting, UserSetting.value)
+        .where(UserSetting.user_id == example_user.id)).all())
+    assert stored == {'theme': 'light', 'language': 'nl',
+                      'page_size': '50', 'timezone': 'UTC'}
+
+
+def test_tag_bulk_upsert(session: Session, example_user: User) -> None:
+    """Test if tags are inserted and updated in bulk.
+
+    Args:
+        session: a database session.
+        example_user: a stored user.
+    """
+    assert example_user.id is not None
+    Tag.bulk_upsert(session, example_user.id, {'work': 'ff0000',
+                                               'home': None})
+    Tag.bulk_upsert(session, example_user.id, {'home': '00ff00'})
+    session.commit()
+
+    stored = dict(session.exec(
+        select(Tag.title, Tag.color)
+        .where(Tag.user_id == example_user.id)).all())
+    assert stored == {'work': 'ff0000', 'home': '00ff00'}
+
+
+def test_bulk_upsert_validates(
+        session: Session,
+        example_user: User) -> None:
+    """Test if invalid values are refused before anything is written.
+
+    Args:
+        session: a database session.
+        example_user: a stored user.
+    """
+    assert example_user.id is not None
+    with raises(ValidationError):
+        Tag.bulk_upsert(session, example_user.id,
+                        {'work': 'ff0000', 'home': 'green'})
+    assert session.exec(select(Tag)).all() == []
+
+
+def test_bulk_upsert_empty(session: Session, example_user: User) -> None:
+    """Test if a empty mapping doesn't do anything.
+
+    Args:
+        session: a database session.
+        example_user: a stored user.
+    """
+    assert example_user.id is not None
+    assert UserSetting.bulk_upsert(session, example_user.id, {}) == 0
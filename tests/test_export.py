@@ -0,0 +1,163 @@
+"""Tests for the streaming export of users."""
+# pylint: disable=redefined-outer-name
+import io
+import json
+from datetime import datetime
+
+from pytest import fixture, raises
+from sqlmodel import Session
+import pytest
+
+from my_model import (APIToken, Tag, User, UserRole, UserSetting,
+                      export_users, iter_user_records)
+from my_model.testing import count_queries
+
+CREATED = datetime(2024, 1, 2, 3, 4, 5)
+
+
+@fixture
+def users(session: Session) -> list[User]:
+    """Fixture that adds users with tokens, tags and settings.
+
+    Args:
+        session: a database session.
+
+    Returns:
+        The added users.
+    """
+    users = [User(fullname=f'User {index}', username=f'user{index}',
+                  email=f'user{index}@dstark.nl', created=CREATED,
+                  role=UserRole.ROOT if index == 0 else UserRole.USER)
+             for index in range(5)]
+    for index, user in enumerate(users):
+        user.set_password('testtest')
+        user.tags = [Tag(title=f'tag {number}') for number in range(index)]
+        user.user_settings = [UserSetting(setting='theme', value='dark')]
+        token = APIToken(title='token', created=CREATED, expires=CREATED)
+        token.set_random_token()
+        user.api_tokens = [token]
+    session.add_all(users)
+    session.commit()
+    return users
+
+
+def test_iter_user_records(session: Session, users: list[User]) -> None:
+    """Test if the related objects are grouped per user.
+
+    Args:
+        session: a database session.
+        users: the users in the database.
+    """
+    records = list(iter_user_records(session, batch_size=2))
+    assert [record['id'] for record in records] == [user.id for user in users]
+
+    first = records[0]
+    assert first['username'] == 'user0'
+    assert first['role'] == UserRole.ROOT.value
+    assert first['created'] == CREATED
+    assert first['tags'] == []
+    assert [tag['title'] for tag in records[3]['tags']] == [
+        'tag 0', 'tag 1', 'tag 2']
+    assert records[1]['user_settings'] == [
+        {'id': 2, 'user_id': 2, 'setting': 'theme', 'value': 'dark'}]
+    assert all(token['user_id'] == record['id']
+               for record in records for token in record['api_tokens'])
+
+
+def test_sensitive_fields_redacted(session: Session,
+                                   users: list[User]) -> None:
+    """Test if sensitive fields are only exported on request.
+
+    Args:
+        session: a database session.
+        users: the users in the database.
+    """
+    record = next(iter_user_records(session))
+    assert 'password_hash' not in record
+    assert 'second_factor' not in record
+    assert 'token' not in record['api_tokens'][0]
+    assert record['api_tokens'][0]['token_digest'] is not None
+
+    record = next(iter_user_records(session, include_sensitive=True))
+    assert record['password_hash'] == users[0].password_hash
+    assert record['api_tokens'][0]['token'] == users[0].api_tokens[0].token
+
+
+def test_queries_per_batch(session: Session, users: list[User]) -> None:
+    """Test if the number of queries only depends on the number of batches.
+
+    Args:
+        session: a database session.
+        users: the users in the database.
+    """
+    engine = session.get_bind()
+    with count_queries(engine) as counter:  # type: ignore[arg-type]
+        assert len(list(iter_user_records(session, batch_size=2))) == 5
+    assert counter.count == 1 + 3 * 3
+
+    with count_queries(engine) as counter:  # type: ignore[arg-type]
+        records = list(iter_user_records(session, relationships=['tags']))
+    assert counter.count == 2
+    assert 'api_tokens' not in records[0]
+
+
+def test_export_ndjson(session: Session, users: list[User]) -> None:
+    """Test if users are exported as newline delimited JSON.
+
+    Args:
+        session: a database session.
+        users: the users in the database.
+    """
+    target = io.BytesIO()
+    assert export_users(session, target, batch_size=2) == len(users)
+
+    lines = target.getvalue().splitlines()
+    assert len(lines) == len(users)
+    record = json.loads(lines[4])
+    assert record['username'] == 'user4'
+    assert record['created'] == '2024-01-02T03:04:05'
+    assert len(record['tags']) == 4
+
+
+@pytest.mark.parametrize('format', ['arrow', 'parquet'])
+def test_export_arrow(session: Session, users: list[User],
+                      format: str) -> None:
+    """Test if users are exported in the columnar formats.
+
+    Args:
+        session: a database session.
+        users: the users in the database.
+        format: the export format.
+    """
+    # pylint: disable=redefined-builtin
+    pyarrow = pytest.importorskip('pyarrow')
+    target = io.BytesIO()
+    assert export_users(session, target, format,  # type: ignore[arg-type]
+                        batch_size=2) == len(users)
+
+    target.seek(0)
+    if format == 'parquet':
+        table = pytest.importorskip('pyarrow.parquet').read_table(target)
+    else:
+        table = pyarrow.ipc.open_file(target).read_all()
+    assert table.num_rows == len(users)
+    assert 'password_hash' not in table.column_names
+    rows = table.to_pylist()
+    assert rows[0]['created'] == CREATED
+    assert [tag['title'] for tag in rows[2]['tags']] == ['tag 0', 'tag 1']
+    assert rows[0]['user_settings'][0]['value'] == 'dark'
+
+
+def test_export_errors(session: Session) -> None:
+    """Test if invalid arguments are refused.
+
+    Args:
+        session: a database session.
+    """
+    with raises(ValueError):
+        export_users(session, io.BytesIO(),
+                     'csv')  # type: ignore[arg-type]
+    with raises(ValueError):
+        export_users(session, io.BytesIO(), batch_size=0)
+    with raises(ValueError):
+        export_users(session, io.BytesIO(), relationships=['user'])
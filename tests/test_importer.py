@@ -0,0 +1,218 @@
+"""Tests for the streaming import of users."""
+import io
+import json
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any
+
+from pydantic import ValidationError
+from pytest import raises
+import pytest
+from sqlmodel import Session, col, delete, func, select
+
+from my_model import (APIToken, Tag, User, UserSetting, export_users,
+                      import_users, token_digest, verify_password)
+
+
+def make_records(number: int) -> list[dict[str, Any]]:
+    """Create records for users with related objects.
+
+    Args:
+        number: the number of records.
+
+    Returns:
+        The created records.
+    """
+    return [{'fullname': f'User {index}',
+             'username': f'user{index}',
+             'email': f'user{index}@dstark.nl',
+             'password': f'password{index}',
+             'tags': [{'title': f'tag {tag}', 'color': '00ff00'}
+                      for tag in range(index % 3)],
+             'user_settings': [{'setting': 'theme', 'value': 'dark'}],
+             'api_tokens': [{'title': 'token'}]}
+            for index in range(number)]
+
+
+def count(session: Session, model: type[Any]) -> int:
+    """Count the rows for a model.
+
+    Args:
+        session: a database session.
+        model: the model to count.
+
+    Returns:
+        The number of rows.
+    """
+    return session.exec(select(func.count()).select_from(model)).one()
+
+
+def test_import_users(session: Session) -> None:
+    """Test if users and their related objects are imported.
+
+    Args:
+        session: a database session.
+    """
+    positions: list[int] = []
+    imported = import_users(session, make_records(7), batch_size=3,
+                            profile='test', second_factors=True,
+                            checkpoint=positions.append)
+    assert imported == 7
+    assert positions == [3, 6, 7]
+
+    users = session.exec(select(User).order_by(col(User.id))).all()
+    assert [user.username for user in users] == [
+        f'user{index}' for index in range(7)]
+    assert verify_password(users[4].password_hash, 'password4')
+    assert all(user.second_factor is not None for user in users)
+    assert [tag.title for tag in users[5].tags] == ['tag 0', 'tag 1']
+    assert users[2].user_settings[0].value == 'dark'
+    assert count(session, Tag) == 6
+    assert count(session, UserSetting) == 7
+
+    tokens = session.exec(select(APIToken)).all()
+    assert len({token.token for token in tokens}) == 7
+    assert all(token.token is not None and
+               token.token_digest == token_digest(token.token)
+               for token in tokens)
+
+
+def test_import_resume(session: Session) -> None:
+    """Test if a import can be resumed from a checkpoint.
+
+    Args:
+        session: a database session.
+    """
+    records = make_records(5)
+    with raises(ValidationError):
+        import_users(session, records[:4] + [{'fullname': 'Invalid'}],
+                     batch_size=2, profile='test')
+    assert count(session, User) == 4
+
+    assert import_users(session, records, batch_size=2, profile='test',
+                        start=4) == 1
+    assert count(session, User) == 5
+
+
+def test_import_backpressure(session: Session) -> None:
+    """Test if the records are not read too far ahead.
+
+    Args:
+        session: a database session.
+    """
+    consumed = 0
+
+    def records() -> Iterator[dict[str, Any]]:
+        nonlocal consumed
+        for record in make_records(10):
+            consumed += 1
+            yield record
+
+    read: list[int] = []
+    import_users(session, records(), batch_size=2, profile='test',
+                 max_pending_batches=1,
+                 checkpoint=lambda _: read.append(consumed))
+    assert read == [4, 6, 8, 10, 10]
+
+
+def test_import_process_pool(session: Session) -> None:
+    """Test if passwords can be hashed in other processes.
+
+    Args:
+        session: a database session.
+    """
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        assert import_users(session, make_records(4), executor=executor,
+                            profile='test') == 4
+    user = session.exec(select(User).where(User.username == 'user3')).one()
+    assert user.verify_credentials('user3', 'password3')
+
+
+def test_import_exported(session: Session) -> None:
+    """Test if exported users can be imported with their token digests.
+
+    Args:
+        session: a database session.
+    """
+    import_users(session, make_records(3), profile='test')
+    exported = io.BytesIO()
+    export_users(session, exported)
+    digests = set(session.exec(select(APIToken.token_digest)).all())
+    session.exec(delete(APIToken))  # type: ignore[call-overload]
+    session.commit()
+
+    records = [json.loads(line) for line in exported.getvalue().splitlines()]
+    for record in records:
+        record['id'] += 100
+        for related in (record['api_tokens'], record['tags'],
+                        record['user_settings']):
+            for row in related:
+                row['id'] += 100
+    assert import_users(session, records, profile='test') == 3
+    assert set(session.exec(select(APIToken.token_digest)).all()) == digests
+    assert count(session, User) == 6
+
+
+def test_import_plaintext_tokens(session: Session) -> None:
+    """Test if the digests are set for imported plaintext tokens.
+
+    Args:
+        session: a database session.
+    """
+    records = make_records(2)
+    records[0]['api_tokens'] = [{'title': 'token', 'token': 'a' * 32}]
+    import_users(session, records, profile='test')
+
+    api_token = session.exec(
+        select(APIToken).where(APIToken.token == 'a' * 32)).one()
+    assert api_token.token_digest == token_digest('a' * 32)
+    assert count(session, APIToken) == 2
+
+
+def test_import_generated_tokens(
+        session: Session,
+        monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test if generated tokens are given to the caller.
+
+    When the plaintext tokens are not stored, tokens are only generated when
+    they can be given to the caller.
+
+    Args:
+        session: a database session.
+        monkeypatch: the pytest monkeypatch fixture.
+    """
+    monkeypatch.setattr(APIToken, 'store_plaintext_token', False)
+    records = make_records(5)
+    with raises(ValueError):
+        import_users(session, records, profile='test')
+    assert count(session, User) == 0
+
+    tokens: dict[int, str] = {}
+    assert import_users(session, records, batch_size=2, profile='test',
+                        start=1, tokens=tokens.__setitem__) == 4
+    assert sorted(tokens) == [1, 2, 3, 4]
+    for index, token in tokens.items():
+        api_token = APIToken.get_by_token(session, token,
+                                          now=datetime(2000, 1, 1))
+        assert api_token is not None
+        assert api_token.token is None
+        assert api_token.user.username == f'user{index}'
+
+
+def test_import_errors(session: Session) -> None:
+    """Test if invalid arguments and passwords are refused.
+
+    Args:
+        session: a database session.
+    """
+    with raises(ValueError):
+        import_users(session, [], batch_size=0)
+    with raises(ValueError):
+        import_users(session, [], max_pending_batches=0)
+    with raises(ValueError):
+        import_users(session, [], start=-1)
+    with raises(ValueError):
+        import_users(session, [{'fullname': 'User', 'username': 'user',
+                                'email': 'user@dstark.nl', 'password': 1}],
+                     profile='test')
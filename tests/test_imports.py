@@ -0,0 +1,77 @@
+"""Tests for the lazy imports of the package."""
+from importlib import import_module
+import subprocess
+import sys
+
+import pytest
+
+import my_model
+
+HEAVY_MODULES = ('argon2', 'pyotp', 'pydantic', 'sqlalchemy', 'sqlmodel')
+
+
+def imported_modules(code: str) -> set[str]:
+    """Return the modules that are imported by a piece of code.
+
+    The code is run in a new interpreter with `-X importtime`, so the
+    modules that are already imported in the test process don't matter.
+
+    Args:
+        code: the code to run.
+
+    Returns:
+        The names of the imported top level modules.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            capture_output=True, text=True, check=True)
+    modules = set()
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            name = line.rsplit('|', 1)[1].strip()
+            modules.add(name.split('.')[0])
+    return modules
+
+
+@pytest.mark.parametrize(
+    'code',
+    ['import my_model',
+     'from my_model import UserRole',
+     'from my_model.enums import UserRole',
+     'from my_model import is_valid_username, generate_tokens'])
+def test_light_imports(code: str) -> None:
+    """Test if the light parts of the package don't import heavy modules.
+
+    Args:
+        code: the import to test.
+    """
+    assert not imported_modules(code) & set(HEAVY_MODULES)
+
+
+def test_models_without_argon2_and_pyotp() -> None:
+    """Test if argon2 and pyotp are only imported when they are used."""
+    code = ('from my_model import User; '
+            'User(fullname="Fake fullname", username="fake.user", '
+            'email="fake@dstark.nl")')
+    modules = imported_modules(code)
+    assert 'sqlmodel' in modules
+    assert 'argon2' not in modules
+    assert 'pyotp' not in modules
+
+    modules = imported_modules(
+        code.replace('User(', 'user = User(') +
+        '; user.set_password("testtest"); user.set_random_second_factor()')
+    assert {'argon2', 'pyotp'} <= modules
+
+
+def test_exports_complete() -> None:
+    """Test if all public names of the submodules are exported lazily."""
+    # pylint: disable=protected-access
+    for module, names in my_model._EXPORTS.items():
+        submodule = import_module(f'my_model.{module}')
+        assert set(submodule.__all__) - {'UserRole'} <= set(names)
+        for name in names:
+            assert getattr(my_model, name) is getattr(submodule, name)
+    assert set(my_model.__all__) <= set(dir(my_model))
+
+    with pytest.raises(AttributeError):
+        getattr(my_model, 'does_not_exist')
@@ -0,0 +1,164 @@
+"""Tests for the instrumentation of the expensive methods."""
+# pylint: disable=redefined-outer-name
+from collections.abc import Iterator
+from typing import Any
+
+from pydantic import ValidationError
+from pytest import fixture, raises
+
+from my_model import (APIToken, MetricsInstrumentation,
+                      OpenTelemetryInstrumentation, User, get_instrumentation,
+                      set_instrumentation)
+
+
+@fixture
+def metrics() -> Iterator[MetricsInstrumentation]:
+    """Fixture that activates the in-memory instrumentation.
+
+    Yields:
+        The active instrumentation.
+    """
+    instrumentation = MetricsInstrumentation()
+    set_instrumentation(instrumentation)
+    yield instrumentation
+    set_instrumentation(None)
+
+
+@fixture
+def user() -> User:
+    """Fixture that creates a User object.
+
+    Returns:
+        The created User object.
+    """
+    return User(fullname='Fake fullname', username='fake.user',
+                email='fake@dstark.nl')
+
+
+def test_instrumentation_disabled(user: User) -> None:
+    """Test if nothing is recorded by default.
+
+    Args:
+        user: a user.
+    """
+    assert get_instrumentation() is None
+    user.set_password('testtest')
+    assert user.verify_credentials('fake.user', 'testtest')
+
+
+def test_metrics_calls(metrics: MetricsInstrumentation, user: User) -> None:
+    """Test if calls and latencies are recorded.
+
+    Args:
+        metrics: the active instrumentation.
+        user: a user.
+    """
+    user.set_password('testtest')
+    assert user.verify_credentials('fake.user', 'testtest')
+    assert not user.verify_credentials('fake.user', 'wrong')
+    APIToken(title='token').set_random_token()
+
+    assert metrics.calls() == {'User.set_password': 1,
+                               'User.verify_credentials': 2,
+                               'TokenModel.set_random_token': 1}
+    histograms = metrics.histograms()
+    assert sum(histograms['User.verify_credentials']) == 2
+    assert len(histograms['User.set_password']) == len(metrics.buckets) + 1
+    assert metrics.total_durations()['User.set_password'] > 0
+    assert metrics.validation_failures() == {}
+
+    metrics.reset()
+    assert metrics.calls() == {}
+
+
+def test_metrics_validation_failures(metrics: MetricsInstrumentation,
+                                     user: User) -> None:
+    """Test if failed validations are recorded.
+
+    Args:
+        metrics: the active instrumentation.
+        user: a user.
+    """
+    with raises(ValidationError):
+        user.set_password(1234)  # type: ignore[arg-type]
+    assert metrics.validation_failures() == {'User.set_password': 1}
+    assert metrics.calls() == {'User.set_password': 1}
+
+
+class FakeInstrument:
+    """A fake OpenTelemetry counter or histogram.
+
+    Attributes:
+        name: the name of the instrument.
+        values: the recorded values with their attributes.
+    """
+
+    def __init__(self, name: str) -> None:
+        """Create the instrument.
+
+        Args:
+            name: the name of the instrument.
+        """
+        self.name = name
+        self.values: list[tuple[float, dict[str, str]]] = []
+
+    def add(self, value: float, attributes: dict[str, str]) -> None:
+        """Record a value for a counter.
+
+        Args:
+            value: the value to add.
+            attributes: the attributes for the value.
+        """
+        self.values.append((value, attributes))
+
+    record = add
+
+
+class FakeMeter:
+    """A fake OpenTelemetry meter.
+
+    Attributes:
+        instruments: the created instruments by name.
+    """
+
+    def __init__(self) -> None:
+        """Create the meter."""
+        self.instruments: dict[str, FakeInstrument] = {}
+
+    def _create(self, name: str, **_: Any) -> FakeInstrument:
+        """Create a instrument.
+
+        Args:
+            name: the name of the instrument.
+
+        Returns:
+            The created instrument.
+        """
+        self.instruments[name] = FakeInstrument(name)
+        return self.instruments[name]
+
+    create_counter = _create
+    create_histogram = _create
+
+
+def test_open_telemetry(user: User) -> None:
+    """Test if the OpenTelemetry adapter records with the meter.
+
+    Args:
+        user: a user.
+    """
+    meter = FakeMeter()
+    set_instrumentation(OpenTelemetryInstrumentation(meter))
+    try:
+        user.set_password('testtest')
+        with raises(ValidationError):
+            user.set_password(1234)  # type: ignore[arg-type]
+    finally:
+        set_instrumentation(None)
+
+    attributes = {'method': 'User.set_password'}
+    assert meter.instruments['my_model.calls'].values == [
+        (1, attributes), (1, attributes)]
+    assert len(meter.instruments['my_model.duration'].values) == 2
+    assert meter.instruments['my_model.validation_failures'].values == [
+        (1, attributes)]
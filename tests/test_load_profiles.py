@@ -0,0 +1,111 @@
+"""Tests for the load profiles."""
+from pytest import raises
+from sqlalchemy import Engine
+from sqlalchemy.exc import InvalidRequestError
+from sqlmodel import Session, select
+
+from my_model import APIScope, APIToken, Tag, User, UserSetting
+from my_model.testing import assert_max_queries, count_queries
+
+
+def _create_users(session: Session, number: int) -> None:
+    """Create users with relationships.
+
+    Args:
+        session: a database session.
+        number: the number of users to create.
+    """
+    scope = APIScope(module='notes', subject='read')
+    for index in range(number):
+        user = User(fullname=f'User {index}', username=f'user{index}',
+                    email=f'user{index}@dstark.nl')
+        user.tags = [Tag(title='tag 1'), Tag(title='tag 2')]
+        user.user_settings = [UserSetting(setting='theme', value='dark')]
+        api_token = APIToken(title='token')
+        api_token.token_scopes = [scope]
+        user.api_tokens = [api_token]
+        session.add(user)
+    session.commit()
+    session.expunge_all()
+
+
+def test_load_profile_dashboard(session: Session) -> None:
+    """Test if the dashboard profile doesn't do a query per user.
+
+    Args:
+        session: a database session.
+    """
+    _create_users(session, 10)
+    engine = session.get_bind()
+    assert isinstance(engine, Engine)
+
+    with count_queries(engine) as lazy:
+        for user in session.exec(select(User)).all():
+            _ = (user.tags, user.user_settings, user.api_tokens)
+    session.expunge_all()
+
+    with assert_max_queries(engine, 5):
+        users = session.exec(
+            select(User).options(*User.load_profile('dashboard'))).all()
+        for user in users:
+            assert len(user.tags) == 2
+            assert len(user.user_settings) == 1
+            assert len(user.api_tokens) == 1
+            assert user.api_clients == []
+
+    assert lazy.count > 10
+
+
+def test_load_profile_nested(session: Session) -> None:
+    """Test if nested relationships are loaded by a profile.
+
+    Args:
+        session: a database session.
+    """
+    _create_users(session, 3)
+    engine = session.get_bind()
+    assert isinstance(engine, Engine)
+
+    with assert_max_queries(engine, 3):
+        api_tokens = session.exec(
+            select(APIToken).options(*APIToken.load_profile('auth'))).all()
+        for api_token in api_tokens:
+            assert api_token.user.username.startswith('user')
+            assert api_token.has_scope('notes.read')
+
+
+def test_load_profile_strict(session: Session) -> None:
+    """Test if relationships outside a strict profile raise instead of load.
+
+    Args:
+        session: a database session.
+    """
+    _create_users(session, 2)
+    api_tokens = session.exec(
+        select(APIToken).options(
+            *APIToken.load_profile('auth', strict=True))).all()
+    assert api_tokens[0].has_scope('notes.read')
+    with raises(InvalidRequestError):
+        assert api_tokens[0].user.tags
+    with raises(InvalidRequestError):
+        assert api_tokens[0].token_scopes[0].api_tokens
+
+
+def test_load_profile_unknown() -> None:
+    """Test if a unknown profile is refused."""
+    with raises(KeyError):
+        User.load_profile('unknown')
+
+
+def test_assert_max_queries(session: Session) -> None:
+    """Test if too many queries raise a assertion error.
+
+    Args:
+        session: a database session.
+    """
+    engine = session.get_bind()
+    assert isinstance(engine, Engine)
+    with raises(AssertionError):
+        with assert_max_queries(engine, 1):
+            session.exec(select(User)).all()
+            session.exec(select(Tag)).all()
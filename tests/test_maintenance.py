@@ -0,0 +1,171 @@
+"""Tests for the maintenance routines."""
+from collections.abc import Sequence
+from datetime import datetime, timedelta
+
+from pytest import raises
+from sqlmodel import Session, select, update
+import pytest
+
+from my_model import (APIClient, APIScope, APIToken, APITokenScope,
+                      backfill_token_digests, purge_expired_tokens,
+                      token_digest)
+
+NOW = datetime(2024, 1, 1)
+
+
+def add_tokens(session: Session, number: int, expires: datetime,
+               enabled: bool = True) -> list[APIToken]:
+    """Add API tokens to the database.
+
+    Args:
+        session: a database session.
+        number: the number of tokens to add.
+        expires: the expiration for the tokens.
+        enabled: if the tokens are enabled.
+
+    Returns:
+        The added tokens.
+    """
+    tokens = [APIToken(title=f'token {index}', user_id=1, expires=expires,
+                       enabled=enabled)
+              for index in range(number)]
+    session.add_all(tokens)
+    session.commit()
+    return tokens
+
+
+def test_purge_expired_tokens(session: Session) -> None:
+    """Test if only expired API tokens are purged.
+
+    Args:
+        session: a database session.
+    """
+    add_tokens(session, 25, NOW - timedelta(days=1))
+    add_tokens(session, 5, NOW + timedelta(days=1))
+    add_tokens(session, 3, NOW + timedelta(days=1), enabled=False)
+
+    assert purge_expired_tokens(session, APIToken, now=NOW) == 25
+    remaining = session.exec(select(APIToken)).all()
+    assert len(remaining) == 8
+    assert all(token.expires > NOW for token in remaining)
+
+    assert purge_expired_tokens(session, APIToken, now=NOW,
+                                include_disabled=True) == 3
+    assert len(session.exec(select(APIToken)).all()) == 5
+
+
+def test_purge_expired_tokens_batches(session: Session) -> None:
+    """Test if API tokens are purged in bounded batches.
+
+    Args:
+        session: a database session.
+    """
+    add_tokens(session, 25, NOW - timedelta(days=1))
+    batches: list[int] = []
+
+    def archive(tokens: Sequence[APIToken]) -> None:
+        batches.append(len(tokens))
+
+    assert purge_expired_tokens(session, APIToken, now=NOW,
+                                batch_size=10, archive=archive) == 25
+    assert batches == [10, 10, 5]
+
+    with raises(ValueError):
+        purge_expired_tokens(session, APIToken, batch_size=0)
+
+
+def test_purge_expired_tokens_scope_links(session: Session) -> None:
+    """Test if the scope links of purged API tokens are deleted.
+
+    Args:
+        session: a database session.
+    """
+    scope = APIScope(module='users', subject='read')
+    api_token = APIToken(title='expired', user_id=1,
+                         expires=NOW - timedelta(days=1))
+    api_token.token_scopes = [scope]
+    session.add(api_token)
+    session.commit()
+
+    assert purge_expired_tokens(session, APIToken, now=NOW) == 1
+    assert session.exec(select(APITokenScope)).all() == []
+    assert len(session.exec(select(APIScope)).all()) == 1
+
+
+def test_purge_expired_clients_in_use(session: Session) -> None:
+    """Test if expired API clients that still have tokens are kept.
+
+    Args:
+        session: a database session.
+    """
+    expired = NOW - timedelta(days=1)
+    used = APIClient(app_name='used', app_publisher='test', user_id=1,
+                     expires=expired)
+    unused = APIClient(app_name='unused', app_publisher='test', user_id=1,
+                       expires=expired)
+    session.add_all([used, unused])
+    session.commit()
+    session.add(APIToken(title='token', user_id=1, api_client_id=used.id,
+                         expires=NOW + timedelta(days=1)))
+    session.commit()
+
+    assert purge_expired_tokens(session, APIClient, now=NOW) == 1
+    clients = session.exec(select(APIClient)).all()
+    assert [client.app_name for client in clients] == ['used']
+
+
+def add_tokens_without_digest(session: Session, number: int) -> list[str]:
+    """Add API tokens with a plaintext token but without a digest.
+
+    Args:
+        session: a database session.
+        number: the number of tokens to add.
+
+    Returns:
+        The plaintext tokens.
+    """
+    tokens = [str(index).rjust(32, 'a') for index in range(number)]
+    session.add_all(APIToken(title=f'token {index}', user_id=1, token=token)
+                    for index, token in enumerate(tokens))
+    session.commit()
+    session.exec(update(APIToken).values(  # type: ignore[call-overload]
+        token_digest=None))
+    session.commit()
+    session.expire_all()
+    return tokens
+
+
+def test_backfill_token_digests(session: Session) -> None:
+    """Test if missing token digests are set in batches.
+
+    Args:
+        session: a database session.
+    """
+    tokens = add_tokens_without_digest(session, 5)
+    assert backfill_token_digests(session, APIToken, batch_size=2) == 5
+    assert backfill_token_digests(session, APIToken) == 0
+
+    stored = session.exec(select(APIToken.token, APIToken.token_digest)).all()
+    assert sorted(stored) == sorted(
+        (token, token_digest(token)) for token in tokens)
+
+    with raises(ValueError):
+        backfill_token_digests(session, APIToken, batch_size=0)
+
+
+def test_backfill_token_digests_hashed(
+        session: Session,
+        monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test if plaintext tokens are cleared when they are not stored.
+
+    Args:
+        session: a database session.
+        monkeypatch: the pytest monkeypatch fixture.
+    """
+    tokens = add_tokens_without_digest(session, 3)
+    monkeypatch.setattr(APIToken, 'store_plaintext_token', False)
+    assert backfill_token_digests(session, APIToken) == 3
+
+    stored = session.exec(select(APIToken.token, APIToken.token_digest)).all()
+    assert sorted(stored) == sorted((None, token_digest(token))
+                                    for token in tokens)
@@ -0,0 +1,83 @@
+"""Tests for the database schema."""
+from sqlalchemy import Table, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+from pytest import raises
+import pytest
+
+from my_model import (APIClient, APIToken, Tag, UserScopedModel,
+                      UserSetting)
+
+USER_SCOPED_TABLES = [APIClient, APIToken, Tag, UserSetting]
+
+
+def test_all_user_scoped_tables_tested() -> None:
+    """Test if the list of user scoped tables is complete."""
+    def table_subclasses(model: type[object]) -> set[type]:
+        found: set[type] = set()
+        for subclass in model.__subclasses__():
+            if hasattr(subclass, '__table__'):
+                found.add(subclass)
+            found |= table_subclasses(subclass)
+        return found
+
+    assert table_subclasses(UserScopedModel) == set(USER_SCOPED_TABLES)
+
+
+@pytest.mark.parametrize(
+    'model', USER_SCOPED_TABLES,
+    ids=[model.__name__ for model in USER_SCOPED_TABLES])
+def test_user_scoped_table_has_scoping_index(
+        session: Session,
+        model: type[UserScopedModel]) -> None:
+    """Test if every user scoped table has a index that starts with user_id.
+
+    Args:
+        session: a database session.
+        model: the user scoped model to test.
+    """
+    table = model.__table__  # type: ignore[attr-defined]
+    assert isinstance(table, Table)
+    indexes = inspect(session.get_bind()).get_indexes(table.name)
+    assert any(index['column_names'][0] == 'user_id' for index in indexes)
+
+
+@pytest.mark.parametrize(
+    'model, columns, unique',
+    [(Tag, ['user_id', 'title'], True),
+     (UserSetting, ['user_id', 'setting'], True),
+     (APIClient, ['enabled', 'expires'], False),
+     (APIToken, ['enabled', 'expires'], False)])
+def test_composite_indexes(
+        session: Session,
+        model: type[UserScopedModel],
+        columns: list[str],
+        unique: bool) -> None:
+    """Test if the composite indexes of user scoped tables exist.
+
+    Args:
+        session: a database session.
+        model: the user scoped model to test.
+        columns: the columns for the index.
+        unique: if the index should be unique.
+    """
+    table = model.__table__  # type: ignore[attr-defined]
+    indexes = inspect(session.get_bind()).get_indexes(table.name)
+    assert any(index['column_names'] == columns and
+               bool(index['unique']) == unique
+               for index in indexes)
+
+
+def test_user_setting_unique_per_user(session: Session) -> None:
+    """Test if a setting can only be set once per user.
+
+    Args:
+        session: a database session.
+    """
+    session.add(UserSetting(user_id=1, setting='theme', value='dark'))
+    session.add(UserSetting(user_id=2, setting='theme', value='dark'))
+    session.commit()
+
+    session.add(UserSetting(user_id=1, setting='theme', value='light'))
+    with raises(IntegrityError):
+        session.commit()
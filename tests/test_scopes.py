@@ -0,0 +1,129 @@
+"""Tests for scope masks."""
+from pytest import raises
+from sqlmodel import Session, col, select
+
+from my_model import (APIScope, APIToken, APITokenScope, ScopeRegistry,
+                      assign_scope_bits, rebuild_scope_masks)
+
+
+def _create_scopes(session: Session) -> list[APIScope]:
+    """Create scopes with bit positions.
+
+    Args:
+        session: a database session.
+
+    Returns:
+        The created scopes.
+    """
+    scopes = [APIScope(module='notes', subject=subject)
+              for subject in ('read', 'write', 'delete')]
+    session.add_all(scopes)
+    session.flush()
+    assert assign_scope_bits(session) == 3
+    return scopes
+
+
+def test_assign_scope_bits(session: Session) -> None:
+    """Test if scopes get stable, unique bit positions.
+
+    Args:
+        session: a database session.
+    """
+    read, write, delete = _create_scopes(session)
+    assert [read.bit_position, write.bit_position, delete.bit_position] == \
+        [0, 1, 2]
+
+    # Free positions are reused and existing positions are kept
+    session.delete(write)
+    session.flush()
+    new_scope = APIScope(module='tags', subject='read')
+    session.add(new_scope)
+    session.flush()
+    assert assign_scope_bits(session) == 1
+    assert new_scope.bit_position == 1
+    assert delete.bit_position == 2
+
+
+def test_scope_mask_follows_relationship(session: Session) -> None:
+    """Test if the mask is updated when the scopes of a token change.
+
+    Args:
+        session: a database session.
+    """
+    read, write, _ = _create_scopes(session)
+    registry = ScopeRegistry.load(session)
+    api_token = APIToken(title='testtoken')
+    api_token.token_scopes.append(read)
+    api_token.token_scopes.append(write)
+    session.add(api_token)
+    session.commit()
+
+    assert api_token.has_scope_mask(registry.mask(['notes.read']))
+    assert api_token.has_scope_mask(
+        registry.mask(['notes.read', 'notes.write']))
+    assert not api_token.has_scope_mask(
+        registry.mask(['notes.read', 'notes.delete']))
+
+    api_token.token_scopes.remove(read)
+    assert not api_token.has_scope_mask(registry.mask(['notes.read']))
+    api_token.token_scopes = [read]
+    assert api_token.scope_mask == registry.mask(['notes.read'])
+
+
+def test_scope_mask_on_assignment(session: Session) -> None:
+    """Test if assigning the scopes keeps the scopes and sets the mask.
+
+    Args:
+        session: a database session.
+    """
+    read, write, delete = _create_scopes(session)
+    api_token = APIToken(title='testtoken')
+    api_token.token_scopes = [read, write]
+    assert api_token.token_scopes == [read, write]
+    assert api_token.scope_mask == 0b11
+    session.add(api_token)
+    session.commit()
+    session.refresh(api_token)
+    assert {scope.id for scope in api_token.token_scopes} == {
+        read.id, write.id}
+    assert api_token.scope_mask == 0b11
+
+    api_token.token_scopes = [delete]
+    session.commit()
+    session.refresh(api_token)
+    assert [scope.id for scope in api_token.token_scopes] == [delete.id]
+    assert api_token.scope_mask == 0b100
+
+
+def test_rebuild_scope_masks(session: Session) -> None:
+    """Test if the masks can be rebuilt from the link table.
+
+    Args:
+        session: a database session.
+    """
+    read, _, delete = _create_scopes(session)
+    api_tokens = [APIToken(title=f'token {index}') for index in range(5)]
+    session.add_all(api_tokens)
+    session.flush()
+    for api_token in api_tokens[:3]:
+        session.add(APITokenScope(api_token_id=api_token.id,
+                                  api_scope_id=read.id))
+    session.add(APITokenScope(api_token_id=api_tokens[0].id,
+                              api_scope_id=delete.id))
+    api_tokens[4].scope_mask = 0b10
+    session.commit()
+
+    assert rebuild_scope_masks(session, batch_size=2) == 4
+    session.commit()
+    masks = session.exec(
+        select(APIToken.scope_mask).order_by(col(APIToken.id))).all()
+    assert masks == [0b101, 0b1, 0b1, 0, 0]
+    assert rebuild_scope_masks(session) == 0
+
+
+def test_scope_registry_unknown_scope() -> None:
+    """Test if a unknown scope cannot be used in a mask."""
+    registry = ScopeRegistry({'notes.read': 0})
+    assert registry.bit_position('notes.read') == 0
+    with raises(KeyError):
+        registry.mask(['notes.write'])
@@ -0,0 +1,78 @@
+"""Tests for the TOTP verifier."""
+from pyotp import TOTP, random_base32
+import pytest
+
+from my_model import TOTPVerifier
+
+NOW = 1_700_000_000
+
+
+@pytest.mark.parametrize('offset', [-30, 0, 30])
+def test_verify_within_window(offset: int) -> None:
+    """Test if codes within the window are accepted.
+
+    Args:
+        offset: the clock drift of the client in seconds.
+    """
+    secret = random_base32()
+    code = TOTP(secret).at(NOW + offset)
+    assert TOTPVerifier(window=1).verify(1, secret, code, now=NOW)
+
+
+@pytest.mark.parametrize('offset', [-90, 90])
+def test_verify_outside_window(offset: int) -> None:
+    """Test if codes outside the window are refused.
+
+    Args:
+        offset: the clock drift of the client in seconds.
+    """
+    secret = random_base32()
+    code = TOTP(secret).at(NOW + offset)
+    assert not TOTPVerifier(window=1).verify(1, secret, code, now=NOW)
+
+
+def test_codes_match_pyotp() -> None:
+    """Test if the calculated codes are the same as the codes from pyotp."""
+    secret = random_base32()
+    codes = TOTPVerifier(window=2).codes(secret, now=NOW)
+    assert len(codes) == 5
+    for step, code in codes.items():
+        assert TOTP(secret).at(step * 30) == code
+
+
+def test_verify_replay() -> None:
+    """Test if a code can't be used twice by the same user."""
+    secret = random_base32()
+    code = TOTP(secret).at(NOW)
+    verifier = TOTPVerifier()
+    assert verifier.verify(1, secret, code, now=NOW)
+    assert not verifier.verify(1, secret, code, now=NOW)
+    assert not verifier.verify(1, secret, TOTP(secret).at(NOW - 30),
+                               now=NOW)
+    assert verifier.verify(2, secret, code, now=NOW)
+    assert verifier.verify(1, secret, TOTP(secret).at(NOW + 30),
+                           now=NOW + 30)
+
+
+def test_replay_cache_bounded() -> None:
+    """Test if the replay cache doesn't grow beyond the maximum size."""
+    secret = random_base32()
+    code = TOTP(secret).at(NOW)
+    verifier = TOTPVerifier(replay_cache_size=10)
+    for user in range(25):
+        assert verifier.verify(user, secret, code, now=NOW)
+    assert len(verifier._used_steps) == 10  # pylint: disable=protected-access
+    assert not verifier.verify(24, secret, code, now=NOW)
+
+
+def test_replay_cache_stale_entries() -> None:
+    """Test if entries outside the window are removed from the cache."""
+    secret = random_base32()
+    verifier = TOTPVerifier(window=1)
+    assert verifier.verify(1, secret, TOTP(secret).at(NOW), now=NOW)
+    assert verifier.verify(2, secret, TOTP(secret).at(NOW + 30),
+                           now=NOW + 30)
+    assert verifier.verify(3, secret, TOTP(secret).at(NOW + 90),
+                           now=NOW + 90)
+    # pylint: disable=protected-access
+    assert list(verifier._used_steps) == [2, 3]
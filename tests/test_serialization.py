@@ -0,0 +1,113 @@
+"""Tests for the binary serialization."""
+import json
+from datetime import datetime, timedelta
+
+from pytest import raises
+from sqlmodel import Session
+import pytest
+
+from my_model import (APIToken, SerializationFormat, Tag, User, UserRole,
+                      encode_model)
+
+FORMATS: list[SerializationFormat] = ['msgpack', 'json']
+
+
+def make_user() -> User:
+    """Create a user with all fields set.
+
+    Returns:
+        The created user.
+    """
+    user = User(id=12, fullname='Fake fullname', username='fake.user',
+                email='fake@dstark.nl', role=UserRole.ROOT,
+                created=datetime(2024, 1, 2, 3, 4, 5, 678901))
+    user.set_password('testtest')
+    user.set_random_second_factor()
+    return user
+
+
+@pytest.mark.parametrize('format', FORMATS)
+def test_round_trip(format: SerializationFormat) -> None:
+    """Test if objects are the same after serializing and deserializing.
+
+    Args:
+        format: the serialization format.
+    """
+    pytest.importorskip(format if format == 'msgpack' else 'json')
+    user = make_user()
+    data = user.to_bytes(format, include_sensitive=True)
+    decoded = User.from_bytes(data, format, include_sensitive=True)
+    assert decoded.model_dump() == user.model_dump()
+    assert decoded.role is UserRole.ROOT
+    assert decoded.created == user.created
+
+    tag = Tag(title='work', color='ff0000', user_id=3)
+    assert Tag.from_bytes(tag.to_bytes(format), format) == tag
+
+
+@pytest.mark.parametrize('format', FORMATS)
+def test_sensitive_fields_redacted(format: SerializationFormat) -> None:
+    """Test if sensitive fields are not serialized by default.
+
+    Args:
+        format: the serialization format.
+    """
+    pytest.importorskip(format if format == 'msgpack' else 'json')
+    user = make_user()
+    decoded = User.from_bytes(user.to_bytes(format), format)
+    assert decoded.password_hash is None
+    assert decoded.second_factor is None
+    assert decoded.username == user.username
+    assert user.password_hash is not None
+    assert user.password_hash.encode() not in user.to_bytes(format)
+
+    api_token = APIToken(title='token', user_id=1,
+                         expires=datetime.utcnow() + timedelta(days=1))
+    token = api_token.set_random_token()
+    assert token.encode() not in api_token.to_bytes(format)
+    decoded_token = APIToken.from_bytes(api_token.to_bytes(format), format)
+    assert decoded_token.token is None
+    assert decoded_token.token_digest == api_token.token_digest
+
+
+def test_relationships_not_serialized(session: Session) -> None:
+    """Test if relationships are not serialized.
+
+    Args:
+        session: a database session.
+    """
+    user = make_user()
+    user.tags = [Tag(title='work')]
+    session.add(user)
+    session.commit()
+
+    decoded = User.from_bytes(user.to_bytes('json'), 'json')
+    assert 'tags' not in decoded.__dict__
+
+
+def test_default_format() -> None:
+    """Test if JSON is used by default, so no extra packages are needed."""
+    tag = Tag(title='work', color='ff0000')
+    data = tag.to_bytes()
+    assert json.loads(data) == json.loads(tag.to_bytes('json'))
+    assert Tag.from_bytes(data).color == 'ff0000'
+
+
+def test_decode_other_model() -> None:
+    """Test if data for another model or version is refused."""
+    data = Tag(title='work').to_bytes('json')
+    with raises(ValueError):
+        User.from_bytes(data, 'json')
+    with raises(ValueError):
+        User.from_bytes(b'[1, 2, 3]', 'json')
+    with raises(ValueError):
+        encode_model(Tag(title='work'), 'xml')  # type: ignore[arg-type]
+
+
+def test_decode_validate() -> None:
+    """Test if decoded values can be validated."""
+    tag = Tag(title='work', color='ff0000')
+    data = tag.to_bytes('json').replace(b'ff0000', b'nocolor')
+    assert Tag.from_bytes(data, 'json').color == 'nocolor'
+    with raises(ValueError):
+        Tag.from_bytes(data, 'json', validate=True)
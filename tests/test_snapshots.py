@@ -0,0 +1,92 @@
+"""Tests for the read-only snapshots."""
+from dataclasses import FrozenInstanceError, fields
+from datetime import datetime, timedelta
+
+from pytest import raises
+from sqlmodel import Session, select
+import pytest
+
+from my_model import (APIScope, APIScopeSnapshot, APIToken, APITokenSnapshot,
+                      Snapshot, Tag, User, UserSnapshot, snapshot_type)
+
+SNAPSHOT_TYPES = [UserSnapshot, APIScopeSnapshot, APITokenSnapshot]
+
+
+@pytest.mark.parametrize(
+    'snapshot_class', SNAPSHOT_TYPES,
+    ids=[snapshot.__name__ for snapshot in SNAPSHOT_TYPES])
+def test_snapshot_fields_are_columns(snapshot_class: type[Snapshot]) -> None:
+    """Test if all fields of a snapshot are columns of the model.
+
+    Args:
+        snapshot_class: the snapshot class to test.
+    """
+    model_columns = snapshot_class.model.__table__.columns  # type: ignore
+    for field in fields(snapshot_class):
+        assert field.name in model_columns
+    assert not hasattr(snapshot_class(*[None] * len(fields(snapshot_class))),
+                       '__dict__')
+
+
+def test_snapshot_without_secrets() -> None:
+    """Test if sensitive fields are not part of the snapshots."""
+    assert 'password_hash' not in UserSnapshot.field_names
+    assert 'second_factor' not in UserSnapshot.field_names
+    assert 'token' not in APITokenSnapshot.field_names
+
+
+def test_user_to_snapshot(session: Session) -> None:
+    """Test if a snapshot is created from a user.
+
+    Args:
+        session: a database session.
+    """
+    user = User(fullname='Fake fullname', username='fake.user',
+                email='fake@dstark.nl')
+    session.add(user)
+    session.commit()
+
+    snapshot = user.to_snapshot()
+    assert isinstance(snapshot, UserSnapshot)
+    assert snapshot.id == user.id
+    assert snapshot.username == 'fake.user'
+    assert snapshot.role == user.role
+    with raises(FrozenInstanceError):
+        snapshot.username = 'other'  # type: ignore[misc]
+
+    # Expired objects are loaded again
+    session.expire(user)
+    assert user.to_snapshot() == snapshot
+
+
+def test_api_token_from_row(session: Session) -> None:
+    """Test if snapshots are created from database rows.
+
+    Args:
+        session: a database session.
+    """
+    api_token = APIToken(title='token', user_id=1,
+                         expires=datetime.utcnow() + timedelta(days=1))
+    api_token.set_random_token()
+    api_token.token_scopes = [APIScope(module='users', subject='read',
+                                       bit_position=0)]
+    session.add(api_token)
+    session.commit()
+
+    rows = session.exec(select(*APITokenSnapshot.columns())).all()
+    snapshots = [APITokenSnapshot.from_row(row) for row in rows]
+    assert snapshots == [api_token.to_snapshot()]
+    assert snapshots[0].is_valid()
+    assert snapshots[0].has_scope_mask(1)
+
+    scope = api_token.token_scopes[0].to_snapshot()
+    assert isinstance(scope, APIScopeSnapshot)
+    assert scope.full_scope_name == 'users.read'
+
+
+def test_snapshot_type_unknown() -> None:
+    """Test if a error is raised for models without a snapshot class."""
+    with raises(TypeError):
+        snapshot_type(Tag)
+    with raises(TypeError):
+        Tag(title='tag').to_snapshot()
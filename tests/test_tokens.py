@@ -0,0 +1,46 @@
+"""Tests for the token helpers."""
+from pytest import raises
+import pytest
+
+from my_model import ALPHANUMERIC, generate_tokens
+
+
+@pytest.mark.parametrize(
+    'number, length',
+    [(1, 32), (100, 32), (10, 1), (5, 0), (0, 32)]
+)
+def test_generate_tokens(number: int, length: int) -> None:
+    """Test if the requested number of tokens is generated.
+
+    Args:
+        number: the number of tokens to generate.
+        length: the length of the tokens.
+    """
+    tokens = generate_tokens(number, length)
+    assert len(tokens) == number
+    for token in tokens:
+        assert len(token) == length
+        assert set(token) <= set(ALPHANUMERIC)
+
+
+def test_generate_tokens_alphabet() -> None:
+    """Test if only characters from the alphabet are used."""
+    tokens = generate_tokens(50, 20, 'abc')
+    assert set(''.join(tokens)) == set('abc')
+
+
+def test_generate_tokens_unique() -> None:
+    """Test if generated tokens are unique."""
+    tokens = generate_tokens(1000, 32)
+    assert len(set(tokens)) == 1000
+
+
+@pytest.mark.parametrize('alphabet', ['', 'é', 'a' * 257])
+def test_generate_tokens_invalid_alphabet(alphabet: str) -> None:
+    """Test if invalid alphabets are refused.
+
+    Args:
+        alphabet: the alphabet to test.
+    """
+    with raises(ValueError):
+        generate_tokens(1, 32, alphabet)
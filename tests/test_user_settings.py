@@ -0,0 +1,146 @@
+"""Tests for the typed user settings."""
+# pylint: disable=redefined-outer-name
+from pytest import fixture, raises
+from sqlalchemy import Engine
+from sqlmodel import Session, select
+
+from my_model import User, UserSetting, register_setting
+from my_model.testing import assert_max_queries
+
+register_setting('test_dark_mode', 'bool', default=False)
+register_setting('test_page_size', 'int', default=25)
+register_setting('test_columns', 'json')
+
+
+@fixture
+def example_user(session: Session) -> User:
+    """Fixture that creates a stored user with settings.
+
+    Args:
+        session: a database session.
+
+    Returns:
+        The created User object.
+    """
+    user = User(fullname='Settings user', username='settings.user',
+                email='settings@dstark.nl')
+    user.user_settings = [
+        UserSetting(setting='test_dark_mode', value='true'),
+        UserSetting(setting='test_columns', value='["a","b"]'),
+        UserSetting(setting='theme', value='blue')]
+    session.add(user)
+    session.commit()
+    return user
+
+
+def test_user_settings_typed(example_user: User) -> None:
+    """Test if settings are parsed to their registered type.
+
+    Args:
+        example_user: a user with settings.
+    """
+    settings = example_user.settings
+    assert settings['test_dark_mode'] is True
+    assert settings['test_columns'] == ['a', 'b']
+    assert settings['theme'] == 'blue'
+    assert settings['test_page_size'] == 25
+    assert dict(settings) == {'test_dark_mode': True,
+                              'test_columns': ['a', 'b'],
+                              'theme': 'blue'}
+    with raises(KeyError):
+        _ = settings['unknown']
+
+
+def test_user_settings_one_query(
+        session: Session,
+        example_user: User) -> None:
+    """Test if all settings are loaded with one query.
+
+    Args:
+        session: a database session.
+        example_user: a user with settings.
+    """
+    engine = session.get_bind()
+    assert isinstance(engine, Engine)
+    session.refresh(example_user)
+    session.expire(example_user, ['user_settings'])
+    with assert_max_queries(engine, 1):
+        for _ in range(3):
+            assert example_user.settings['test_dark_mode'] is True
+            assert example_user.settings['theme'] == 'blue'
+
+
+def test_user_settings_write_through(
+        session: Session,
+        example_user: User) -> None:
+    """Test if changes are written to the settings and the cache.
+
+    Args:
+        session: a database session.
+        example_user: a user with settings.
+    """
+    settings = example_user.settings
+    settings['test_dark_mode'] = False
+    settings['test_page_size'] = 50
+    assert settings['test_dark_mode'] is False
+    assert settings['test_page_size'] == 50
+    del settings['theme']
+    assert 'theme' not in settings
+    session.commit()
+
+    stored = dict(session.exec(
+        select(UserSetting.setting, UserSetting.value)
+        .where(UserSetting.user_id == example_user.id)).all())
+    assert stored == {'test_dark_mode': 'false',
+                      'test_page_size': '50',
+                      'test_columns': '["a","b"]'}
+
+
+def test_user_settings_invalidated_on_direct_change(
+        example_user: User) -> None:
+    """Test if a direct change to a setting invalidates the cache.
+
+    Args:
+        example_user: a user with settings.
+    """
+    assert example_user.settings['theme'] == 'blue'
+    for setting in example_user.user_settings:
+        if setting.setting == 'theme':
+            setting.value = 'red'
+    assert example_user.settings['theme'] == 'red'
+
+
+def test_user_settings_invalid_value(example_user: User) -> None:
+    """Test if a invalid stored value only breaks the read of that setting.
+
+    Args:
+        example_user: a user with settings.
+    """
+    example_user.user_settings.append(
+        UserSetting(setting='test_dark_mode_invalid', value='yes'))
+    register_setting('test_dark_mode_invalid', 'bool')
+    settings = example_user.settings
+    assert settings['theme'] == 'blue'
+    assert 'test_dark_mode_invalid' in list(settings)
+    with raises(ValueError):
+        _ = settings['test_dark_mode_invalid']
+    assert settings['test_dark_mode'] is True
+
+
+def test_user_settings_registered_later(example_user: User) -> None:
+    """Test if cached values are parsed again when a setting is registered.
+
+    Args:
+        example_user: a user with settings.
+    """
+    example_user.user_settings.append(
+        UserSetting(setting='test_registered_later', value='12'))
+    assert example_user.settings['test_registered_later'] == '12'
+    register_setting('test_registered_later', 'int')
+    assert example_user.settings['test_registered_later'] == 12
+
+
+def test_register_setting_unknown_type() -> None:
+    """Test if a unknown setting type is refused."""
+    with raises(ValueError):
+        register_setting('invalid', 'float')  # type: ignore[arg-type]
@@ -1,12 +1,17 @@
 """Tests for User objects."""
 # pylint: disable=redefined-outer-name
+import asyncio
 from datetime import datetime
 
+from argon2.profiles import CHEAPEST
 from pyotp import TOTP
 from pytest import fixture, raises
 import pytest
 
-from my_model import User
+from my_model import (User, get_hash_counters, get_password_hasher,
+                      register_hasher_profile, reset_hash_counters,
+                      set_default_hasher_profile, set_uniform_timing,
+                      verify_dummy_password)
 
 
 @fixture
@@ -160,6 +165,21 @@ def test_user_correct_credentials(example_user_no_second_factor: User) -> None:
             'failed (with second factor)"
 
 
+def test_user_second_factor_replay(
+        example_user_no_second_factor: User) -> None:
+    """Test if a second factor code can't be used twice.
+
+    Args:
+        example_user_no_second_factor: a user without a second factor.
+    """
+    otp_secret = example_user_no_second_factor.set_random_second_factor()
+    code = TOTP(otp_secret).now()
+    assert example_user_no_second_factor.verify_credentials(
+        username='fake.user', password='testtest', second_factor=code)
+    assert not example_user_no_second_factor.verify_credentials(
+        username='fake.user', password='testtest', second_factor=code)
+
+
 def test_disabling_second_factor(example_user_no_second_factor: User) -> None:
     """Test if we can disable the second factor.
 
@@ -208,3 +228,139 @@ def test_user_no_password(example_user_no_second_factor: User) -> None:
     assert not example_user_no_second_factor.verify_credentials(
         username='fake.user',
         password='testtest')
+
+
+def test_user_set_password_profile(
+        example_user_no_second_factor: User) -> None:
+    """Test if the password is hashed with the requested profile.
+
+    Args:
+        example_user_no_second_factor: a user without a second factor.
+    """
+    assert not example_user_no_second_factor.needs_rehash()
+    example_user_no_second_factor.set_password(
+        'testtest', profile='batch_import')
+    assert example_user_no_second_factor.needs_rehash()
+    assert not example_user_no_second_factor.needs_rehash(
+        profile='batch_import')
+
+
+def test_user_rehash_on_login(example_user_no_second_factor: User) -> None:
+    """Test if a outdated hash is replaced on a successful login.
+
+    Args:
+        example_user_no_second_factor: a user without a second factor.
+    """
+    example_user_no_second_factor.set_password(
+        'testtest', profile='batch_import')
+    password_date = example_user_no_second_factor.password_date
+
+    # Wrong credentials should not rehash
+    assert not example_user_no_second_factor.verify_credentials(
+        username='fake.user', password='wrong', rehash=True)
+    assert example_user_no_second_factor.needs_rehash()
+
+    assert example_user_no_second_factor.verify_credentials(
+        username='fake.user', password='testtest', rehash=True)
+    assert not example_user_no_second_factor.needs_rehash()
+    assert example_user_no_second_factor.password_date == password_date
+    assert example_user_no_second_factor.verify_credentials(
+        username='fake.user', password='testtest')
+
+
+def test_user_no_password_needs_no_rehash(
+        example_user_no_second_factor: User) -> None:
+    """Test if a user without password doesn't need a rehash.
+
+    Args:
+        example_user_no_second_factor: a user without a second factor.
+    """
+    example_user_no_second_factor.password_hash = None
+    assert not example_user_no_second_factor.needs_rehash()
+
+
+def test_set_default_hasher_profile_unknown() -> None:
+    """Test if a unknown hasher profile cannot be set as default."""
+    with raises(KeyError):
+        set_default_hasher_profile('unknown')
+
+
+def test_register_hasher_profile() -> None:
+    """Test if a registered profile replaces the cached hasher."""
+    hasher = get_password_hasher('test')
+    register_hasher_profile('custom', CHEAPEST)
+    assert get_password_hasher('custom') is get_password_hasher('custom')
+    assert get_password_hasher('test') is hasher
+
+
+def test_user_averify_credentials(
+        example_user_no_second_factor: User) -> None:
+    """Test if credentials can be verified from a coroutine.
+
+    Args:
+        example_user_no_second_factor: a user without a second factor.
+    """
+    assert asyncio.run(example_user_no_second_factor.averify_credentials(
+        username='fake.user', password='testtest'))
+    assert not asyncio.run(example_user_no_second_factor.averify_credentials(
+        username='fake.user', password='wrong'))
+
+
+def test_user_verify_many(example_user_no_second_factor: User) -> None:
+    """Test if a batch of credentials can be verified.
+
+    Args:
+        example_user_no_second_factor: a user without a second factor.
+    """
+    user = example_user_no_second_factor
+    assert User.verify_many([
+        (user, 'fake.user', 'testtest', None),
+        (user, 'fake.user', 'wrong', None),
+        (user, 'other.user', 'testtest', None)
+    ]) == [True, False, False]
+
+
+def test_user_verify_short_circuit(
+        example_user_no_second_factor: User) -> None:
+    """Test if failing cheap checks skip the password hash.
+
+    Args:
+        example_user_no_second_factor: a user without a second factor.
+    """
+    reset_hash_counters()
+    assert not example_user_no_second_factor.verify_credentials(
+        username='other.user', password='testtest')
+
+    # A second factor with a invalid format should be skipped too
+    example_user_no_second_factor.set_random_second_factor()
+    assert not example_user_no_second_factor.verify_credentials(
+        username='fake.user', password='testtest', second_factor='abcdef')
+
+    counters = get_hash_counters()
+    assert counters['skipped'] == 2
+    assert counters['verify'] == 0
+
+
+def test_user_verify_uniform_timing(
+        example_user_no_second_factor: User) -> None:
+    """Test if a hash is always verified with uniform timing.
+
+    Args:
+        example_user_no_second_factor: a user without a second factor.
+    """
+    reset_hash_counters()
+    set_uniform_timing(True)
+    try:
+        assert not example_user_no_second_factor.verify_credentials(
+            username='other.user', password='testtest')
+        example_user_no_second_factor.password_hash = None
+        assert not example_user_no_second_factor.verify_credentials(
+            username='fake.user', password='testtest')
+        assert not verify_dummy_password('testtest')
+    finally:
+        set_uniform_timing(False)
+
+    counters = get_hash_counters()
+    assert counters['skipped'] == 0
+    assert counters['verify'] == 1
+    assert counters['dummy'] == 2
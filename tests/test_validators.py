@@ -0,0 +1,105 @@
+"""Tests for the field validators."""
+from typing import Callable
+import re
+
+from pydantic import ValidationError
+import pytest
+
+from my_model import (COLOR_PATTERN, SECOND_FACTOR_PATTERN, TOKEN_PATTERN,
+                      User, is_valid_color, is_valid_email,
+                      is_valid_fullname, is_valid_redirect_url,
+                      is_valid_second_factor, is_valid_token,
+                      is_valid_totp_code, is_valid_username)
+
+
+@pytest.mark.parametrize(
+    'predicate, pattern, value',
+    [
+        (is_valid_color, COLOR_PATTERN, value)
+        for value in ['00ff00', '1590FC', 'fff', '9090hj', '00ff00 ', '']
+    ] + [
+        (is_valid_token, TOKEN_PATTERN, value)
+        for value in ['qwertyuiopASDFGHJKLzxcvbnm009909', 'xyz',
+                      'qwertyuiopASDFGHJKLzxcvbnm--909',
+                      'qwertyuiopASDFGHJKLzxcvbnm00990é']
+    ] + [
+        (is_valid_second_factor, SECOND_FACTOR_PATTERN, value)
+        for value in ['ABCDEFG', '123ABCEF', 'ape', '123ape', '']
+    ]
+)
+def test_predicate_matches_pattern(
+        predicate: Callable[[str], bool],
+        pattern: re.Pattern[str],
+        value: str) -> None:
+    """Test if the fast predicates agree with the patterns.
+
+    Args:
+        predicate: the predicate to test.
+        pattern: the pattern that is used by the model.
+        value: the value to test.
+    """
+    assert predicate(value) == (pattern.match(value) is not None)
+
+
+@pytest.mark.parametrize(
+    'predicate, field, value',
+    [
+        (is_valid_fullname, 'fullname', value)
+        for value in ['John Doe', 'John\n', 'John\nDoe', '']
+    ] + [
+        (is_valid_username, 'username', value)
+        for value in ['john.doe', 'john.doe\n', '1john']
+    ] + [
+        (is_valid_email, 'email', value)
+        for value in ['john@dstark.nl', 'john@dstark.nl\n', 'john']
+    ]
+)
+def test_predicate_matches_model(
+        predicate: Callable[[str], bool],
+        field: str,
+        value: str) -> None:
+    """Test if the predicates agree with the validation of the model.
+
+    Args:
+        predicate: the predicate to test.
+        field: the field of the user that is checked by the predicate.
+        value: the value to test.
+    """
+    values = {'fullname': 'John Doe', 'username': 'john.doe',
+              'email': 'john@dstark.nl', field: value}
+    try:
+        User(**values)
+    except ValidationError:
+        valid = False
+    else:
+        valid = True
+    assert predicate(value) == valid
+
+
+@pytest.mark.parametrize(
+    'value, valid',
+    [('123456', True), ('12345', False), ('12345a', False), ('١٢٣٤٥٦', False)]
+)
+def test_is_valid_totp_code(value: str, valid: bool) -> None:
+    """Test the format check for TOTP codes.
+
+    Args:
+        value: the value to test.
+        valid: if the value should be valid.
+    """
+    assert is_valid_totp_code(value) == valid
+
+
+@pytest.mark.parametrize(
+    'value, valid',
+    [('https://example.com', True), ('http://example.com', True),
+     ('https:/example.com', False), ('ftp://example.com', False)]
+)
+def test_is_valid_redirect_url(value: str, valid: bool) -> None:
+    """Test the check for redirect URLs.
+
+    Args:
+        value: the value to test.
+        valid: if the value should be valid.
+    """
+    assert is_valid_redirect_url(value) == valid